@@ -0,0 +1,8 @@
+"""Reusable preprocessing steps for the notebooks (Barcelona, Paris, Milan)."""
+from .features import BARCELONA_FEATURES, Aggregate, Ratio, compute_features
+from .ingest import merge_csv_per_year, read_yearly_csv
+
+__all__ = [
+    "Aggregate", "Ratio", "BARCELONA_FEATURES", "compute_features",
+    "merge_csv_per_year", "read_yearly_csv",
+]
@@ -0,0 +1,278 @@
+"""
+Amenity counts per neighborhood from a local OpenStreetMap extract.
+
+Instead of one Overpass API query per neighborhood, the extract of the
+region (`.osm.pbf` through pyosmium, or plain `.osm` XML) is read once, in
+file order:
+
+- every node and way is checked against the configured tag set
+  (AMENITY_TAGS: amenity type -> accepted key / values) with one dict
+  lookup per tag;
+- matching nodes give a point, matching ways (buildings, areas) the
+  centroid of their nodes;
+- points are binned into neighborhoods in batches by the city's
+  NeighborhoodIndex (spatial.py).
+
+Memory: matched points are counted and dropped batch by batch. To place
+ways, the XML reader keeps the coordinates of the nodes inside the city's
+bounding box only (24 bytes each). The PBF reader relies on libosmium's node
+location index, which holds every node of the extract, not only the city's;
+it is disk-backed by default (OSM_LOCATION_STORAGE, a memory-mapped temporary
+file of 16 bytes per node), so resident memory is left to the OS page cache
+instead of growing with the region.
+
+The result is a long (neighborhood_id, amenity_type, count) table;
+`amenity_features` turns it into one column per type to merge into the
+master dataframe:
+
+    python -m preprocessing.amenities barcelona data/raw/osm/cataluna-latest.osm.pbf
+"""
+import argparse
+import tempfile
+import time
+from array import array
+from collections import Counter
+from pathlib import Path
+from xml.etree.ElementTree import iterparse
+
+import numpy as np
+import pandas as pd
+
+from . import config
+from .spatial import city_index
+
+try:
+    import osmium
+except ImportError:  # .osm XML extracts still work without it
+    osmium = None
+
+
+# --- TAG MATCHING ---
+
+class TagMatcher:
+    """Amenity types of an OSM element, from a {type: {key: [values]}} tag set."""
+
+    def __init__(self, tags: dict = config.AMENITY_TAGS):
+        self.lookup = {}
+        for amenity_type, accepted in tags.items():
+            for key, values in accepted.items():
+                for value in values:
+                    self.lookup.setdefault((key, value), []).append(amenity_type)
+        self.keys = sorted({key for key, _ in self.lookup})
+
+    def match(self, tags) -> set:
+        """Amenity types matched by `tags` ((key, value) pairs); each type counts once per element."""
+        types = set()
+        for key, value in tags:
+            types.update(self.lookup.get((key, value), ()))
+        return types
+
+
+class NodeCoordinates:
+    """
+    Coordinates of the nodes ways may need, as compact typed arrays (not a
+    dict): appended while reading, sorted by ID once, looked up vectorized.
+    """
+
+    def __init__(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.lon = np.empty(0)
+        self.lat = np.empty(0)
+        self._pending = (array('q'), array('d'), array('d'))
+
+    def add(self, node_id: int, lon: float, lat: float):
+        ids, lons, lats = self._pending
+        ids.append(node_id)
+        lons.append(lon)
+        lats.append(lat)
+
+    def __len__(self):
+        return len(self.ids) + len(self._pending[0])
+
+    def _merge(self):
+        """Moves the nodes added since the last lookup into the sorted arrays."""
+        ids, lons, lats = self._pending
+        self.ids = np.concatenate([self.ids, np.array(ids, dtype=np.int64)])
+        self.lon = np.concatenate([self.lon, np.array(lons, dtype=float)])
+        self.lat = np.concatenate([self.lat, np.array(lats, dtype=float)])
+        self._pending = (array('q'), array('d'), array('d'))
+        # Extracts list nodes by ID already, the sort is only a fallback
+        if np.any(self.ids[1:] < self.ids[:-1]):
+            order = np.argsort(self.ids, kind='stable')
+            self.ids, self.lon, self.lat = self.ids[order], self.lon[order], self.lat[order]
+
+    def lookup(self, node_ids) -> tuple:
+        """(lon, lat) arrays of the known nodes among `node_ids`."""
+        if len(self._pending[0]):
+            self._merge()
+        ids, lon, lat = self.ids, self.lon, self.lat
+        wanted = np.asarray(node_ids, dtype=np.int64)
+        if not len(ids) or not len(wanted):
+            return np.empty(0), np.empty(0)
+        positions = np.searchsorted(ids, wanted).clip(max=len(ids) - 1)
+        found = ids[positions] == wanted
+        return lon[positions[found]], lat[positions[found]]
+
+
+def _open_ring(refs):
+    """Node list of a way without the closing node of a closed way, which would weigh twice in the centroid."""
+    return refs[:-1] if len(refs) > 2 and refs[0] == refs[-1] else refs
+
+
+def _in_bbox(lon: float, lat: float, bbox) -> bool:
+    return bbox is None or (bbox[0] <= lon <= bbox[2] and bbox[1] <= lat <= bbox[3])
+
+
+# --- READERS ---
+# Both yield (amenity_types, lon, lat) for every matching node and way, in file order
+
+def iter_osm_xml(path, matcher: TagMatcher, bbox=None):
+    """Streams a .osm XML file with iterparse, clearing every element once read."""
+    nodes = NodeCoordinates()
+    tags, refs = [], []
+    context = iterparse(str(path), events=('start', 'end'))
+    _, root = next(context)
+    for event, element in context:
+        if event == 'start':
+            if element.tag in ('node', 'way', 'relation'):
+                tags, refs = [], []
+            continue
+        if element.tag == 'tag':
+            tags.append((element.get('k'), element.get('v')))
+        elif element.tag == 'nd':
+            refs.append(int(element.get('ref')))
+        elif element.tag == 'node':
+            lon, lat = float(element.get('lon')), float(element.get('lat'))
+            if _in_bbox(lon, lat, bbox):
+                nodes.add(int(element.get('id')), lon, lat)
+                types = matcher.match(tags) if tags else None
+                if types:
+                    yield types, lon, lat
+            root.clear()
+        elif element.tag == 'way':
+            types = matcher.match(tags) if tags else None
+            if types:
+                lon, lat = nodes.lookup(_open_ring(refs))
+                if len(lon):
+                    yield types, float(lon.mean()), float(lat.mean())
+            root.clear()
+        elif element.tag == 'relation':
+            root.clear()
+
+
+def iter_osm_pbf(path, matcher: TagMatcher, bbox=None, storage: str = config.OSM_LOCATION_STORAGE):
+    """
+    Streams a .osm.pbf (or any format libosmium reads) with pyosmium. Node
+    locations go to a libosmium index of type `storage`; file-backed types
+    ('sparse_file_array', 'dense_file_array') get a temporary file.
+    """
+    if osmium is None:
+        raise ImportError("Reading .osm.pbf extracts needs pyosmium (pip install osmium)")
+    with tempfile.TemporaryDirectory(prefix="osm-locations-", dir=config.OSM_LOCATION_DIR) as directory:
+        if storage.endswith('_file_array'):
+            storage = f"{storage},{Path(directory) / 'node_locations.bin'}"
+        yield from _read_pbf(path, matcher, bbox, storage)
+
+
+def _read_pbf(path, matcher: TagMatcher, bbox, storage: str):
+    processor = osmium.FileProcessor(str(path), osmium.osm.NODE | osmium.osm.WAY).with_locations(storage)
+    # Locations are stored before filtering; only elements with a configured key reach Python
+    processor = processor.with_filter(osmium.filter.KeyFilter(*matcher.keys))
+    for element in processor:
+        types = matcher.match((tag.k, tag.v) for tag in element.tags)
+        if not types:
+            continue
+        if element.is_node():
+            if element.location.valid():
+                lon, lat = element.location.lon, element.location.lat
+                if _in_bbox(lon, lat, bbox):
+                    yield types, lon, lat
+        else:
+            refs = list(element.nodes)[:-1] if element.is_closed() else element.nodes
+            coordinates = [(n.lon, n.lat) for n in refs if n.location.valid()]
+            if coordinates:
+                lon, lat = np.mean(coordinates, axis=0)
+                if _in_bbox(lon, lat, bbox):
+                    yield types, float(lon), float(lat)
+
+
+def iter_amenities(path, matcher: TagMatcher, bbox=None, storage: str = None):
+    """Matching amenities of an extract, picking the reader from the file name."""
+    name = Path(path).name.lower()
+    if name.endswith('.osm') or name.endswith('.osm.xml'):
+        return iter_osm_xml(path, matcher, bbox)
+    return iter_osm_pbf(path, matcher, bbox, storage or config.OSM_LOCATION_STORAGE)
+
+
+# --- COUNTING ---
+
+def count_amenities(path, index, tags: dict = config.AMENITY_TAGS, batch_size: int = config.AMENITY_BATCH_SIZE,
+                    margin: float = 0.01, storage: str = None) -> pd.DataFrame:
+    """
+    One pass over the extract at `path`: counts the amenities of each type
+    in every neighborhood of `index` (a NeighborhoodIndex). Returns a
+    (neighborhood_id, amenity_type, count) table. `storage` overrides
+    OSM_LOCATION_STORAGE for PBF extracts.
+    """
+    matcher = TagMatcher(tags)
+    west, south, east, north = index.bounds(crs="EPSG:4326")
+    bbox = (west - margin, south - margin, east + margin, north + margin)
+    counts = Counter()
+    types, lons, lats = [], [], []
+    matched, inside = 0, 0
+    start = time.monotonic()
+
+    def flush():
+        nonlocal inside
+        neighborhoods = index.assign_points(np.asarray(lons), np.asarray(lats), crs="EPSG:4326")
+        for amenity_types, neighborhood_id in zip(types, neighborhoods):
+            if neighborhood_id is not None:
+                inside += 1
+                for amenity_type in amenity_types:
+                    counts[neighborhood_id, amenity_type] += 1
+        types.clear(), lons.clear(), lats.clear()
+
+    for amenity_types, lon, lat in iter_amenities(path, matcher, bbox, storage):
+        types.append(amenity_types)
+        lons.append(lon)
+        lats.append(lat)
+        matched += 1
+        if len(types) >= batch_size:
+            flush()
+    if types:
+        flush()
+
+    table = pd.DataFrame([(n, t, c) for (n, t), c in counts.items()],
+                         columns=['neighborhood_id', 'amenity_type', 'count'])
+    print(f"✓ {matched} amenities matched in {Path(path).name}, {inside} inside the {len(index)} neighborhoods "
+          f"({time.monotonic() - start:.1f}s)")
+    return table.sort_values(['neighborhood_id', 'amenity_type'], ignore_index=True)
+
+
+def amenity_features(counts: pd.DataFrame, tags: dict = config.AMENITY_TAGS) -> pd.DataFrame:
+    """One row per neighborhood and one `n_<type>` column per amenity type (0 when none was found)."""
+    wide = counts.pivot_table(index='neighborhood_id', columns='amenity_type', values='count',
+                              aggfunc='sum', fill_value=0)
+    wide = wide.reindex(columns=list(tags), fill_value=0).astype('int64')
+    wide.columns = [f"n_{amenity_type}" for amenity_type in wide.columns]
+    return wide.reset_index()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Count OSM amenities per neighborhood from a local extract")
+    parser.add_argument('city', choices=sorted(config.NEIGHBORHOOD_BOUNDARIES))
+    parser.add_argument('extract', help=".osm.pbf or .osm file covering the city (path, or file name in OSM_DIR)")
+    parser.add_argument('--output', default=None, help="CSV to write (default: data/preprocessed/<city>/<city>_amenities.csv)")
+    parser.add_argument('--wide', action='store_true', help="One column per amenity type instead of a long table")
+    args = parser.parse_args()
+
+    extract = Path(args.extract)
+    if not extract.exists() and (config.OSM_DIR / extract).exists():
+        extract = config.OSM_DIR / extract
+    result = count_amenities(extract, city_index(args.city))
+    if args.wide:
+        result = amenity_features(result)
+    output = Path(args.output or config.PREPROCESSED_DIR / args.city / f"{args.city}_amenities.csv")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    result.to_csv(output, index=False)
+    print(f"✓ Saved {len(result)} rows to {output}")
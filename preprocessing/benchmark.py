@@ -0,0 +1,459 @@
+"""
+Offline benchmark of the preprocessing steps on synthetic tables.
+
+Builds Open Data BCN-shaped tables (cadastral values, income, education and
+age by census section) for `--scale` times Barcelona's size, then times the
+notebook's feature path (one filtered groupby per feature, chained with
+`reduce(pd.merge)`) against `compute_features`, and checks both give the
+same table. Three more comparisons:
+
+- master dataset storage: a CSV with one WKT polygon per row reloaded with
+  `wkt.loads`, against the GeoParquet layout of geostore.py;
+- point-in-polygon assignment: spatial.py against a loop over every polygon;
+- OSM amenity counts: one pass of amenities.py over a synthetic extract
+  (.osm XML, and .osm.pbf when pyosmium is installed), checked against
+  counting each neighborhood's amenities one at a time.
+
+    python -m preprocessing.benchmark
+    python -m preprocessing.benchmark --only features --scale 3 --repeat 5 --output bench.json
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import platform
+import os
+import sys
+import tempfile
+import time
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+from .features import BARCELONA_FEATURES, compute_features
+
+
+# --- FIXTURES ---
+
+VALUE_KINDS = ['Valor_cadastral_total_€', 'Valor_cadastral_unitari_€/m2', 'Valor_sòl_unitari_€/m2']
+
+
+def synthetic_sources(scale: float = 1.0, years=range(2015, 2026), seed: int = 0) -> dict:
+    """Barcelona-like source tables: 73 neighborhoods x ~1,070 census sections per year, times `scale`."""
+    rng = np.random.default_rng(seed)
+    neighborhoods = int(73 * scale)
+    sections = np.arange(int(1068 * scale))
+    barri = sections % neighborhoods + 1
+
+    n_sections, n_years = len(sections), len(years)
+    property_values = pd.DataFrame({
+        'Codi_barri': np.tile(np.repeat(barri, len(VALUE_KINDS)), n_years),
+        'year': np.repeat(np.array(list(years)), n_sections * len(VALUE_KINDS)),
+        'Desc_valors': np.tile(VALUE_KINDS, n_sections * n_years),
+    })
+    property_values['Valors'] = rng.gamma(4.0, 250.0, len(property_values))
+    income = pd.DataFrame({'Codi_barri': np.tile(barri, n_years), 'year': np.repeat(np.array(list(years)), n_sections)})
+    income['Import_Renda_Bruta_€'] = rng.normal(40_000, 9_000, len(income)).round()
+    studies = pd.DataFrame({
+        'Codi_barri': np.tile(np.repeat(barri, 12), n_years),
+        'year': np.repeat(np.array(list(years)), n_sections * 12),
+        'NIV_EDUCA_esta': np.tile(np.repeat(np.arange(1, 7), 2), n_sections * n_years),
+        'SEXE': np.tile([1, 2], n_sections * n_years * 6),
+    })
+    studies['Valor'] = rng.poisson(120, len(studies)).astype(float)
+    # Age: one row per neighborhood, year, sex and age (0-100)
+    ages = np.arange(101)
+    age = pd.DataFrame({
+        'Codi_barri': np.tile(np.repeat(np.arange(1, neighborhoods + 1), 2 * len(ages) * 3), n_years),
+        'year': np.repeat(np.array(list(years)), neighborhoods * 2 * len(ages) * 3),
+        'SEXE': np.tile(np.repeat([1, 2], len(ages)), neighborhoods * 3 * n_years),
+        'EDAT_1': np.tile(ages, neighborhoods * 2 * 3 * n_years),
+    })
+    age['Valor'] = rng.poisson(40, len(age)).astype(float)
+    areas = pd.DataFrame({'Codi_barri': np.arange(1, neighborhoods + 1), 'area_km2': rng.uniform(0.2, 5.0, neighborhoods)})
+    return {'property_values': property_values, 'income': income, 'studies': studies, 'age': age,
+            'areas': areas}
+
+
+# --- NOTEBOOK PATH ---
+
+def notebook_features(sources: dict) -> pd.DataFrame:
+    """The feature cells of data_preprocess_barcelona.ipynb, as they were."""
+    property_values_df, income_df = sources['property_values'], sources['income']
+    studies_df, age_df, areas = sources['studies'], sources['age'], sources['areas']
+
+    prop_price_m2 = property_values_df[property_values_df['Desc_valors'] == 'Valor_cadastral_unitari_€/m2']
+    median_price_per_m2 = prop_price_m2.groupby(['Codi_barri', 'year'])['Valors'].median().reset_index()
+    median_price_per_m2.rename(columns={'Valors': 'median_price_per_m2'}, inplace=True)
+
+    median_household_income = income_df.groupby(['Codi_barri', 'year'])['Import_Renda_Bruta_€'].median().reset_index()
+    median_household_income.rename(columns={'Import_Renda_Bruta_€': 'median_household_income'}, inplace=True)
+
+    total_pop_studies = studies_df.groupby(['Codi_barri', 'year'])['Valor'].sum().reset_index()
+    total_pop_studies.rename(columns={'Valor': 'total_population_studies'}, inplace=True)
+    higher_edu_pop = studies_df[studies_df['NIV_EDUCA_esta'].isin([5, 6])]
+    higher_edu_counts = higher_edu_pop.groupby(['Codi_barri', 'year'])['Valor'].sum().reset_index()
+    higher_edu_counts.rename(columns={'Valor': 'population_higher_education'}, inplace=True)
+    education_features = pd.merge(total_pop_studies, higher_edu_counts, on=['Codi_barri', 'year'])
+    education_features['pct_higher_education'] = (education_features['population_higher_education']
+                                                  / education_features['total_population_studies']) * 100
+
+    total_population = age_df.groupby(['Codi_barri', 'year'])['Valor'].sum().reset_index()
+    total_population.rename(columns={'Valor': 'total_population'}, inplace=True)
+    young_adults_pop = age_df[age_df['EDAT_1'].between(20, 39)]
+    young_adult_counts = young_adults_pop.groupby(['Codi_barri', 'year'])['Valor'].sum().reset_index()
+    young_adult_counts.rename(columns={'Valor': 'young_adult_population'}, inplace=True)
+    population_features = pd.merge(total_population, young_adult_counts, on=['Codi_barri', 'year'])
+    population_features['pct_young_adults'] = (population_features['young_adult_population']
+                                               / population_features['total_population']) * 100
+
+    std_price_per_m2 = prop_price_m2.groupby(['Codi_barri', 'year'])['Valors'].std().reset_index()
+    std_price_per_m2.rename(columns={'Valors': 'std_price_per_m2'}, inplace=True)
+    std_household_income = income_df.groupby(['Codi_barri', 'year'])['Import_Renda_Bruta_€'].std().reset_index()
+    std_household_income.rename(columns={'Import_Renda_Bruta_€': 'std_household_income'}, inplace=True)
+
+    population_features = pd.merge(population_features, areas, on='Codi_barri')
+    population_features['population_density'] = population_features['total_population'] / population_features['area_km2']
+
+    feature_dfs = [
+        median_household_income,
+        median_price_per_m2,
+        education_features[['Codi_barri', 'year', 'pct_higher_education']],
+        population_features[['Codi_barri', 'year', 'population_density', 'pct_young_adults']],
+        std_price_per_m2,
+        std_household_income,
+    ]
+    return reduce(lambda left, right: pd.merge(left, right, on=['Codi_barri', 'year'], how='inner'), feature_dfs)
+
+
+def engine_features(sources: dict) -> pd.DataFrame:
+    return compute_features(sources, BARCELONA_FEATURES, keys=['Codi_barri', 'year'],
+                            static=sources['areas'].set_index('Codi_barri')).reset_index()
+
+
+# --- BENCHMARK ---
+
+def best_of(function, argument, repeat: int):
+    """Best wall time of `repeat` runs of `function(argument)`, and the last result."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(argument)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def bench_features(scale: float, repeat: int) -> dict:
+    sources = synthetic_sources(scale)
+    notebook_seconds, expected = best_of(notebook_features, sources, repeat)
+    engine_seconds, actual = best_of(engine_features, sources, repeat)
+    expected = expected.sort_values(['Codi_barri', 'year']).reset_index(drop=True)
+    pd.testing.assert_frame_equal(actual[expected.columns], expected, check_dtype=False)
+    return {
+        'scale': scale,
+        'source_rows': {name: len(frame) for name, frame in sources.items()},
+        'output_rows': len(actual),
+        'notebook_seconds': round(notebook_seconds, 4),
+        'engine_seconds': round(engine_seconds, 4),
+        'speedup': round(notebook_seconds / engine_seconds, 2),
+    }
+
+
+def bench_geostore(neighborhoods: int, years: int, repeat: int) -> dict:
+    """Size and load time of a master table stored as CSV + WKT vs. the GeoParquet layout."""
+    # Imported here so the feature benchmark runs without the geo stack
+    import geopandas as gpd
+    import shapely
+    from shapely import wkt
+    from .geostore import read_master, split_geometry, write_master
+
+    rng = np.random.default_rng(0)
+    # Neighborhood-sized polygons with ~300 vertices, in EPSG:25831 metres
+    polygons = [shapely.Point(425_000 + (i % 10) * 1_500, 4_578_000 + (i // 10) * 1_500).buffer(700, quad_segs=75)
+                for i in range(neighborhoods)]
+    master = pd.DataFrame({
+        'neighborhood_id': np.tile([f"BCN_{i + 1}" for i in range(neighborhoods)], years),
+        'year': np.repeat(np.arange(2025 - years, 2025), neighborhoods),
+        'median_household_income': rng.normal(40_000, 9_000, neighborhoods * years),
+        'median_price_per_m2': rng.gamma(4.0, 250.0, neighborhoods * years),
+        'geometry': np.tile(shapely.to_wkt(polygons), years),
+    })
+
+    def load_csv(path):
+        df = pd.read_csv(path)
+        df['geometry'] = df['geometry'].apply(wkt.loads)
+        return gpd.GeoDataFrame(df, geometry='geometry', crs='epsg:25831').to_crs(epsg=4326)
+
+    with tempfile.TemporaryDirectory() as directory, quiet_prints():
+        csv_path = os.path.join(directory, 'master_dataframe.csv')
+        master.to_csv(csv_path, index=False)
+        attributes, geometries = split_geometry(master, crs='EPSG:25831')
+        parquet_paths = write_master(attributes, geometries, os.path.join(directory, 'master'))
+        csv_seconds, _ = best_of(load_csv, csv_path, repeat)
+        parquet_seconds, _ = best_of(lambda base: read_master(base, with_geometry=True, to_crs=4326),
+                                     os.path.join(directory, 'master'), repeat)
+        csv_bytes = os.path.getsize(csv_path)
+        parquet_bytes = sum(os.path.getsize(path) for path in parquet_paths)
+    return {
+        'neighborhoods': neighborhoods,
+        'years': years,
+        'csv_wkt_mb': round(csv_bytes / 1024 ** 2, 3),
+        'geoparquet_mb': round(parquet_bytes / 1024 ** 2, 3),
+        'size_ratio': round(csv_bytes / parquet_bytes, 1),
+        'csv_wkt_load_seconds': round(csv_seconds, 4),
+        'geoparquet_load_seconds': round(parquet_seconds, 4),
+    }
+
+
+def bench_spatial(points: int, grid: int, repeat: int) -> dict:
+    """Point-in-polygon assignment: NeighborhoodIndex against testing every polygon in turn."""
+    import geopandas as gpd
+    import shapely
+    from .spatial import NeighborhoodIndex
+
+    # grid x grid neighborhoods of ~1 km2 with 400-vertex borders, in EPSG:25831 metres
+    cells = [shapely.box(425_000 + i * 1_000, 4_578_000 + j * 1_000, 426_000 + i * 1_000, 4_579_000 + j * 1_000)
+             for i in range(grid) for j in range(grid)]
+    polygons = shapely.segmentize(np.array(cells), 10)
+    ids = np.array([f"BCN_{k + 1}" for k in range(len(polygons))], dtype=object)
+    rng = np.random.default_rng(0)
+    x = rng.uniform(424_000, 426_000 + grid * 1_000, points)
+    y = rng.uniform(4_577_000, 4_579_000 + grid * 1_000, points)
+
+    def naive(_):
+        result = np.full(points, None, dtype=object)
+        for polygon, neighborhood_id in zip(polygons, ids):
+            result[shapely.contains_xy(polygon, x, y) & pd.isna(result)] = neighborhood_id
+        return result
+
+    build_start = time.perf_counter()
+    index = NeighborhoodIndex(ids, gpd.GeoSeries(polygons, crs="EPSG:25831"))
+    build_seconds = time.perf_counter() - build_start
+    naive_seconds, expected = best_of(naive, None, repeat)
+    index_seconds, actual = best_of(lambda _: index.assign_points(x, y, crs="EPSG:25831"), None, repeat)
+    inside = ~pd.isna(expected)
+    assert (actual[inside] == expected[inside]).all()
+    return {
+        'points': points,
+        'neighborhoods': len(polygons),
+        'index_build_seconds': round(build_seconds, 4),
+        'naive_seconds': round(naive_seconds, 4),
+        'index_seconds': round(index_seconds, 4),
+        'speedup': round(naive_seconds / index_seconds, 2),
+        'points_per_sec': round(points / index_seconds),
+    }
+
+
+def synthetic_osm(directory, nodes: int, grid: int, seed: int = 0) -> dict:
+    """
+    A grid x grid city of ~1 km2 neighborhoods around Barcelona written as
+    an OSM extract: `nodes` nodes, a tenth of them amenities, and a closed
+    way (building) per 40 nodes, half of them hotels. Returns the paths,
+    the neighborhood polygons and every amenity's (type, lon, lat).
+    """
+    import shapely
+    rng = np.random.default_rng(seed)
+    step_lon, step_lat = 0.012, 0.009
+    # Borders sit half a 1e-7 step off the 7-decimal OSM coordinates, so no node or centroid lies on one
+    west, south = 2.10 + 5e-8, 41.35 + 5e-8
+    cells = [shapely.box(west + i * step_lon, south + j * step_lat, west + (i + 1) * step_lon, south + (j + 1) * step_lat)
+             for i in range(grid) for j in range(grid)]
+    lon = rng.uniform(2.09, 2.11 + grid * step_lon, nodes).round(7)
+    lat = rng.uniform(41.34, 41.36 + grid * step_lat, nodes).round(7)
+    kinds = [('amenity', 'cafe', 'cafe'), ('amenity', 'restaurant', 'restaurant'), ('amenity', 'pub', 'bar'),
+             ('shop', 'bakery', 'bakery'), ('tourism', 'gallery', 'art_gallery'), ('highway', 'crossing', None)]
+    node_kind = np.where(rng.random(nodes) < 0.1, rng.integers(0, len(kinds), nodes), -1)
+    ways = [(k, [k * 40 + 1, k * 40 + 2, k * 40 + 3, k * 40 + 1], rng.random() < 0.5) for k in range(nodes // 40)]
+
+    amenities = [(kinds[kind][2], lon[n], lat[n]) for n, kind in enumerate(node_kind) if kind >= 0 and kinds[kind][2]]
+    for _, refs, hotel in ways:
+        if hotel:
+            amenities.append(('hotel', lon[np.array(refs[:3]) - 1].mean(), lat[np.array(refs[:3]) - 1].mean()))
+
+    xml_path = os.path.join(directory, 'city.osm')
+    with open(xml_path, 'w', encoding='utf-8') as f:
+        f.write("<?xml version='1.0' encoding='UTF-8'?>\n<osm version=\"0.6\">\n")
+        for n in range(nodes):
+            kind = node_kind[n]
+            if kind < 0:
+                f.write(f' <node id="{n + 1}" lat="{lat[n]}" lon="{lon[n]}"/>\n')
+            else:
+                key, value, _ = kinds[kind]
+                f.write(f' <node id="{n + 1}" lat="{lat[n]}" lon="{lon[n]}"><tag k="{key}" v="{value}"/></node>\n')
+        for k, refs, hotel in ways:
+            f.write(f' <way id="{k + 1}">' + "".join(f'<nd ref="{ref}"/>' for ref in refs)
+                    + ('<tag k="tourism" v="hotel"/>' if hotel else '<tag k="building" v="yes"/>') + '</way>\n')
+        f.write("</osm>\n")
+
+    paths = {'xml': xml_path}
+    try:
+        import osmium
+    except ImportError:
+        osmium = None
+    if osmium is not None:
+        paths['pbf'] = os.path.join(directory, 'city.osm.pbf')
+        writer = osmium.SimpleWriter(paths['pbf'], overwrite=True)
+        for n in range(nodes):
+            kind = node_kind[n]
+            tags = {kinds[kind][0]: kinds[kind][1]} if kind >= 0 else {}
+            writer.add_node(osmium.osm.mutable.Node(id=n + 1, location=(lon[n], lat[n]), tags=tags))
+        for k, refs, hotel in ways:
+            writer.add_way(osmium.osm.mutable.Way(id=k + 1, nodes=refs,
+                                                  tags={'tourism': 'hotel'} if hotel else {'building': 'yes'}))
+        writer.close()
+    return {'paths': paths, 'polygons': cells, 'amenities': amenities}
+
+
+def bench_amenities(nodes: int, grid: int, repeat: int) -> dict:
+    """
+    One pass of amenities.py over each format of a synthetic extract (PBF
+    with the disk-backed and the in-memory node location index), with the
+    peak RSS growth of the pass. The counts are checked against the
+    fixture's amenities counted neighborhood by neighborhood.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    import geopandas as gpd
+    import shapely
+    from .amenities import count_amenities
+    from .spatial import NeighborhoodIndex
+
+    with tempfile.TemporaryDirectory() as directory:
+        fixture = synthetic_osm(directory, nodes, grid)
+        ids = np.array([f"BCN_{k + 1}" for k in range(len(fixture['polygons']))], dtype=object)
+        index = NeighborhoodIndex(ids, gpd.GeoSeries(fixture['polygons'], crs="EPSG:4326"))
+        types = np.array([amenity for amenity, _, _ in fixture['amenities']], dtype=object)
+        lon = np.array([x for _, x, _ in fixture['amenities']])
+        lat = np.array([y for _, _, y in fixture['amenities']])
+
+        def per_neighborhood(_):
+            rows = []
+            for polygon, neighborhood_id in zip(fixture['polygons'], ids):
+                inside = shapely.contains_xy(polygon, lon, lat)
+                for amenity_type, count in pd.Series(types[inside]).value_counts().items():
+                    rows.append((neighborhood_id, amenity_type, count))
+            return pd.DataFrame(rows, columns=['neighborhood_id', 'amenity_type', 'count'])
+
+        reference_seconds, expected = best_of(per_neighborhood, None, repeat)
+        expected = expected.sort_values(['neighborhood_id', 'amenity_type'], ignore_index=True)
+        result = {
+            'nodes': nodes,
+            'ways': nodes // 40,
+            'neighborhoods': len(ids),
+            'amenities': len(types),
+            'reference_count_seconds': round(reference_seconds, 4),
+        }
+        runs = [('xml', fixture['paths']['xml'], None)]
+        if 'pbf' in fixture['paths']:
+            runs += [('pbf', fixture['paths']['pbf'], 'sparse_file_array'),
+                     ('pbf_in_memory', fixture['paths']['pbf'], 'flex_mem')]
+        for label, path, storage in runs:
+            with quiet_prints():
+                seconds, counts = best_of(lambda p: count_amenities(p, index, storage=storage), path, repeat)
+            pd.testing.assert_frame_equal(counts, expected, check_dtype=False)
+            # RSS covers libosmium's index too; a fresh process keeps earlier runs out of the peak
+            with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+                growth = pool.submit(amenity_pass_rss, path, ids, fixture['polygons'], storage).result()
+            result[f'{label}_pass_seconds'] = round(seconds, 4)
+            result[f'{label}_bytes'] = os.path.getsize(path)
+            result[f'{label}_elements_per_sec'] = round((nodes + nodes // 40) / seconds)
+            result[f'{label}_rss_growth_mb'] = growth
+    return result
+
+
+def _proc_status_kb(field: str):
+    """A memory field of /proc/self/status (VmRSS, VmHWM...) in kB, or None off Linux."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def amenity_pass_rss(path, ids, polygons, storage):
+    """
+    Peak RSS growth (MB) of one count_amenities pass, run in a fresh worker
+    process: the peak is reset after the imports, then compared with the
+    RSS before the pass. None where /proc is not available.
+    """
+    import geopandas as gpd
+    from .amenities import count_amenities
+    from .spatial import NeighborhoodIndex
+
+    index = NeighborhoodIndex(ids, gpd.GeoSeries(polygons, crs="EPSG:4326"))
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')  # resets VmHWM, the peak RSS
+    except OSError:
+        return None
+    before = _proc_status_kb('VmRSS')
+    with quiet_prints():
+        count_amenities(path, index, storage=storage)
+    peak = _proc_status_kb('VmHWM')
+    return round((peak - before) / 1024, 1) if before is not None and peak is not None else None
+
+
+@contextlib.contextmanager
+def quiet_prints():
+    """Silences progress prints so they are not measured."""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmark of the preprocessing steps")
+    parser.add_argument('--only', choices=['features', 'geostore', 'spatial', 'amenities'], default=None)
+    parser.add_argument('--scale', type=float, nargs='+', default=[1, 3],
+                        help="Table sizes, as multiples of Barcelona (3 ~ three cities)")
+    parser.add_argument('--years', type=int, default=8, help="Years in the master table of the storage benchmark")
+    parser.add_argument('--points', type=int, default=500_000, help="Points assigned by the spatial benchmark")
+    parser.add_argument('--nodes', type=int, default=400_000, help="Nodes in the OSM extract of the amenities benchmark")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement (best is kept)")
+    parser.add_argument('--output', default=None, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'args': vars(args),
+        },
+    }
+    if args.only in (None, 'features'):
+        report['features'] = []
+        for scale in args.scale:
+            print(f"→ Features: scale {scale}", file=sys.stderr)
+            report['features'].append(bench_features(scale, args.repeat))
+
+    if args.only in (None, 'geostore'):
+        report['geostore'] = []
+        for scale in args.scale:
+            print(f"→ Master storage: scale {scale}", file=sys.stderr)
+            report['geostore'].append(bench_geostore(int(73 * scale), args.years, args.repeat))
+
+    if args.only in (None, 'spatial'):
+        report['spatial'] = []
+        for scale in args.scale:
+            grid = int(round((73 * scale) ** 0.5))
+            print(f"→ Spatial assignment: {args.points} points, {grid * grid} neighborhoods", file=sys.stderr)
+            report['spatial'].append(bench_spatial(args.points, grid, args.repeat))
+
+    if args.only in (None, 'amenities'):
+        report['amenities'] = []
+        for scale in args.scale:
+            grid = int(round((73 * scale) ** 0.5))
+            print(f"→ OSM amenities: {args.nodes} nodes, {grid * grid} neighborhoods", file=sys.stderr)
+            report['amenities'].append(bench_amenities(args.nodes, grid, args.repeat))
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+        print(f"✓ Benchmark report written to {args.output}", file=sys.stderr)
+    else:
+        print(text)
@@ -0,0 +1,69 @@
+from pathlib import Path
+
+# The root directory of the project is one level up from this package
+# (preprocessing/ -> gentrification_project/)
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# --- Data Paths ---
+DATA_DIR = PROJECT_ROOT / "data"
+RAW_DATA_DIR = DATA_DIR / "raw"
+PREPROCESSED_DIR = DATA_DIR / "preprocessed"
+
+# --- Ingestion Cache ---
+# Each yearly CSV is parsed once and kept as Parquet, keyed by the file's mtime
+# and size; only new or changed years are read again
+INGEST_CACHE_DIR = PREPROCESSED_DIR / ".cache" / "ingest"
+# Yearly files read in parallel (threads, or processes with processes=True)
+INGEST_WORKERS = 4
+# Placeholder Open Data BCN uses for values suppressed for privacy
+NA_VALUES = ["..", ""]
+
+# --- Neighborhood Boundaries ---
+# Polygons listings and amenities are assigned to (see spatial.py). `id_column`
+# values become `<id_prefix><code>`, matching the master dataframes' neighborhood_id;
+# `name_columns` feed the name fallback for rows without coordinates (Paris
+# listings only carry a postal code, which spans several quartiers: they need
+# coordinates). Milan is not configured yet.
+NEIGHBORHOOD_BOUNDARIES = {
+    "barcelona": {
+        "path": RAW_DATA_DIR / "barcelona" / "BCN_UNITATS_ADM" / "0301040100_Barris_UNITATS_ADM.shp",
+        "id_column": "BARRI",
+        "id_prefix": "BCN_",
+        "name_columns": ["NOM"],
+    },
+    "paris": {
+        "path": RAW_DATA_DIR / "paris" / "quartier_paris.geojson",
+        "id_column": "c_qu",
+        "id_prefix": "PAR_",
+        "name_columns": ["l_qu"],
+    },
+}
+# Points assigned per STRtree query, to bound the size of the match arrays
+SPATIAL_BATCH_SIZE = 250_000
+
+# --- OSM Amenities ---
+# Local OpenStreetMap extracts (.osm.pbf, or .osm XML) read by amenities.py,
+# e.g. the Geofabrik extract of each region
+OSM_DIR = RAW_DATA_DIR / "osm"
+# Amenity type -> OSM tags that count as one (key: accepted values)
+AMENITY_TAGS = {
+    "cafe": {"amenity": ["cafe"]},
+    "restaurant": {"amenity": ["restaurant"]},
+    "bar": {"amenity": ["bar", "pub", "biergarten"]},
+    "fast_food": {"amenity": ["fast_food"]},
+    "art_gallery": {"tourism": ["gallery"], "shop": ["art"]},
+    "arts_centre": {"amenity": ["arts_centre", "theatre", "cinema"]},
+    "coworking": {"amenity": ["coworking_space"], "office": ["coworking"]},
+    "bakery": {"shop": ["bakery", "pastry"]},
+    "organic_shop": {"shop": ["organic", "health_food"], "organic": ["only"]},
+    "supermarket": {"shop": ["supermarket", "convenience"]},
+    "hotel": {"tourism": ["hotel", "hostel", "guest_house", "apartment"]},
+}
+# Matched amenities binned into neighborhoods per batch
+AMENITY_BATCH_SIZE = 100_000
+# libosmium node location index used to place ways from .osm.pbf extracts. It
+# holds every node of the extract (not only the city's), so it is kept on disk
+# (a memory-mapped temporary file, 16 bytes per node); "flex_mem" keeps it in RAM
+OSM_LOCATION_STORAGE = "sparse_file_array"
+# Directory of that temporary file (None: the system temp directory)
+OSM_LOCATION_DIR = None
@@ -0,0 +1,227 @@
+"""
+Declarative neighborhood-year feature aggregation.
+
+A feature is described once, as data, instead of as a filter + groupby +
+rename + merge block per feature:
+
+    Aggregate('median_price_per_m2', 'property_values', 'Valors', 'median',
+              where={'Desc_valors': 'Valor_cadastral_unitari_€/m2'})
+    Ratio('pct_young_adults', 'young_adult_population', 'total_population', scale=100)
+
+`compute_features` evaluates every Aggregate of a source in a single grouped
+pass: the (neighborhood, year) group of each row is computed once, each
+filter becomes a row mask, sums / counts / means are bincounts over the
+group codes and the other aggregations (median, std...) one named `agg`
+over all the masked columns. The sources are then aligned on the shared
+(neighborhood, year) index with one concat, and the Ratios computed
+column-wise. Nothing is specific to a city:
+the key columns and the specs are arguments, BARCELONA_FEATURES is the
+Barcelona model.
+"""
+import numpy as np
+import pandas as pd
+
+
+class Aggregate:
+    """
+    `agg` ('median', 'sum', 'std', 'mean', 'count'...) of `column` over the
+    rows of `source` matching `where`.
+
+    `where` maps columns to a value (equality) or to a list / set / range of
+    accepted values. `keep=False` marks an intermediate feature only used by
+    a Ratio.
+    """
+
+    def __init__(self, name: str, source: str, column: str, agg: str, where: dict = None, keep: bool = True):
+        self.name = name
+        self.source = source
+        self.column = column
+        self.agg = agg
+        self.where = where or {}
+        self.keep = keep
+
+    def __repr__(self):
+        return f"Aggregate({self.name!r}, {self.source!r}, {self.column!r}, {self.agg!r})"
+
+
+class Ratio:
+    """`scale * numerator / denominator`, where both are features or columns of `static`."""
+
+    def __init__(self, name: str, numerator: str, denominator: str, scale: float = 1.0, keep: bool = True):
+        self.name = name
+        self.numerator = numerator
+        self.denominator = denominator
+        self.scale = scale
+        self.keep = keep
+
+    def __repr__(self):
+        return f"Ratio({self.name!r}, {self.numerator!r}, {self.denominator!r})"
+
+
+# --- SPECS ---
+
+BARCELONA_FEATURES = [
+    Aggregate('median_household_income', 'income', 'Import_Renda_Bruta_€', 'median'),
+    Aggregate('median_price_per_m2', 'property_values', 'Valors', 'median',
+              where={'Desc_valors': 'Valor_cadastral_unitari_€/m2'}),
+    Aggregate('total_population_studies', 'studies', 'Valor', 'sum', keep=False),
+    Aggregate('population_higher_education', 'studies', 'Valor', 'sum', where={'NIV_EDUCA_esta': [5, 6]},
+              keep=False),
+    Ratio('pct_higher_education', 'population_higher_education', 'total_population_studies', scale=100),
+    Aggregate('total_population', 'age', 'Valor', 'sum', keep=False),
+    Aggregate('young_adult_population', 'age', 'Valor', 'sum', where={'EDAT_1': range(20, 40)}, keep=False),
+    Ratio('population_density', 'total_population', 'area_km2'),
+    Ratio('pct_young_adults', 'young_adult_population', 'total_population', scale=100),
+    Aggregate('std_price_per_m2', 'property_values', 'Valors', 'std',
+              where={'Desc_valors': 'Valor_cadastral_unitari_€/m2'}),
+    Aggregate('std_household_income', 'income', 'Import_Renda_Bruta_€', 'std'),
+]
+
+
+# --- ENGINE ---
+
+def row_mask(df: pd.DataFrame, where: dict):
+    """Boolean array of the rows of `df` matching every condition of `where` (None: all rows)."""
+    mask = None
+    for column, accepted in where.items():
+        if isinstance(accepted, (list, tuple, set, frozenset, range, np.ndarray, pd.Index)):
+            condition = df[column].isin(accepted).to_numpy(dtype=bool)
+        else:
+            condition = (df[column] == accepted).to_numpy(dtype=bool, na_value=False)
+        mask = condition if mask is None else mask & condition
+    return mask
+
+
+# Aggregations computed with np.bincount over the group codes; others go through one groupby
+BINCOUNT_AGGS = {'sum', 'count', 'mean'}
+
+
+def group_codes(df: pd.DataFrame, keys: list):
+    """
+    Dense group number of every row (-1 if a key is missing) and the
+    (sorted) index of the groups. Each key is coded on its own and the codes
+    combined arithmetically, which is much cheaper than hashing the key
+    tuples. Only occupied (key, key...) cells become groups.
+    """
+    codes, levels = [], []
+    for key in keys:
+        key_codes, uniques = _key_codes(df[key])
+        codes.append(key_codes)
+        levels.append(uniques)
+    valid = np.logical_and.reduce([key_codes >= 0 for key_codes in codes])
+    shape = tuple(max(1, len(uniques)) for uniques in levels)
+    cells = np.ravel_multi_index([np.where(valid, key_codes, 0) for key_codes in codes], shape)
+    occupied, groups = np.unique(cells[valid], return_inverse=True) if np.prod(shape) > 4 * len(df) + 1 \
+        else _occupied_cells(cells[valid], int(np.prod(shape)))
+    ids = np.full(len(df), -1, dtype=np.int64)
+    ids[valid] = groups
+    positions = np.unravel_index(occupied, shape)
+    index = pd.MultiIndex.from_arrays([uniques[position] for uniques, position in zip(levels, positions)],
+                                      names=keys)
+    return ids, index
+
+
+def _key_codes(column: pd.Series):
+    """Sorted codes of one key. Small-range integer keys (codes, years) are offset instead of hashed."""
+    if pd.api.types.is_integer_dtype(column.dtype) and len(column) and not column.hasnans:
+        numbers = column.to_numpy(dtype=np.int64)
+        low, high = numbers.min(), numbers.max()
+        if high - low < 4 * len(numbers):
+            return numbers - low, pd.Index(np.arange(low, high + 1), dtype=column.dtype)
+    return pd.factorize(column, sort=True)
+
+
+def _occupied_cells(cells: np.ndarray, size: int):
+    """`np.unique(cells, return_inverse=True)` for small dense grids, with a bincount instead of a sort."""
+    occupied = np.flatnonzero(np.bincount(cells, minlength=size))
+    lookup = np.full(size, -1, dtype=np.int64)
+    lookup[occupied] = np.arange(len(occupied))
+    return occupied, lookup[cells]
+
+
+def aggregate_source(df: pd.DataFrame, specs: list, keys: list):
+    """
+    Evaluates every Aggregate of one source in a single grouped pass over
+    shared group codes. Returns the aggregated values and, per feature,
+    whether the group had any matching row (the notebook's filtered groupbys
+    simply had no row for it).
+    """
+    ids, index = group_codes(df, keys)
+    grouped = ids >= 0
+    n_groups = len(index)
+    masks, values, present, others = {}, {}, {}, {}
+    for spec in specs:
+        mask = grouped
+        if spec.where:
+            # Specs sharing a filter share its mask
+            mask_key = repr(sorted((column, repr(accepted)) for column, accepted in spec.where.items()))
+            if mask_key not in masks:
+                masks[mask_key] = grouped & row_mask(df, spec.where)
+            mask = masks[mask_key]
+            present[spec.name] = np.bincount(ids[mask], minlength=n_groups) > 0
+        else:
+            present[spec.name] = np.ones(n_groups, dtype=bool)
+
+        column = df[spec.column]
+        if spec.agg in BINCOUNT_AGGS:
+            numbers = pd.to_numeric(column).to_numpy(dtype=float, na_value=np.nan)
+            counted = mask & ~np.isnan(numbers)
+            count = np.bincount(ids[counted], minlength=n_groups).astype(float)
+            total = np.bincount(ids[counted], numbers[counted], minlength=n_groups)
+            values[spec.name] = {'sum': total, 'count': count}.get(spec.agg)
+            if spec.agg == 'mean':
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    values[spec.name] = np.where(count > 0, total / count, np.nan)
+        else:
+            others[spec.name] = (column.where(mask).to_numpy() if spec.where else column.to_numpy(), spec.agg)
+
+    if others:
+        frame = pd.DataFrame({name: column for name, (column, _) in others.items()})
+        aggregated = frame[grouped].groupby(ids[grouped], sort=True).agg({name: agg for name, (_, agg) in others.items()})
+        aggregated = aggregated.reindex(np.arange(n_groups))
+        for name in others:
+            values[name] = aggregated[name].to_numpy()
+
+    names = [spec.name for spec in specs]
+    return (pd.DataFrame({name: values[name] for name in names}, index=index),
+            pd.DataFrame({name: present[name] for name in names}, index=index))
+
+
+def compute_features(sources: dict, specs: list, keys=('Codi_barri', 'year'), static: pd.DataFrame = None,
+                     how: str = 'inner') -> pd.DataFrame:
+    """
+    Computes `specs` over `sources` ({name: DataFrame}, each with the `keys`
+    columns) and returns one row per (neighborhood, year), indexed by `keys`.
+
+    - `static`: per-neighborhood columns (e.g. `area_km2`) indexed by the
+      first key, usable as Ratio denominators.
+    - `how`: 'inner' keeps the groups every feature has rows for (as the
+      notebook's chained inner merges did), 'outer' keeps every group.
+    """
+    keys = list(keys)
+    aggregates = [spec for spec in specs if isinstance(spec, Aggregate)]
+    values, present = [], []
+    for source in dict.fromkeys(spec.source for spec in aggregates):
+        source_values, source_present = aggregate_source(
+            sources[source], [spec for spec in aggregates if spec.source == source], keys)
+        values.append(source_values)
+        present.append(source_present)
+
+    # One alignment of every source on the shared index, instead of a merge per feature
+    features = pd.concat(values, axis=1, join='outer', sort=True)
+    present = pd.concat(present, axis=1, join='outer', sort=True).reindex(features.index)
+    present = present.fillna(False).astype(bool)
+
+    if static is not None:
+        neighborhoods = features.index.get_level_values(keys[0])
+        for column in static.columns:
+            features[column] = static[column].reindex(neighborhoods).to_numpy()
+        present['__static'] = neighborhoods.isin(static.index)
+
+    for spec in specs:
+        if isinstance(spec, Ratio):
+            features[spec.name] = spec.scale * features[spec.numerator] / features[spec.denominator]
+
+    if how == 'inner':
+        features = features[present.all(axis=1).to_numpy()]
+    return features[[spec.name for spec in specs if spec.keep]]
@@ -0,0 +1,140 @@
+"""
+GeoParquet storage for the neighborhood-year master dataframes.
+
+A master dataset is written as two files:
+
+    barcelona_master.parquet           one row per (neighborhood_id, year), no geometry
+    barcelona_master_geometry.parquet  GeoParquet, one row per neighborhood_id:
+                                       WKB geometry, CRS in the file metadata
+
+so each polygon is stored once instead of once per year, and loading is a
+columnar read plus a vectorized WKB decode (no per-row `wkt.loads`). The
+geometry is only read when it is asked for:
+
+    master = MasterDataset("../data/preprocessed/barcelona/barcelona_master")
+    master.frame                               # plain DataFrame, no geometry read
+    master.to_geodataframe(year=2025, to_crs=4326)
+
+Existing CSVs with a WKT geometry column can be converted with:
+
+    python -m preprocessing.geostore ../data/preprocessed/barcelona/barcelona_master_dataframe.csv --crs EPSG:25831
+"""
+import argparse
+from pathlib import Path
+
+import geopandas as gpd
+import pandas as pd
+import shapely
+
+
+GEOMETRY_SUFFIX = "_geometry"
+
+
+def _paths(base) -> tuple:
+    """(attributes, geometry) file paths for a dataset base path (with or without .parquet)."""
+    base = Path(base)
+    if base.suffix == '.parquet':
+        base = base.with_suffix('')
+    return base.with_suffix('.parquet'), base.with_name(base.name + GEOMETRY_SUFFIX + '.parquet')
+
+
+def split_geometry(master: pd.DataFrame, key: str = 'neighborhood_id', crs=None) -> tuple:
+    """
+    Splits a long table holding one geometry per row into (attributes,
+    geometries): the table without its geometry column, and a GeoDataFrame
+    with one geometry per `key`. WKT strings are decoded in bulk.
+    """
+    geometry_column = master.geometry.name if isinstance(master, gpd.GeoDataFrame) else 'geometry'
+    crs = crs if crs is not None else getattr(master, 'crs', None)
+    first = master.drop_duplicates(subset=key)
+    values = first[geometry_column].to_numpy()
+    if len(values) and isinstance(values[0], str):
+        values = shapely.from_wkt(values)
+    geometries = gpd.GeoDataFrame({key: first[key].to_numpy(), 'geometry': values}, geometry='geometry', crs=crs)
+    attributes = pd.DataFrame(master.drop(columns=geometry_column))
+    return attributes, geometries
+
+
+def write_master(attributes: pd.DataFrame, geometries: gpd.GeoDataFrame, base) -> tuple:
+    """
+    Writes a master dataset as `<base>.parquet` (attributes) and
+    `<base>_geometry.parquet` (GeoParquet, WKB + CRS). `geometries` holds one
+    row per neighborhood, with the same key column as `attributes`.
+    """
+    attributes_path, geometry_path = _paths(base)
+    attributes_path.parent.mkdir(parents=True, exist_ok=True)
+    if 'geometry' in attributes.columns:
+        attributes = attributes.drop(columns='geometry')
+    pd.DataFrame(attributes).to_parquet(attributes_path, index=False)
+    geometries.to_parquet(geometry_path, index=False)
+    print(f"✓ Saved {len(attributes)} rows to {attributes_path} and {len(geometries)} geometries to {geometry_path}")
+    return attributes_path, geometry_path
+
+
+class MasterDataset:
+    """
+    A master dataset on disk. `frame` is read on first use; the geometry
+    table only when `geometry` or `to_geodataframe` is used. A `columns`
+    subset always includes the key and `year`, which the joins and year
+    filters need.
+    """
+
+    def __init__(self, base, key: str = 'neighborhood_id', columns=None):
+        self.attributes_path, self.geometry_path = _paths(base)
+        self.key = key
+        self.columns = None if columns is None else list(dict.fromkeys([key, 'year', *columns]))
+        self._frame = None
+        self._geometry = None
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        if self._frame is None:
+            self._frame = pd.read_parquet(self.attributes_path, columns=self.columns)
+        return self._frame
+
+    @property
+    def geometry(self) -> gpd.GeoDataFrame:
+        """One geometry per neighborhood, indexed by the key column."""
+        if self._geometry is None:
+            self._geometry = gpd.read_parquet(self.geometry_path).set_index(self.key)
+        return self._geometry
+
+    def to_geodataframe(self, year=None, to_crs=None) -> gpd.GeoDataFrame:
+        """
+        The long table (or one `year` of it) with each row's neighborhood
+        geometry. Rows share the geometry objects, they are not copied.
+        """
+        frame = self.frame if year is None else self.frame[self.frame['year'] == year]
+        geometry = self.geometry
+        if to_crs is not None:
+            geometry = geometry.to_crs(to_crs)
+        shapes = geometry.geometry.reindex(frame[self.key].to_numpy())
+        return gpd.GeoDataFrame(frame.reset_index(drop=True), geometry=shapes.array, crs=geometry.crs)
+
+
+def read_master(base, with_geometry: bool = False, year=None, to_crs=None, columns=None):
+    """Reads a master dataset: a DataFrame, or a GeoDataFrame with `with_geometry`."""
+    master = MasterDataset(base, columns=columns)
+    if with_geometry:
+        return master.to_geodataframe(year=year, to_crs=to_crs)
+    return master.frame if year is None else master.frame[master.frame['year'] == year]
+
+
+def convert_csv(csv_path, base=None, crs=None, key: str = 'neighborhood_id') -> tuple:
+    """Converts a master CSV with a WKT `geometry` column into the two-file GeoParquet layout."""
+    csv_path = Path(csv_path)
+    master = pd.read_csv(csv_path)
+    attributes, geometries = split_geometry(master, key=key, crs=crs)
+    base = base or csv_path.with_name(csv_path.stem.replace('_dataframe', ''))
+    return write_master(attributes, geometries, base)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert master CSVs with WKT geometry to GeoParquet")
+    parser.add_argument('paths', nargs='+', help="Master CSVs with a WKT 'geometry' column")
+    parser.add_argument('--crs', default=None, help="CRS of the WKT coordinates (e.g. EPSG:25831)")
+    parser.add_argument('--key', default='neighborhood_id')
+    args = parser.parse_args()
+
+    for csv_path in args.paths:
+        convert_csv(csv_path, crs=args.crs, key=args.key)
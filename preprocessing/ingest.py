@@ -0,0 +1,188 @@
+"""
+Merging of yearly open data CSVs into one time series table.
+
+Open Data BCN (and the Paris / Milan sources) publish one file per year,
+named `{year}_{name}.csv`. `merge_csv_per_year` reads them in parallel with
+explicit dtypes and caches every parsed year as Parquet, keyed by the CSV's
+mtime and size. On the next run only new or changed years are parsed again,
+and the merged CSV is only rewritten when one of them changed:
+
+    from preprocessing import merge_csv_per_year
+    df = merge_csv_per_year("loc_hab_valors", 2018, 2025, "../data/raw/barcelona",
+                            output_path="../data/preprocessed/barcelona/2018-2025_loc_hab_valors.csv")
+"""
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from . import config
+
+
+# Bump to invalidate every cached year (e.g. after changing how files are parsed)
+CACHE_VERSION = 1
+
+# Types of the columns the Open Data BCN tables share; other columns are inferred
+DTYPES = {
+    # Codes
+    'Codi_Districte': 'Int32', 'Codi_districte': 'Int32',
+    'Codi_Barri': 'Int32', 'Codi_barri': 'Int32',
+    'Seccio_Censal': 'Int32', 'Seccio_censal': 'Int32',
+    'AEB': 'Int32', 'SEXE': 'Int32', 'EDAT_1': 'Int32', 'NIV_EDUCA_esta': 'Int32',
+    # Names and labels repeat on every row
+    'Nom_Districte': 'category', 'Nom_districte': 'category',
+    'Nom_Barri': 'category', 'Nom_barri': 'category',
+    'Desc_valors': 'category',
+    # Values ('..' marks a suppressed value and becomes NaN)
+    'Valor': 'float64', 'Valors': 'float64', 'Import_Renda_Bruta_€': 'float64',
+}
+
+
+def read_yearly_csv(path, year: int, dtypes: dict = None) -> pd.DataFrame:
+    """
+    Reads one yearly file with explicit dtypes, without its first column
+    (the reference date), and adds a `year` column.
+    """
+    dtypes = {**DTYPES, **(dtypes or {})}
+    header = pd.read_csv(path, nrows=0).columns
+    columns = list(header[1:])
+    df = pd.read_csv(path, usecols=columns, dtype={c: t for c, t in dtypes.items() if c in columns},
+                     na_values=config.NA_VALUES, keep_default_na=True)
+    df['year'] = pd.Series(year, index=df.index, dtype='Int32')
+    return df
+
+
+# --- CACHE ---
+
+def _file_key(path: Path, dtypes: dict) -> dict:
+    """What a cached year depends on: the file's mtime and size, and how it was parsed."""
+    stat = path.stat()
+    parsing = json.dumps([CACHE_VERSION, {**DTYPES, **(dtypes or {})}, config.NA_VALUES], sort_keys=True)
+    return {'file': path.name, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+            'parsing': hashlib.sha1(parsing.encode('utf-8')).hexdigest()}
+
+
+class YearCache:
+    """Parsed yearly tables of one dataset, as `<year>.parquet` files plus an `index.json`."""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.index_path = self.directory / 'index.json'
+        self.index = {'years': {}, 'outputs': {}}
+        if self.index_path.exists():
+            with open(self.index_path, encoding='utf-8') as f:
+                self.index = json.load(f)
+
+    def _path(self, year: int) -> Path:
+        return self.directory / f"{year}.parquet"
+
+    def get(self, year: int, key: dict):
+        """The cached table for `year`, or None if it is missing or stale."""
+        if self.index['years'].get(str(year)) != key or not self._path(year).exists():
+            return None
+        return pd.read_parquet(self._path(year))
+
+    def put(self, year: int, key: dict, df: pd.DataFrame):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._path(year).with_suffix('.tmp')
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, self._path(year))
+        self.index['years'][str(year)] = key
+
+    def output_is_current(self, output_path: Path, signature: str) -> bool:
+        return output_path.exists() and self.index['outputs'].get(str(output_path)) == signature
+
+    def record_output(self, output_path: Path, signature: str):
+        self.index['outputs'][str(output_path)] = signature
+
+    def save(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.index_path)
+
+
+# --- MERGE ---
+
+def merge_csv_per_year(name, yearStart, yearEnd, input_dir, output_path=None, verbose=True,
+                       dtypes: dict = None, workers: int = config.INGEST_WORKERS, processes: bool = False,
+                       cache_dir=None, use_cache: bool = True):
+    """
+    Merge yearly files named {year}_{name}.csv for years yearStart-yearEnd
+    into a single CSV named yearStart-yearEnd_{name}.csv by default.
+
+    Parameters:
+    - input_dir: path to the folder containing the yearly CSVs (string or Path)
+    - output_path: optional path (string or Path) for the merged CSV file
+    - verbose: print progress/messages if True
+    - dtypes: extra {column: dtype} on top of DTYPES
+    - workers / processes: size and kind of the pool reading changed years
+      (threads by default, processes for very large files)
+    - cache_dir: where parsed years are cached (default: INGEST_CACHE_DIR/<name>)
+    - use_cache: False re-reads every year and rewrites the merged CSV
+
+    Returns:
+    - pandas.DataFrame with the concatenated data
+    """
+    input_dir = Path(input_dir)
+    cache = YearCache(cache_dir or config.INGEST_CACHE_DIR / name) if use_cache else None
+    frames, to_read, keys = {}, {}, {}
+    for y in range(yearStart, yearEnd + 1):
+        fp = input_dir / f"{y}_{name}.csv"
+        if not fp.exists():
+            if verbose:
+                print(f"Missing: {fp.name}")
+            continue
+        keys[y] = _file_key(fp, dtypes)
+        cached = cache.get(y, keys[y]) if cache is not None else None
+        if cached is not None:
+            frames[y] = cached
+            if verbose:
+                print(f"Cached: {fp.name} ({len(cached)} rows)")
+        else:
+            to_read[y] = fp
+
+    if to_read:
+        pool_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        with pool_class(max_workers=max(1, min(workers, len(to_read)))) as pool:
+            futures = {y: pool.submit(read_yearly_csv, fp, y, dtypes) for y, fp in to_read.items()}
+            for y, future in futures.items():
+                try:
+                    frames[y] = future.result()
+                except Exception as e:
+                    keys.pop(y)
+                    if verbose:
+                        print(f"Failed to read {to_read[y]}: {e}")
+                    continue
+                if cache is not None:
+                    cache.put(y, keys[y], frames[y])
+                if verbose:
+                    print(f"Loaded: {to_read[y].name} ({len(frames[y])} rows)")
+
+    if not frames:
+        raise FileNotFoundError(f"No input files found for {yearStart}-{yearEnd} in {input_dir}")
+    out_df = pd.concat([frames[y] for y in sorted(frames)], ignore_index=True, sort=False)
+    # Years with different category sets concatenate to object: restore them
+    for column in out_df.columns:
+        if {**DTYPES, **(dtypes or {})}.get(column) == 'category' and out_df[column].dtype != 'category':
+            out_df[column] = out_df[column].astype('category')
+
+    out_path = Path(output_path) if output_path else input_dir / f"{yearStart}-{yearEnd}_{name}.csv"
+    signature = hashlib.sha1(json.dumps(keys, sort_keys=True).encode('utf-8')).hexdigest()
+    if cache is not None and cache.output_is_current(out_path, signature):
+        if verbose:
+            print(f"Unchanged: {out_path} ({len(out_df)} total rows)")
+    else:
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        out_df.to_csv(out_path, index=False)
+        if cache is not None:
+            cache.record_output(out_path, signature)
+        if verbose:
+            print(f"Saved merged CSV to: {out_path} ({len(out_df)} total rows)")
+    if cache is not None:
+        cache.save()
+    return out_df
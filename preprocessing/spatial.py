@@ -0,0 +1,173 @@
+"""
+Assignment of points (listings, Airbnb, amenities) to neighborhood polygons.
+
+A NeighborhoodIndex holds one city's polygons (prepared) in a shapely
+STRtree, built once and cached per boundary file. Points are assigned in
+vectorized batches: a bulk tree query narrows each point down to the few
+polygons whose bounding box contains it, and only those are tested exactly
+with `intersects_xy`, instead of testing every point against every polygon.
+
+Scraped listings often have no coordinates, only the neighborhood name from
+the page ("Sant Gervasi - Galvany", "el Raval"...). Those are matched
+against a name index built from the boundary file, after folding case,
+accents, punctuation and leading articles:
+
+    index = city_index("barcelona")
+    df['neighborhood_id'] = index.assign(df, lon='longitude', lat='latitude',
+                                         names=['location_neighborhood', 'location_district'])
+
+Limitations: there is no postal-code fallback. SeLoger pages only give a
+postal code, and a Paris postal code covers a whole arrondissement (four
+quartiers), so Paris rows without coordinates stay unassigned rather than
+getting a guessed quartier. Milan has no boundary file in
+NEIGHBORHOOD_BOUNDARIES yet.
+"""
+import functools
+import re
+import unicodedata
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from pyproj import Transformer
+
+from . import config
+
+
+ARTICLES = re.compile(r"^(?:el|la|les|els|los|las|l|le|the|il|lo|gli|i)\s+")
+NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalize_name(name) -> str:
+    """Comparable form of a place name: "l'Antiga Esquerra de l'Eixample" -> "antiga esquerra de l eixample"."""
+    if name is None or (isinstance(name, float) and np.isnan(name)):
+        return ""
+    text = unicodedata.normalize('NFKD', str(name).lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = NON_ALNUM.sub(" ", text).strip()
+    return ARTICLES.sub("", text)
+
+
+class NeighborhoodIndex:
+    """
+    Spatial and name index over one city's neighborhood polygons.
+
+    - `ids`: the neighborhood ID of each polygon.
+    - `geometries`: GeoSeries / GeoDataFrame geometry, with a CRS.
+    - `names`: optional {name: id} pairs for the text fallback; a name
+      shared by several neighborhoods is ambiguous and left out.
+    """
+
+    def __init__(self, ids, geometries, names: dict = None):
+        self.ids = np.asarray(ids, dtype=object)
+        self.crs = geometries.crs
+        self.polygons = np.asarray(geometries.geometry.array if hasattr(geometries, 'geometry') else geometries,
+                                   dtype=object)
+        shapely.prepare(self.polygons)
+        self.tree = shapely.STRtree(self.polygons)
+        self.names = {}
+        ambiguous = set()
+        for name, neighborhood_id in (names or {}).items():
+            key = normalize_name(name)
+            if not key:
+                continue
+            if key in self.names and self.names[key] != neighborhood_id:
+                ambiguous.add(key)
+            self.names[key] = neighborhood_id
+        for key in ambiguous:
+            del self.names[key]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def bounds(self, crs="EPSG:4326") -> tuple:
+        """(min x, min y, max x, max y) of all the polygons, in `crs`."""
+        bounds = shapely.total_bounds(self.polygons)
+        if crs is not None and self.crs is not None and not self.crs.equals(crs):
+            bounds = Transformer.from_crs(self.crs, crs, always_xy=True).transform_bounds(*bounds)
+        return tuple(float(b) for b in bounds)
+
+    # --- Points ---
+
+    def assign_points(self, x, y, crs="EPSG:4326", batch_size: int = config.SPATIAL_BATCH_SIZE) -> np.ndarray:
+        """
+        Neighborhood ID of every (x, y) point in `crs` (lon / lat by default);
+        None for missing coordinates and points outside every polygon. A
+        point on a shared border goes to one of the polygons.
+        """
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        if crs is not None and self.crs is not None and not self.crs.equals(crs):
+            x, y = Transformer.from_crs(crs, self.crs, always_xy=True).transform(x, y)
+        result = np.full(len(x), None, dtype=object)
+        valid = np.flatnonzero(~(np.isnan(x) | np.isnan(y)))
+        for start in range(0, len(valid), batch_size):
+            rows = valid[start:start + batch_size]
+            # Bounding boxes first (tree), then the exact test on the prepared candidate polygons
+            point_idx, polygon_idx = self.tree.query(shapely.points(x[rows], y[rows]))
+            inside = shapely.intersects_xy(self.polygons[polygon_idx], x[rows[point_idx]], y[rows[point_idx]])
+            point_idx, polygon_idx = point_idx[inside], polygon_idx[inside]
+            # Matches come sorted by point: keep the first polygon of each
+            first = np.unique(point_idx, return_index=True)[1]
+            result[rows[point_idx[first]]] = self.ids[polygon_idx[first]]
+        return result
+
+    # --- Names ---
+
+    def assign_names(self, names) -> np.ndarray:
+        """Neighborhood ID of every name found in the name index, else None."""
+        names = pd.Series(names, dtype=object)
+        # Listings repeat a few hundred distinct names: normalize each once
+        codes, uniques = pd.factorize(names)
+        matched = np.array([self.names.get(normalize_name(name)) for name in uniques] + [None], dtype=object)
+        return matched[codes]
+
+    def assign(self, df: pd.DataFrame, lon: str = 'longitude', lat: str = 'latitude', names=(),
+               crs="EPSG:4326") -> pd.Series:
+        """
+        Neighborhood ID of every row: by coordinates where `lon` / `lat` are
+        present, then by each of the `names` columns in turn. Postal codes
+        are not matched (see the module docstring); rows with neither stay None.
+        """
+        result = np.full(len(df), None, dtype=object)
+        if lon in df.columns and lat in df.columns:
+            result = self.assign_points(pd.to_numeric(df[lon], errors='coerce'),
+                                        pd.to_numeric(df[lat], errors='coerce'), crs=crs)
+        for column in names:
+            missing = pd.isna(result)
+            if column in df.columns and missing.any():
+                result[missing] = self.assign_names(df[column].to_numpy()[missing])
+        return pd.Series(result, index=df.index, name='neighborhood_id')
+
+
+# --- CITY INDEXES ---
+
+def neighborhood_ids(codes, prefix: str = "") -> list:
+    """`<prefix><code>`, with numeric codes written without leading zeros ("01" -> "BCN_1")."""
+    numeric = pd.to_numeric(pd.Series(codes), errors='coerce')
+    return [f"{prefix}{int(n)}" if not np.isnan(n) else f"{prefix}{code}" for code, n in zip(codes, numeric)]
+
+
+@functools.lru_cache(maxsize=None)
+def _load_index(path: str, mtime_ns: int, id_column: str, id_prefix: str, name_columns: tuple) -> NeighborhoodIndex:
+    boundaries = gpd.read_parquet(path) if path.endswith('.parquet') else gpd.read_file(path)
+    ids = neighborhood_ids(boundaries[id_column].tolist(), id_prefix)
+    names = {}
+    for column in name_columns:
+        names.update(zip(boundaries[column], ids))
+    return NeighborhoodIndex(ids, boundaries.geometry, names)
+
+
+def load_index(path, id_column: str, id_prefix: str = "", name_columns=()) -> NeighborhoodIndex:
+    """NeighborhoodIndex of a boundary file, built once per file version and reused."""
+    path = Path(path)
+    return _load_index(str(path), path.stat().st_mtime_ns, id_column, id_prefix, tuple(name_columns))
+
+
+def city_index(city: str) -> NeighborhoodIndex:
+    """NeighborhoodIndex of a city configured in NEIGHBORHOOD_BOUNDARIES."""
+    boundaries = config.NEIGHBORHOOD_BOUNDARIES[city]
+    return load_index(boundaries['path'], boundaries['id_column'], boundaries.get('id_prefix', ""),
+                      boundaries.get('name_columns', ()))
@@ -0,0 +1,625 @@
+"""
+Offline benchmark of the scrapers against a local mock real estate site.
+
+Starts a local HTTP server serving synthetic Idealista and SeLoger search and
+detail pages (built to match the selectors the parsers use), then runs the
+real `scrape_*_undetected` -> `scrape_details_in_batches` path against it with
+every delay set to zero. Parser micro-benchmarks compare BeautifulSoup
+backends and serial / thread / process parsing, and the batch normalization
+stage (normalize.py) is timed on a synthetic raw table, and the open data
+downloader (insee_scraper.py) against a local file server. No network is needed.
+
+Results are printed (or written with --output) as one JSON document with
+pages/min, per-stage latency percentiles and peak RSS, so runs on a CI-like
+box can be compared over time:
+
+    python benchmark.py
+    python benchmark.py --only parsers --backends lxml html.parser
+    python benchmark.py --only normalize --rows 100000
+    python benchmark.py --only downloads --archives 8
+    python benchmark.py --pages 5 --per-page 30 --workers 4 --output bench.json
+"""
+import argparse
+import contextlib
+import datetime
+import hashlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import pandas as pd
+
+import config
+import parsers
+from instrumentation import metrics
+from normalize import normalize_details
+from scheduler import RequestScheduler
+
+
+# --- FIXTURES ---
+
+DISTRICTS = ["Eixample", "Gràcia", "Sants-Montjuïc", "Sant Martí", "Les Corts"]
+ARRONDISSEMENTS = ["75003", "75011", "75015", "75018", "75020"]
+
+
+def idealista_search_page(page: int, pages: int, per_page: int) -> str:
+    """Idealista results page `page` of `pages`, with `per_page` listing cards."""
+    cards = "\n".join(
+        f"""<article class="item"><div class="item-info-container">
+              <a class="item-link" href="/idealista/inmueble/{page * 1000 + i}/">Flat in {DISTRICTS[i % 5]}</a>
+              <span class="item-price">{250000 + i * 1000:,} €</span>
+              <span class="item-detail">{2 + i % 3} bed.</span><span class="item-detail">{60 + i} m²</span>
+            </div></article>"""
+        for i in range(per_page)
+    )
+    next_link = f'<li class="next"><a href="pagina-{page + 1}.htm">Next</a></li>' if page < pages else ""
+    return f"""<html><head><title>Flats for sale in Barcelona</title></head><body>
+        <section class="items-container">{cards}</section>
+        <div class="pagination"><ul>{next_link}</ul></div></body></html>"""
+
+
+def idealista_detail_page(listing_id: int) -> str:
+    """Idealista listing detail page with every field the parser extracts."""
+    district = DISTRICTS[listing_id % 5]
+    return f"""<html><head><title>Flat for sale in {district}</title></head><body>
+        <div class="info-data"><span class="info-data-price"><span class="txt-bold">{300000 + listing_id:,}</span> €</span></div>
+        <div id="headerMap"><ul>
+            <li>Carrer de Mallorca, {listing_id % 300}</li><li>Barrio Dreta de l'Eixample</li><li>Distrito {district}</li>
+        </ul></div>
+        <div class="details-property_features"><ul>
+            <li>{70 + listing_id % 80} m² built</li><li>{1 + listing_id % 4} bedrooms</li><li>{1 + listing_id % 2} bathrooms</li>
+            <li>Second hand/good condition</li><li>Built in {1900 + listing_id % 120}</li>
+            <li>Floor {listing_id % 8} exterior</li><li>With lift</li>
+        </ul><span class="icon-energy-c-{'abcdefg'[listing_id % 7]}"></span></div>
+        <div class="professional-name"><div class="name">Professional advertiser</div><span>Finques {listing_id % 40}</span></div>
+        </body></html>"""
+
+
+def seloger_search_page(page: int, pages: int, per_page: int) -> str:
+    """SeLoger results page `page` of `pages`, with `per_page` listing cards."""
+    cards = "\n".join(
+        f"""<div data-testid="sl.explore.card-container">
+              <a data-testid="sl.explore.coveringLink" href="/seloger/annonces/achat/appartement/{page * 1000 + i}.htm"></a>
+              <div data-test="sl.price-label">{450000 + i * 1000:,} €</div>
+              <ul data-test="sl.tags"><li>{2 + i % 3} pièces</li><li>{40 + i} m²</li></ul>
+            </div>"""
+        for i in range(per_page)
+    )
+    next_link = (
+        f'<a data-testid="gsl.uilib.Paging.nextButton" href="list.htm?LISTING-LISTpg={page + 1}">Suivant</a>'
+        if page < pages else ""
+    )
+    return f"<html><head><title>Achat appartement Paris</title></head><body>{cards}{next_link}</body></html>"
+
+
+def seloger_detail_page(listing_id: int) -> str:
+    """SeLoger listing detail page with every field the parser extracts."""
+    postal_code = ARRONDISSEMENTS[listing_id % 5]
+    return f"""<html><head><title>Appartement à vendre</title></head><body>
+        <div data-test="price-price">{500000 + listing_id:,} €</div>
+        <div data-test="property-address-container"><span>Paris ({postal_code})</span></div>
+        <div data-test="property-criteria-item">Surface {30 + listing_id % 90} m²</div>
+        <div data-test="property-criteria-item">{1 + listing_id % 5} pièces</div>
+        <div data-test="property-criteria-item">{listing_id % 4} chambres</div>
+        <div data-test="property-criteria-item"><p>Type</p><p>Appartement</p></div>
+        <div data-test="dpe-letter">{'ABCDEFG'[listing_id % 7]}</div>
+        <div data-test="agency-name">Agence {listing_id % 25}</div>
+        </body></html>"""
+
+
+# --- MOCK SITE ---
+
+class MockSite:
+    """
+    Local HTTP server for the fixtures above:
+
+        /idealista/barcelona/[pagina-N.htm]   /idealista/inmueble/<id>/
+        /seloger/list.htm?LISTING-LISTpg=N    /seloger/annonces/achat/appartement/<id>.htm
+    """
+
+    def __init__(self, pages: int = 3, per_page: int = 30):
+        self.pages = pages
+        self.per_page = per_page
+        self.hits = 0
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = site.render(self.path)
+                site.hits += 1
+                self.send_response(200 if body is not None else 404)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                data = (body or "Not found").encode('utf-8')
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-site", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def render(self, path: str):
+        parts = urlsplit(path)
+        segments = [s for s in parts.path.split('/') if s]
+        if segments[:2] == ['idealista', 'barcelona']:
+            page = int(segments[2][len('pagina-'):-len('.htm')]) if len(segments) > 2 else 1
+            return idealista_search_page(page, self.pages, self.per_page)
+        if segments[:2] == ['idealista', 'inmueble']:
+            return idealista_detail_page(int(segments[2]))
+        if segments[:2] == ['seloger', 'list.htm']:
+            page = int(parse_qs(parts.query).get('LISTING-LISTpg', ['1'])[0])
+            return seloger_search_page(page, self.pages, self.per_page)
+        if segments[:2] == ['seloger', 'annonces']:
+            return seloger_detail_page(int(segments[-1][:-len('.htm')]))
+        return None
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class MockFileServer:
+    """
+    Local stand-in for the INSEE / data.paris.fr file servers: serves `files`
+    ({name: bytes}) at /files/<name> with ETag, Last-Modified, conditional
+    requests and single `bytes=N-` ranges. Counts requests and body bytes sent.
+    """
+
+    def __init__(self, files: dict):
+        self.files = files
+        self.requests = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                name = urlsplit(self.path).path.rsplit('/', 1)[-1]
+                data = server.files.get(name)
+                with server._lock:
+                    server.requests += 1
+                if data is None:
+                    self.send_error(404)
+                    return
+                etag = f'"{hashlib.md5(data).hexdigest()}"'
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                start = 0
+                requested = self.headers.get('Range', '')
+                if_range = self.headers.get('If-Range')
+                if requested.startswith('bytes=') and (if_range is None or if_range == etag):
+                    start = int(requested[len('bytes='):].split('-')[0])
+                    if start >= len(data):
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{len(data)}")
+                        self.end_headers()
+                        return
+                body = data[start:]
+                self.send_response(206 if start else 200)
+                if start:
+                    self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", "Mon, 01 Jan 2024 00:00:00 GMT")
+                self.send_header("Accept-Ranges", "bytes")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with server._lock:
+                    server.bytes_sent += len(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-files", daemon=True)
+
+    def url(self, name: str) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/files/{name}"
+
+    def reset_counters(self):
+        self.requests = self.bytes_sent = 0
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# --- METRICS ---
+
+def percentiles(samples) -> dict:
+    """Latency summary in milliseconds."""
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+    return {
+        'count': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+        'p50_ms': pick(0.50),
+        'p90_ms': pick(0.90),
+        'p99_ms': pick(0.99),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    }
+
+
+def peak_rss_mb(children: bool = False):
+    """Peak resident set size of this process (or of its finished children), in MB."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    divisor = 1024 ** 2 if platform.system() == "Darwin" else 1024
+    return round(usage.ru_maxrss / divisor, 1)
+
+
+class RecordingScheduler(RequestScheduler):
+    """Unthrottled scheduler that keeps the fetch latency of every request, per stage."""
+
+    def __init__(self, detail_path: str):
+        super().__init__(requests_per_minute=0)
+        self.detail_path = detail_path
+        self.samples = {'search_fetch': [], 'detail_fetch': []}
+        self._samples_lock = threading.Lock()
+
+    def record(self, url: str, elapsed: float = 0.0, ok: bool = True):
+        stage = 'detail_fetch' if self.detail_path in url else 'search_fetch'
+        with self._samples_lock:
+            self.samples[stage].append(elapsed)
+        super().record(url, elapsed, ok)
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silences the scrapers' progress prints so terminal I/O is not measured."""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+@contextlib.contextmanager
+def sandbox_config(directory: str):
+    """Points every output path at `directory` and turns every delay off."""
+    root = Path(directory)
+    overrides = {
+        'RAW_DATA_DIR': root / 'raw',
+        'BARCELONA_DATA_DIR': root / 'raw' / 'barcelona',
+        'URL_FILE': root / 'raw' / 'barcelona' / 'idealista_listings.csv',
+        'DETAILS_FILE': root / 'raw' / 'barcelona' / 'idealista_details.csv',
+        'CRAWL_STATE_DB': root / 'raw' / 'barcelona' / 'crawl_state.sqlite',
+        'HTML_CACHE_DIR': root / 'html_cache',
+        'PARQUET_DIR': root / 'listings_parquet',
+        'ERROR_DIR': root / 'errors',
+        'METRICS_DIR': root / 'metrics',
+        'READY_POLL_SECONDS': 0.01,
+        'FRONTIER_POLL_SECONDS': 0.05,
+    }
+    saved = {name: getattr(config, name) for name in overrides}
+    for name, value in overrides.items():
+        setattr(config, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(config, name, value)
+
+
+# --- PIPELINE BENCHMARK ---
+
+def bench_pipeline(site: str, mock: MockSite, workers: int) -> dict:
+    """Runs search + details for `site` ('idealista' or 'seloger') against the mock site."""
+    # Imported here so the parser benchmarks run without Selenium installed
+    if site == 'idealista':
+        from idealista_scraper import scrape_details_in_batches, scrape_idealista_undetected as scrape_search
+        start_url, detail_path = f"{mock.base_url}/idealista/barcelona/", '/inmueble/'
+    else:
+        from seLoger_scraper import scrape_details_in_batches, scrape_seloger_undetected as scrape_search
+        start_url, detail_path = f"{mock.base_url}/seloger/list.htm?LISTING-LISTpg=1", '/annonces/'
+
+    scheduler = RecordingScheduler(detail_path)
+    metrics.reset()
+    with tempfile.TemporaryDirectory(prefix="scraper-bench-") as directory, sandbox_config(directory), quiet():
+        start = time.perf_counter()
+        urls = scrape_search(start_url, max_pages=mock.pages, scheduler=scheduler, http_first=True)
+        search_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        scrape_details_in_batches(urls, batch_size_min=5, batch_size_max=9, workers=workers,
+                                  scheduler=scheduler, http_first=True)
+        detail_seconds = time.perf_counter() - start
+        breakdown = metrics.summary()
+        metrics.close()
+
+    fetched = len(scheduler.samples['search_fetch']) + len(scheduler.samples['detail_fetch'])
+    total_seconds = search_seconds + detail_seconds
+    return {
+        'site': site,
+        'workers': workers,
+        'listings': len(urls),
+        'pages_fetched': fetched,
+        'wall_seconds': round(total_seconds, 3),
+        'pages_per_min': round(fetched / total_seconds * 60, 1) if total_seconds else None,
+        'stages': {
+            'search': {'wall_seconds': round(search_seconds, 3), **percentiles(scheduler.samples['search_fetch'])},
+            'detail': {'wall_seconds': round(detail_seconds, 3), **percentiles(scheduler.samples['detail_fetch'])},
+        },
+        # Time per instrumented stage (see instrumentation.py)
+        'breakdown': breakdown['stages'],
+    }
+
+
+# --- PARSER MICRO-BENCHMARKS ---
+
+PARSER_CASES = {
+    'idealista_search': (lambda i: idealista_search_page(1, 2, 30), 'parse_idealista_search_cards'),
+    'idealista_detail': (idealista_detail_page, 'parse_idealista_detail'),
+    'seloger_search': (lambda i: seloger_search_page(1, 2, 30), 'parse_seloger_search_cards'),
+    'seloger_detail': (seloger_detail_page, 'parse_seloger_detail'),
+}
+
+
+def _set_backend(backend: str):
+    parsers.PARSER_BACKEND = backend
+
+
+def _init_parser_process(backend: str):
+    """Process pool initializer: same backend as the parent, prints discarded."""
+    _set_backend(backend)
+    sys.stdout = open(os.devnull, 'w')
+
+
+def _parse(job):
+    parser_name, html = job
+    return getattr(parsers, parser_name)(html)
+
+
+def bench_parser(case: str, backend: str, iterations: int) -> dict:
+    """Per-call latency of one parser on one backend, single-threaded."""
+    build, parser_name = PARSER_CASES[case]
+    pages = [build(i) for i in range(iterations)]
+    parse = getattr(parsers, parser_name)
+    _set_backend(backend)
+    samples = []
+    with quiet():
+        for html in pages:
+            start = time.perf_counter()
+            parse(html)
+            samples.append(time.perf_counter() - start)
+    return {'case': case, 'backend': backend, 'pages_per_sec': round(len(samples) / sum(samples), 1),
+            **percentiles(samples)}
+
+
+def bench_concurrency(mode: str, backend: str, iterations: int, workers: int) -> dict:
+    """Throughput of detail parsing run serially, in threads or in processes."""
+    jobs = [('parse_idealista_detail', idealista_detail_page(i)) for i in range(iterations)]
+    _set_backend(backend)
+    with quiet():
+        start = time.perf_counter()
+        if mode == 'serial':
+            for job in jobs:
+                _parse(job)
+        elif mode == 'threads':
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(_parse, jobs))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_parser_process,
+                                     initargs=(backend,)) as pool:
+                list(pool.map(_parse, jobs, chunksize=16))
+        elapsed = time.perf_counter() - start
+    return {'mode': mode, 'backend': backend, 'workers': 1 if mode == 'serial' else workers,
+            'pages': iterations, 'pages_per_sec': round(iterations / elapsed, 1)}
+
+
+# --- NORMALIZATION BENCHMARK ---
+
+RAW_PHRASINGS = {
+    'floor_level': ["Planta 3ª exterior", "Bajo interior", "2nd floor exterior", "Piano terra", "4e étage",
+                    "Entreplanta exterior", "Ground floor", "Sótano"],
+    'property_status': ["Segunda mano/buen estado", "Segunda mano/para reformar", "Obra nueva",
+                        "Second hand/good condition", "Da ristrutturare", "Bon état"],
+    'advertiser_type': ["Profesional", "Particular", "Agenzia", "Private user", "Agence"],
+    'has_elevator': ["True", "False", ""],
+    'energy_cert_consumption': ["A", "e", "G", "", "en trámite"],
+}
+
+
+def raw_details_frame(rows: int):
+    """A details table of `rows` raw scraped strings, as read back from the CSV."""
+    rng = random.Random(0)
+    records = {
+        'price': [f"{rng.randrange(80, 3000) * 1000:,} €" for _ in range(rows)],
+        'surface_m2': [f"{rng.randrange(25, 300)} m² construidos" for _ in range(rows)],
+        'rooms': [f"{rng.randrange(1, 6)} habitaciones" for _ in range(rows)],
+        'year_built': [f"Construido en {rng.randrange(1880, 2024)}" for _ in range(rows)],
+    }
+    for column, phrasings in RAW_PHRASINGS.items():
+        records[column] = [rng.choice(phrasings) for _ in range(rows)]
+    return pd.DataFrame(records, dtype='string')
+
+
+def bench_normalize(rows: int) -> dict:
+    """Wall time of the batch normalization stage over `rows` raw records."""
+    df = raw_details_frame(rows)
+    start = time.perf_counter()
+    normalized = normalize_details(df)
+    elapsed = time.perf_counter() - start
+    return {'rows': rows, 'seconds': round(elapsed, 3), 'rows_per_sec': round(rows / elapsed, 1),
+            'floor_parsed': round(float(normalized['floor_number'].notna().mean()), 4),
+            'status_parsed': round(float(normalized['status'].notna().mean()), 4)}
+
+
+# --- DOWNLOAD BENCHMARK ---
+
+def synthetic_archives(count: int, rows: int) -> dict:
+    """`count` zipped INSEE-like IRIS CSVs of `rows` rows each, plus one GeoJSON file."""
+    rng = random.Random(0)
+    files = {}
+    for n in range(count):
+        lines = ["IRIS;COM;P21_POP;P21_POP1529"]
+        lines += [f"75{rng.randrange(101, 120):03d}{i:04d};751{rng.randrange(1, 21):02d};{rng.randrange(500, 5000)};"
+                  f"{rng.randrange(50, 1500)}" for i in range(rows)]
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr(f"base-ic-{n}.CSV", "\n".join(lines))
+            zf.writestr(f"meta_base-ic-{n}.CSV", "COD_VAR;LIB_VAR\nP21_POP;Population")
+        files[f"base-ic-{n}_csv.zip"] = buffer.getvalue()
+    files["quartier_paris.geojson"] = json.dumps({"type": "FeatureCollection", "features": []}).encode()
+    return files
+
+
+def bench_downloads(count: int, rows: int, workers: int) -> dict:
+    """
+    Runs insee_scraper against a local file server: a cold download, a warm
+    re-run (conditional requests), a checksum-pinned re-run (no requests) and
+    a resume from half-downloaded archive.
+    """
+    from insee_scraper import DownloadState, ManifestEntry, download_all, sha256_of
+
+    files = synthetic_archives(count, rows)
+    report = {'files': len(files), 'total_mb': round(sum(map(len, files.values())) / 1024 ** 2, 2), 'runs': []}
+    with MockFileServer(files) as server, tempfile.TemporaryDirectory() as directory, sandbox_config(directory):
+        root = Path(directory)
+        entries = [ManifestEntry(name, server.url(name), name.removesuffix('.zip'), extract=name.endswith('.zip'))
+                   for name in files]
+
+        def run(label, run_entries):
+            server.reset_counters()
+            start = time.perf_counter()
+            with quiet():
+                results = download_all(run_entries, root, workers)
+            report['runs'].append({'run': label, 'seconds': round(time.perf_counter() - start, 3),
+                                   'requests': server.requests, 'bytes_sent': server.bytes_sent,
+                                   'statuses': sorted(set(results.values()))})
+
+        run('cold', entries)
+        run('warm_conditional', entries)
+        pinned = [ManifestEntry(e.name, e.url, e.target, sha256_of(root / '_archives' / e.archive_name()
+                                                                  if e.extract else root / e.target), e.extract)
+                  for e in entries]
+        run('warm_checksum', pinned)
+
+        # Simulate an interrupted download: keep half the archive in its .part file
+        first = entries[0]
+        archive = root / '_archives' / first.archive_name()
+        data = archive.read_bytes()
+        archive.unlink()
+        archive.with_name(archive.name + '.part').write_bytes(data[:len(data) // 2])
+        state = DownloadState(root / '.downloads.json')
+        state.update(first.url, part_etag=state.get(first.url)['etag'])
+        run('resume_half', [first])
+        metrics.close()
+    return report
+
+
+def available_backends(requested) -> list:
+    """Keeps the requested BeautifulSoup backends that are installed."""
+    from bs4 import BeautifulSoup, FeatureNotFound
+    backends = []
+    for backend in requested:
+        try:
+            BeautifulSoup("<p></p>", backend)
+            backends.append(backend)
+        except FeatureNotFound:
+            print(f"! Parser backend '{backend}' is not installed, skipping it.", file=sys.stderr)
+    return backends
+
+
+# --- MAIN ---
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline scraper benchmark against a local mock site")
+    parser.add_argument('--only', choices=['pipeline', 'parsers', 'normalize', 'downloads'], default=None)
+    parser.add_argument('--sites', nargs='+', default=['idealista', 'seloger'], choices=['idealista', 'seloger'])
+    parser.add_argument('--pages', type=int, default=3, help="Search result pages served per site")
+    parser.add_argument('--per-page', type=int, default=30, help="Listings per search result page")
+    parser.add_argument('--workers', type=int, default=4, help="Detail workers / parser pool size")
+    parser.add_argument('--iterations', type=int, default=200, help="Pages per parser micro-benchmark")
+    parser.add_argument('--rows', type=int, default=100_000, help="Records for the normalization benchmark")
+    parser.add_argument('--archives', type=int, default=8, help="Zip archives served to the download benchmark")
+    parser.add_argument('--backends', nargs='+', default=['lxml', 'html.parser'])
+    parser.add_argument('--output', default=None, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'args': vars(args),
+        },
+    }
+
+    if args.only in (None, 'pipeline'):
+        report['pipeline'] = []
+        with MockSite(args.pages, args.per_page) as mock:
+            for site in args.sites:
+                print(f"→ Pipeline: {site} ({args.pages} pages x {args.per_page} listings)", file=sys.stderr)
+                report['pipeline'].append(bench_pipeline(site, mock, args.workers))
+
+    if args.only in (None, 'parsers'):
+        backends = available_backends(args.backends)
+        default_backend = parsers.PARSER_BACKEND
+        report['parsers'] = []
+        report['concurrency'] = []
+        for backend in backends:
+            print(f"→ Parsers: {backend}", file=sys.stderr)
+            for case in PARSER_CASES:
+                report['parsers'].append(bench_parser(case, backend, args.iterations))
+            for mode in ('serial', 'threads', 'processes'):
+                report['concurrency'].append(bench_concurrency(mode, backend, args.iterations, args.workers))
+        _set_backend(default_backend)
+
+    if args.only in (None, 'normalize'):
+        print(f"→ Normalization: {args.rows} rows", file=sys.stderr)
+        report['normalize'] = bench_normalize(args.rows)
+
+    if args.only in (None, 'downloads'):
+        print(f"→ Downloads: {args.archives} archives", file=sys.stderr)
+        report['downloads'] = bench_downloads(args.archives, args.rows, args.workers)
+
+    report['peak_rss_mb'] = {'self': peak_rss_mb(), 'children': peak_rss_mb(children=True)}
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+        print(f"✓ Benchmark report written to {args.output}", file=sys.stderr)
+    else:
+        print(text)
@@ -0,0 +1,335 @@
+"""
+Browser-side helpers for the Selenium fallback.
+
+Resource policy: the parsers only read text nodes and a few class names, so
+the browser does not need photo galleries, fonts, video, maps or ad and
+analytics scripts. A `ResourcePolicy` blocks them in two layers:
+
+- Chrome preferences turn image loading off for the whole profile;
+- the DevTools Protocol (`Network.setBlockedURLs`) drops requests matching
+  per-type URL patterns (fonts, media...) and known tracker hosts.
+
+Each site adapter can exempt resource types or URL patterns it needs to
+render (its allowlist).
+
+Readiness waits: instead of fixed sleeps after `driver.get`, `wait_until_ready`
+polls for the selectors that prove the page rendered (price, features...) and
+returns as soon as they are there, or as soon as the page turns out to be a
+"listing unavailable" page, with a timeout. Request pacing is the scheduler's
+job, so no time is spent waiting on a page that is already usable.
+
+Driver lifecycle: `DriverManager` keeps warm, pre-launched standby browsers
+and reuses each driver across batches until it crosses a health threshold
+(pages served, errors, age or memory), then swaps in a standby while the old
+one quits in the background.
+"""
+import fnmatch
+import queue
+import threading
+import time
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+import config
+from instrumentation import WARNING, debug, log, metrics
+
+
+class ResourcePolicy:
+    """
+    What the browser must not download.
+
+    - `blocked_types`: resource types from config.RESOURCE_TYPE_PATTERNS
+      ('image', 'font', 'media', 'stylesheet'...).
+    - `blocked_patterns`: extra URL wildcards (trackers, ad networks...).
+    - `allowed_types` / `allowed_patterns`: the site allowlist; an allowed
+      type is never blocked, and a blocked pattern matching an allowed
+      pattern is dropped.
+    """
+
+    def __init__(self, blocked_types=(), blocked_patterns=(), allowed_types=(), allowed_patterns=()):
+        self.blocked_types = [t for t in blocked_types if t not in allowed_types]
+        self.allowed_patterns = list(allowed_patterns)
+        patterns = list(blocked_patterns)
+        for resource_type in self.blocked_types:
+            patterns += config.RESOURCE_TYPE_PATTERNS.get(resource_type, [])
+        self.blocked_patterns = [p for p in dict.fromkeys(patterns) if not self.is_allowed(p)]
+
+    @classmethod
+    def from_config(cls, allowed_types=(), allowed_patterns=(), extra_patterns=()):
+        """The policy from config.py, with a site's allowlist and extra patterns applied."""
+        if not config.BLOCK_RESOURCES:
+            return None
+        return cls(config.BLOCKED_RESOURCE_TYPES, list(config.BLOCKED_URL_PATTERNS) + list(extra_patterns),
+                   allowed_types, allowed_patterns)
+
+    def is_allowed(self, pattern_or_url: str) -> bool:
+        return any(fnmatch.fnmatch(pattern_or_url, allowed) for allowed in self.allowed_patterns)
+
+    def chrome_prefs(self) -> dict:
+        """Profile preferences; 2 means 'block'."""
+        prefs = {}
+        if 'image' in self.blocked_types:
+            prefs['profile.managed_default_content_settings.images'] = 2
+        return prefs
+
+    def apply(self, driver):
+        """Installs the URL blocklist on a running driver through CDP."""
+        if not self.blocked_patterns:
+            return
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': self.blocked_patterns})
+        debug(f"  → Blocking {len(self.blocked_patterns)} URL patterns in the browser")
+
+    def __repr__(self):
+        return f"ResourcePolicy(types={self.blocked_types}, patterns={len(self.blocked_patterns)})"
+
+
+# JavaScript returning the bytes transferred for the current page and all its sub-resources
+PAGE_WEIGHT_SCRIPT = """
+const entries = performance.getEntriesByType('navigation').concat(performance.getEntriesByType('resource'));
+return [entries.reduce((total, e) => total + (e.transferSize || 0), 0), entries.length];
+"""
+
+
+def record_page_weight(driver, via: str = 'browser'):
+    """Counts the bytes and requests the last navigation cost (see instrumentation.py)."""
+    try:
+        transferred, requests = driver.execute_script(PAGE_WEIGHT_SCRIPT)
+    except Exception:
+        return
+    metrics.count('page_bytes', int(transferred or 0), via=via)
+    metrics.count('page_requests', int(requests or 0), via=via)
+
+
+# --- READINESS WAITS ---
+
+READY, UNAVAILABLE, TIMEOUT = 'ready', 'unavailable', 'timeout'
+
+# One round trip per poll: every ready selector present -> 'ready'; an
+# unavailable marker in the title / visible text -> 'unavailable'
+READINESS_SCRIPT = """
+const [readySelectors, markers] = arguments;
+if (readySelectors.length && readySelectors.every(s => document.querySelector(s))) return 'ready';
+if (markers.length && document.body) {
+    const text = (document.title + ' ' + document.body.innerText.slice(0, 20000)).toLowerCase();
+    if (markers.some(m => text.includes(m))) return 'unavailable';
+}
+return null;
+"""
+
+
+def wait_until_ready(driver, ready_selectors, unavailable_markers=(), timeout: float = None,
+                     poll: float = None, page: str = 'detail') -> str:
+    """
+    Polls the rendered page until every selector in `ready_selectors` is
+    present ('ready') or one of the lowercase `unavailable_markers` shows up
+    ('unavailable'). Gives up after `timeout` seconds ('timeout').
+    """
+    timeout = config.READY_TIMEOUT_SECONDS if timeout is None else timeout
+    poll = config.READY_POLL_SECONDS if poll is None else poll
+    start = time.monotonic()
+    deadline = start + timeout
+    status = None
+    while True:
+        try:
+            status = driver.execute_script(READINESS_SCRIPT, list(ready_selectors), list(unavailable_markers))
+        except Exception as e:
+            debug(f"  → Readiness check failed: {e}")
+        if status in (READY, UNAVAILABLE) or time.monotonic() >= deadline:
+            break
+        time.sleep(poll)
+
+    status = status or TIMEOUT
+    metrics.observe('ready_wait', time.monotonic() - start, page=page, outcome=status)
+    return status
+
+
+# --- DRIVER LIFECYCLE ---
+
+# Fallback memory probe when psutil is not installed: the renderer's JS heap
+JS_HEAP_SCRIPT = "return performance.memory ? performance.memory.usedJSHeapSize : null;"
+
+
+def driver_rss_mb(driver):
+    """Memory of a browser in MB: its whole process tree with psutil, else the JS heap. None if unknown."""
+    if psutil is not None and getattr(driver, 'browser_pid', None):
+        try:
+            process = psutil.Process(driver.browser_pid)
+            rss = process.memory_info().rss + sum(
+                child.memory_info().rss for child in process.children(recursive=True)
+            )
+            return rss / 1024 ** 2
+        except psutil.Error:
+            pass
+    try:
+        heap = driver.execute_script(JS_HEAP_SCRIPT)
+    except Exception:
+        return None
+    return heap / 1024 ** 2 if heap else None
+
+
+class _DriverStats:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.pages = 0
+        self.errors = 0
+
+
+class DriverManager:
+    """
+    Thread-safe pool of browsers for one site.
+
+    - `factory`: callable returning a new ready WebDriver.
+    - `standby`: browsers launched in the background ahead of need, so a
+      recycled driver is replaced without waiting for Chrome to start.
+      Nothing is launched until the first `checkout()`, so HTTP-only runs
+      never start a browser.
+    - `max_pages` / `max_errors` / `max_age_seconds` / `max_rss_mb`: a driver
+      is recycled as soon as it crosses any of these (None disables one).
+    """
+
+    def __init__(self, factory, standby: int = None, max_pages: int = None, max_errors: int = None,
+                 max_age_seconds: float = None, max_rss_mb: float = None):
+        self.factory = factory
+        self.standby = config.STANDBY_DRIVERS if standby is None else standby
+        self.max_pages = config.DRIVER_MAX_PAGES if max_pages is None else max_pages
+        self.max_errors = config.DRIVER_MAX_ERRORS if max_errors is None else max_errors
+        if max_age_seconds is None and config.DRIVER_MAX_AGE_MINUTES:
+            max_age_seconds = config.DRIVER_MAX_AGE_MINUTES * 60
+        self.max_age_seconds = max_age_seconds
+        self.max_rss_mb = config.DRIVER_MAX_RSS_MB if max_rss_mb is None else max_rss_mb
+        self._standby = queue.Queue()
+        self._idle = []
+        self._stats = {}
+        self._launching = 0
+        self._closed = False
+        self._lock = threading.Lock()
+
+    # --- Checkout / return ---
+
+    def checkout(self):
+        """Returns a ready driver: an idle one, a warm standby, or a new one as a last resort."""
+        with self._lock:
+            driver = self._idle.pop() if self._idle else None
+        if driver is None:
+            try:
+                driver = self._standby.get_nowait()
+            except queue.Empty:
+                driver = self._launch()
+        self._replenish()
+        return driver
+
+    def release(self, driver):
+        """Gives a driver back for reuse by the next batch (or recycles it if it is worn out)."""
+        if driver is None:
+            return
+        reason = self._recycle_reason(driver)
+        with self._lock:
+            closed = self._closed
+            if not (reason or closed):
+                self._idle.append(driver)
+        if reason or closed:
+            self._retire(driver, reason or 'closed')
+
+    def after_page(self, driver, ok: bool = True):
+        """
+        Records one page served by `driver`. Returns the driver to use next:
+        the same one, or None if it just crossed a threshold and was retired
+        (the next page that needs a browser checks one out).
+        """
+        with self._lock:
+            stats = self._stats.get(id(driver))
+            if stats is not None:
+                stats.pages += 1
+                stats.errors += 0 if ok else 1
+        reason = self._recycle_reason(driver)
+        if reason is None:
+            return driver
+        self._retire(driver, reason)
+        return None
+
+    def close(self):
+        """Quits every idle and standby browser. Drivers still checked out are quit on release."""
+        with self._lock:
+            self._closed = True
+            drivers, self._idle = self._idle, []
+        while True:
+            try:
+                drivers.append(self._standby.get_nowait())
+            except queue.Empty:
+                break
+        for driver in drivers:
+            self._quit(driver)
+
+    # --- Internals ---
+
+    def _launch(self):
+        with metrics.stage('driver_startup'):
+            driver = self.factory()
+        with self._lock:
+            self._stats[id(driver)] = _DriverStats()
+        return driver
+
+    def _replenish(self):
+        """Starts background launches until `standby` warm browsers are on hand."""
+        with self._lock:
+            missing = self.standby - self._standby.qsize() - self._launching
+            if self._closed or missing <= 0:
+                return
+            self._launching += missing
+        for _ in range(missing):
+            threading.Thread(target=self._launch_standby, name="driver-standby", daemon=True).start()
+
+    def _launch_standby(self):
+        try:
+            driver = self._launch()
+        except Exception as e:
+            log(f"  ! Could not launch a standby browser: {e}", WARNING)
+            return
+        finally:
+            with self._lock:
+                self._launching -= 1
+        # Checked and queued under the lock, so close() either drains it or it is quit here
+        with self._lock:
+            closed = self._closed
+            if not closed:
+                self._standby.put(driver)
+        if closed:
+            self._quit(driver)
+
+    def _recycle_reason(self, driver):
+        with self._lock:
+            stats = self._stats.get(id(driver))
+        if stats is None:
+            return None
+        if self.max_pages and stats.pages >= self.max_pages:
+            return 'pages'
+        if self.max_errors and stats.errors >= self.max_errors:
+            return 'errors'
+        if self.max_age_seconds and time.monotonic() - stats.started >= self.max_age_seconds:
+            return 'age'
+        if self.max_rss_mb and stats.pages:
+            rss = driver_rss_mb(driver)
+            if rss is not None and rss >= self.max_rss_mb:
+                return 'rss'
+        return None
+
+    def _retire(self, driver, reason: str):
+        """Quits a driver in the background so the caller never waits for it."""
+        with self._lock:
+            stats = self._stats.get(id(driver))
+        if stats is not None:
+            log(f"  → Recycling browser after {stats.pages} pages ({reason})")
+        metrics.count('driver_recycled', reason=reason)
+        threading.Thread(target=self._quit, args=(driver,), name="driver-quit", daemon=True).start()
+
+    def _quit(self, driver):
+        with self._lock:
+            self._stats.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception as e:
+            debug(f"  → Browser did not quit cleanly: {e}")
@@ -6,10 +6,16 @@ from pathlib import Path
 # (scrapers/ -> gentrification_project/)
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 
+# --- City ---
+# Default city of the single-city scrapers; URL_FILE, DETAILS_FILE and
+# CRAWL_STATE_DB below are its files
+CITY = "barcelona"
+
 # --- Data Output Paths ---
 DATA_DIR = PROJECT_ROOT / "data"
 RAW_DATA_DIR = DATA_DIR / "raw"
 BARCELONA_DATA_DIR = RAW_DATA_DIR / "barcelona"
+PARIS_DATA_DIR = RAW_DATA_DIR / "paris"
 
 
 # --- File Paths ---
@@ -19,4 +25,188 @@ DETAILS_FILE = BARCELONA_DATA_DIR.joinpath('idealista_details.csv')
 
 # --- Error Screenshot Path ---
 # It's good practice to save temporary files like screenshots in a separate folder
-ERROR_DIR = PROJECT_ROOT / "scrapers" / "_error_screenshots"
\ No newline at end of file
+ERROR_DIR = PROJECT_ROOT / "scrapers" / "_error_screenshots"
+
+# --- Detail Scraping Concurrency ---
+# Number of independent browser workers used by scrape_details_in_batches
+DETAIL_WORKERS = 1
+# Per-site overrides, used when several sites are crawled at once
+SITE_DETAIL_WORKERS = {"idealista": 1, "seloger": 1}
+
+# --- Request Scheduling ---
+# Every navigation goes through a per-domain token bucket (see scheduler.py).
+# Politeness budget shared by all workers, per domain
+REQUESTS_PER_MINUTE_PER_DOMAIN = 4
+# Per-domain overrides. Sites crawled at the same time (see engine.py) each get
+# their own budget, since every site lives on its own domain.
+DOMAIN_RATE_LIMITS = {
+    "www.idealista.com": 4,
+    "www.idealista.it": 4,
+    "www.seloger.com": 3,
+}
+# Requests allowed back to back after an idle period
+REQUEST_BURST = 1
+# Random extra wait, as a fraction of the request interval
+REQUEST_JITTER = 0.3
+# Responses slower than this (or errors) slow the domain down...
+SLOW_RESPONSE_SECONDS = 15
+BACKOFF_FACTOR = 2.0
+# ...down to at most MAX_BACKOFF times the configured interval
+MAX_BACKOFF = 8.0
+
+# --- Browser Pacing ---
+# After a browser navigation, wait for the site's ready selectors (see
+# browser.wait_until_ready) instead of sleeping: polled this often, up to this long
+READY_POLL_SECONDS = 0.1
+READY_TIMEOUT_SECONDS = 20
+# Scroll pages like a human before reading them (slower; the parsers don't need it)
+HUMAN_LIKE_SCROLL = False
+
+# --- Browser Lifecycle ---
+# Browsers are reused across batches and replaced when they wear out (see
+# browser.DriverManager). Warm browsers launched ahead of need, per site:
+STANDBY_DRIVERS = 1
+# A browser is recycled once it crosses any of these (None disables one)
+DRIVER_MAX_PAGES = 60
+DRIVER_MAX_ERRORS = 3
+DRIVER_MAX_AGE_MINUTES = 30
+# Whole Chrome process tree with psutil installed, else the page's JS heap
+DRIVER_MAX_RSS_MB = 1500
+
+# --- Browser Resource Policy ---
+# The parsers only read text, so the browser skips heavy and third-party
+# resources (see browser.py). Site adapters can allowlist what they need.
+BLOCK_RESOURCES = True
+BLOCKED_RESOURCE_TYPES = ['image', 'font', 'media']
+# URL wildcards blocked for each resource type (Network.setBlockedURLs syntax)
+RESOURCE_TYPE_PATTERNS = {
+    'image': ['*.jpg*', '*.jpeg*', '*.png*', '*.gif*', '*.webp*', '*.avif*', '*.svg*', '*.ico*'],
+    'font': ['*.woff*', '*.woff2*', '*.ttf*', '*.otf*', '*.eot*'],
+    'media': ['*.mp4*', '*.webm*', '*.m3u8*', '*.mp3*'],
+    'stylesheet': ['*.css*'],
+}
+# Ads, analytics, tag managers and embedded maps
+BLOCKED_URL_PATTERNS = [
+    '*google-analytics.com*', '*googletagmanager.com*', '*googlesyndication.com*', '*doubleclick.net*',
+    '*adservice.google.*', '*maps.googleapis.com*', '*maps.gstatic.com*', '*facebook.net*',
+    '*connect.facebook.*', '*hotjar.com*', '*criteo.*', '*adnxs.com*', '*taboola.com*',
+    '*outbrain.com*', '*smartadserver.com*', '*tiqcdn.com*', '*scorecardresearch.com*',
+    '*bing.com/bat*', '*tiktok.com*', '*pinterest.com*', '*youtube.com/embed*',
+]
+
+# --- HTTP-First Fetching ---
+# Try a pooled requests.Session before falling back to the browser
+HTTP_FIRST = True
+HTTP_TIMEOUT = 15
+# Connections kept alive per host, shared by all workers
+HTTP_POOL_SIZE = 10
+# Page content that means we got a bot wall instead of the real page
+BOT_WALL_MARKERS = ["captcha-delivery.com", "geo.captcha", "please enable js", "pardon our interruption"]
+
+# --- Open Data Downloads (INSEE / data.paris.fr) ---
+# Datasets fetched by insee_scraper.py; targets are relative to PARIS_DATA_DIR
+DOWNLOAD_MANIFEST = PROJECT_ROOT / "scrapers" / "insee_manifest.json"
+# Files downloaded in parallel (they share one pooled session)
+DOWNLOAD_WORKERS = 4
+DOWNLOAD_CHUNK_BYTES = 1024 ** 2
+DOWNLOAD_TIMEOUT = 60
+
+# --- Crawl State ---
+# SQLite store holding the frontier, in-progress, done and failed URLs
+CRAWL_STATE_DB = BARCELONA_DATA_DIR.joinpath('crawl_state.sqlite')
+
+# --- Retry Queue ---
+# Failed listings (timeouts, captchas, pages without a price) are retried after
+# RETRY_BASE_DELAY_MINUTES, doubling with every attempt up to RETRY_MAX_DELAY_HOURS.
+# After RETRY_MAX_ATTEMPTS they are given up on. `--retry-failed` drains only this queue.
+RETRY_MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY_MINUTES = 10
+RETRY_MAX_DELAY_HOURS = 24
+
+# --- Deduplication ---
+# Listing IDs already seen in search results are kept in a compact int64 index
+# (see dedup.py). On disk, it is saved next to the crawl state and memory-mapped
+# on the next run, so it keeps growing across cities and years.
+DEDUP_INDEX_ON_DISK = True
+# Optional Bloom filter in front of the index, sized for this many listings (None disables it)
+DEDUP_BLOOM_CAPACITY = None
+DEDUP_BLOOM_ERROR_RATE = 0.001
+
+# --- Raw HTML Cache ---
+# Every fetched page is stored compressed so fields can be re-extracted offline
+HTML_CACHE_ENABLED = True
+HTML_CACHE_DIR = RAW_DATA_DIR / "html_cache"
+# Compressed size limit; least recently used pages are evicted first
+HTML_CACHE_MAX_BYTES = 5 * 1024 ** 3
+# Pages older than this are evicted too (None keeps them until the size limit)
+HTML_CACHE_MAX_AGE_DAYS = None
+
+# --- Parquet Output ---
+# Typed, partitioned copy of the details table (see parquet_sink.py)
+PARQUET_OUTPUT_ENABLED = True
+PARQUET_DIR = RAW_DATA_DIR / "listings_parquet"
+
+# --- Streaming Pipeline ---
+# How often idle detail workers check the frontier while the search crawl is running
+FRONTIER_POLL_SECONDS = 2
+
+# --- Incremental Re-crawl ---
+# In --incremental mode, listings are re-scraped when their search card
+# (price/size) changed or when their last scrape is older than this
+RECRAWL_TTL_DAYS = 30
+
+# --- Search Planning ---
+# Each city is split into district x price band shards (see search_planner.py).
+# "site" picks the site adapter (see sites.py). Idealista filters and pages
+# through the URL path; SeLoger ("style": "query") through the query string.
+# Verify the templates against the live site when adding a city.
+SEARCH_CITIES = {
+    "barcelona": {
+        "site": "idealista",
+        "root": "https://www.idealista.com/en/venta-viviendas/barcelona/",
+        "districts": [
+            "ciutat-vella", "eixample", "sants-montjuic", "les-corts", "sarria-sant-gervasi",
+            "gracia", "horta-guinardo", "nou-barris", "sant-andreu", "sant-marti",
+        ],
+        "price_min": "precio-desde_{}",
+        "price_max": "precio-hasta_{}",
+        "page_template": "pagina-{page}.htm",
+        "query": "ordenado-por=fecha-publicacion-desc",
+    },
+    "milano": {
+        "site": "idealista",
+        "root": "https://www.idealista.it/en/vendita-case/milano-milano/",
+        # No district slugs yet: the whole city is sharded by price band only
+        "districts": [],
+        "price_min": "prezzo-min_{}",
+        "price_max": "prezzo_{}",
+        "page_template": "lista-{page}.htm",
+        "query": "ordine=pubblicazione-desc",
+    },
+    "paris": {
+        "site": "seloger",
+        "style": "query",
+        "root": "https://www.seloger.com/list.htm",
+        # INSEE codes of the 20 arrondissements
+        "districts": [f"7501{n:02d}" for n in range(1, 21)],
+        "district_query": "places=[{{%22ci%22:{}}}]",
+        "price_query": "price={}/{}",
+        "page_param": "LISTING-LISTpg",
+        "query": "projects=2&types=1,2&sort=d_dt_crea",
+    },
+}
+# (min, max) asking-price bands; None means unbounded
+PRICE_BANDS = [(None, 150000), (150000, 250000), (250000, 400000), (400000, 700000), (700000, None)]
+# Search result pages walked per shard, and shards crawled at the same time
+SEARCH_MAX_PAGES = 60
+SEARCH_WORKERS = 4
+
+# --- Instrumentation ---
+# 0: warnings only, 1: progress (default), 2: per-field parser details
+LOG_VERBOSITY = 1
+# Per-stage timings and counters (see instrumentation.py)
+METRICS_DIR = DATA_DIR / "metrics"
+# One JSON line per timed stage / counter increment
+METRICS_EVENTS_ENABLED = True
+# End-of-run summary: "json" (metrics.json) or "prometheus" (metrics.prom)
+METRICS_FORMAT = "json"
@@ -0,0 +1,429 @@
+"""
+SQLite-backed crawl state.
+
+Replaces re-reading the URL and details CSVs on every start. URLs move through
+four tables: frontier -> in_progress -> done / failed, all keyed by a canonical
+URL. Every record is committed as soon as it is extracted, so a crash only
+loses the listing that was being fetched, and resuming is an indexed query
+instead of a full CSV scan.
+
+For incremental re-crawls, the `listings` table keeps a fingerprint of each
+listing's search-card snippet (price, size...) plus first/last seen and last
+scraped times, and `price_history` stores one row per observed price change.
+
+The `failed` table doubles as a durable retry queue: each failure stores its
+reason, attempt count and the time the URL is next eligible, which grows
+exponentially with every attempt (config.py 'Retry Queue'). Due failures are
+put back on the frontier by `requeue_due_failures()`; after
+config.RETRY_MAX_ATTEMPTS the URL stays in `failed` for good.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+import pandas as pd
+
+import config
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS frontier (
+    url_key   TEXT PRIMARY KEY,
+    url       TEXT NOT NULL,
+    added_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS in_progress (
+    url_key    TEXT PRIMARY KEY,
+    url        TEXT NOT NULL,
+    worker     TEXT,
+    started_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS done (
+    url_key     TEXT PRIMARY KEY,
+    url         TEXT NOT NULL,
+    record      TEXT,
+    finished_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS failed (
+    url_key         TEXT PRIMARY KEY,
+    url             TEXT NOT NULL,
+    reason          TEXT,
+    attempts        INTEGER NOT NULL DEFAULT 1,
+    failed_at       REAL NOT NULL,
+    next_attempt_at REAL,
+    last_error      TEXT
+);
+CREATE TABLE IF NOT EXISTS listings (
+    url_key      TEXT PRIMARY KEY,
+    url          TEXT NOT NULL,
+    fingerprint  TEXT,
+    price        INTEGER,
+    first_seen   REAL NOT NULL,
+    last_seen    REAL NOT NULL,
+    last_scraped REAL
+);
+CREATE TABLE IF NOT EXISTS price_history (
+    url_key TEXT NOT NULL,
+    seen_at INTEGER NOT NULL,
+    price   INTEGER,
+    PRIMARY KEY (url_key, seen_at)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    name  TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_frontier_added ON frontier(added_at);
+"""
+
+# Tables keyed by url_key, rewritten when the key scheme changes
+# (price_history first: it finds its URLs through the old listings keys)
+KEYED_TABLES = ('frontier', 'in_progress', 'done', 'failed', 'price_history', 'listings')
+
+# Columns added after the first release, created on old stores by `_migrate`
+MIGRATIONS = {
+    'failed': {
+        # Old failures become eligible for a retry right away
+        'next_attempt_at': "ALTER TABLE failed ADD COLUMN next_attempt_at REAL; "
+                           "UPDATE failed SET next_attempt_at = failed_at;",
+        'last_error': "ALTER TABLE failed ADD COLUMN last_error TEXT;",
+    },
+}
+
+
+def canonical_url(url: str) -> str:
+    """Normalizes a listing URL: lowercase host, no query string or fragment, trailing slash."""
+    parts = urlsplit(url.strip())
+    path = parts.path if parts.path.endswith('/') else parts.path + '/'
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, '', ''))
+
+
+def card_fingerprint(card: dict) -> str:
+    """Short hash of the search-card snippet; changes when price or size change."""
+    snippet = f"{card.get('price') or ''}|{card.get('details') or ''}".lower()
+    return hashlib.sha1(" ".join(snippet.split()).encode('utf-8')).hexdigest()[:16]
+
+
+def retry_delay(attempts: int) -> float:
+    """Seconds before retry number `attempts` + 1: exponential, capped and jittered by ±20%."""
+    delay = config.RETRY_BASE_DELAY_MINUTES * 60 * 2 ** max(attempts - 1, 0)
+    return min(delay, config.RETRY_MAX_DELAY_HOURS * 3600) * random.uniform(0.8, 1.2)
+
+
+def parse_price(text):
+    """'350.000 €' -> 350000; None if there are no digits."""
+    digits = re.sub(r'[^0-9]', '', text or '')
+    return int(digits) if digits else None
+
+
+class CrawlState:
+    """
+    Thread-safe crawl state store (one WAL-mode SQLite file per city).
+
+    `key_fn` turns a URL into its key (a site adapter's `url_key`, so aliases
+    of a listing share one key); `key_scheme` names it. When a store written
+    with another scheme is opened, its keys are rebuilt once and aliases merged.
+    """
+
+    def __init__(self, db_path, key_fn=canonical_url, key_scheme: str = 'url'):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self.key_fn = key_fn
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        self._conn.commit()
+        self._rekey(key_scheme)
+
+    def _migrate(self):
+        for table, columns in MIGRATIONS.items():
+            existing = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            for column, script in columns.items():
+                if column not in existing:
+                    self._conn.executescript(script)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_failed_next ON failed(next_attempt_at)")
+
+    def _rekey(self, key_scheme: str):
+        """Rebuilds every url_key with `key_fn` if the store was written with another key scheme."""
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'key_scheme'").fetchone()
+        stored = row[0] if row else 'url'
+        if stored != key_scheme:
+            self._conn.create_function('listing_key', 1, self.key_fn, deterministic=True)
+            before = self._conn.total_changes
+            with self._conn:
+                for table in KEYED_TABLES:
+                    source = 'url' if table != 'price_history' else \
+                        "(SELECT url FROM listings WHERE listings.url_key = price_history.url_key)"
+                    # OR REPLACE: aliases of one listing collapse into a single row
+                    self._conn.execute(f"UPDATE OR REPLACE {table} SET url_key = listing_key({source})")
+                # An alias still queued for a listing that is already scraped
+                self._conn.execute("DELETE FROM frontier WHERE url_key IN (SELECT url_key FROM done)")
+            if self._conn.total_changes > before:
+                print(f"✓ Rebuilt crawl state keys ({stored} -> {key_scheme})")
+        with self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('key_scheme', ?)", (key_scheme,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # --- Frontier ---
+
+    def add_urls(self, urls) -> int:
+        """Adds URLs to the frontier unless already known. Returns how many were new."""
+        now = time.time()
+        rows = [(self.key_fn(url), url, now) for url in urls if url]
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                """INSERT OR IGNORE INTO frontier (url_key, url, added_at)
+                   SELECT ?, ?, ?
+                   WHERE NOT EXISTS (SELECT 1 FROM done WHERE url_key = ?1)
+                     AND NOT EXISTS (SELECT 1 FROM failed WHERE url_key = ?1)
+                     AND NOT EXISTS (SELECT 1 FROM in_progress WHERE url_key = ?1)""",
+                rows,
+            )
+            return self._conn.total_changes - before
+
+    def claim(self, worker, limit: int, retries_only: bool = False) -> list:
+        """
+        Atomically moves up to `limit` frontier URLs to in_progress for
+        `worker`. With `retries_only`, only URLs from the retry queue are claimed.
+        """
+        now = time.time()
+        query = "SELECT url_key, url FROM frontier"
+        if retries_only:
+            query += " WHERE url_key IN (SELECT url_key FROM failed)"
+        with self._lock, self._conn:
+            rows = self._conn.execute(query + " ORDER BY added_at LIMIT ?", (limit,)).fetchall()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO in_progress (url_key, url, worker, started_at) VALUES (?, ?, ?, ?)",
+                [(key, url, str(worker), now) for key, url in rows],
+            )
+            self._conn.executemany("DELETE FROM frontier WHERE url_key = ?", [(key,) for key, _ in rows])
+        return [url for _, url in rows]
+
+    def requeue_in_progress(self) -> int:
+        """Puts URLs left in_progress by a crashed run back on the frontier."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO frontier (url_key, url, added_at) SELECT url_key, url, started_at FROM in_progress"
+            )
+            return self._conn.execute("DELETE FROM in_progress").rowcount
+
+    # --- Outcomes ---
+
+    def mark_done(self, url: str, record: dict = None):
+        """Commits an extracted record immediately."""
+        key = self.key_fn(url)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO done (url_key, url, record, finished_at) VALUES (?, ?, ?, ?)",
+                (key, url, json.dumps(record, default=str) if record is not None else None, time.time()),
+            )
+            self._conn.execute("DELETE FROM in_progress WHERE url_key = ?", (key,))
+            self._conn.execute("DELETE FROM frontier WHERE url_key = ?", (key,))
+            self._conn.execute("DELETE FROM failed WHERE url_key = ?", (key,))
+            self._conn.execute("UPDATE listings SET last_scraped = ? WHERE url_key = ?", (time.time(), key))
+
+    def mark_failed(self, url: str, reason: str = None, error: str = None, retry: bool = True) -> int:
+        """
+        Records a failure; repeated failures bump the attempt counter. The URL
+        is scheduled for another try after `retry_delay` unless `retry` is off
+        or it reached config.RETRY_MAX_ATTEMPTS. Returns the attempt count.
+        """
+        key = self.key_fn(url)
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT attempts FROM failed WHERE url_key = ?", (key,)).fetchone()
+            attempts = row[0] + 1 if row else 1
+            retry = retry and attempts < config.RETRY_MAX_ATTEMPTS
+            self._conn.execute(
+                """INSERT OR REPLACE INTO failed (url_key, url, reason, attempts, failed_at, next_attempt_at, last_error)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (key, url, reason, attempts, now, now + retry_delay(attempts) if retry else None, error),
+            )
+            self._conn.execute("DELETE FROM in_progress WHERE url_key = ?", (key,))
+            self._conn.execute("DELETE FROM frontier WHERE url_key = ?", (key,))
+        return attempts
+
+    # --- Retry queue ---
+
+    def requeue_due_failures(self, now: float = None) -> int:
+        """Puts failed URLs whose backoff has elapsed back on the frontier. Returns how many."""
+        now = time.time() if now is None else now
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.execute(
+                """INSERT OR IGNORE INTO frontier (url_key, url, added_at)
+                   SELECT url_key, url, next_attempt_at FROM failed
+                   WHERE next_attempt_at <= ?
+                     AND NOT EXISTS (SELECT 1 FROM in_progress i WHERE i.url_key = failed.url_key)""",
+                (now,),
+            )
+            return self._conn.total_changes - before
+
+    def retry_summary(self) -> dict:
+        """Retry queue sizes: due now, waiting for their backoff, given up; plus counts by reason."""
+        now = time.time()
+        with self._lock:
+            due, waiting, exhausted, next_at = self._conn.execute(
+                """SELECT COALESCE(SUM(next_attempt_at <= ?1), 0),
+                          COALESCE(SUM(next_attempt_at > ?1), 0),
+                          COALESCE(SUM(next_attempt_at IS NULL), 0),
+                          MIN(CASE WHEN next_attempt_at > ?1 THEN next_attempt_at END)
+                   FROM failed""",
+                (now,),
+            ).fetchone()
+            by_reason = dict(self._conn.execute(
+                "SELECT COALESCE(reason, 'unknown'), COUNT(*) FROM failed GROUP BY 1 ORDER BY 2 DESC"
+            ).fetchall())
+        return {'due': due, 'waiting': waiting, 'exhausted': exhausted,
+                'next_due_in': round(next_at - now) if next_at else None, 'by_reason': by_reason}
+
+    # --- Incremental re-crawl ---
+
+    def observe_cards(self, cards, ttl_seconds: float = None, requeue_changed: bool = True) -> int:
+        """
+        Records the search cards seen on a results page: new listings go to
+        the frontier, and price changes are appended to `price_history`. With
+        `requeue_changed`, already scraped listings whose snippet changed, or
+        that were last scraped more than `ttl_seconds` ago, are queued again.
+        Returns how many URLs were queued.
+        """
+        now = time.time()
+        stale_before = now - ttl_seconds if ttl_seconds else None
+        queued = 0
+        with self._lock, self._conn:
+            for card in cards:
+                url = card['url']
+                key = self.key_fn(url)
+                fingerprint = card_fingerprint(card)
+                price = parse_price(card.get('price'))
+
+                row = self._conn.execute(
+                    "SELECT fingerprint, price, last_scraped FROM listings WHERE url_key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute(
+                        """INSERT INTO listings (url_key, url, fingerprint, price, first_seen, last_seen, last_scraped)
+                           VALUES (?, ?, ?, ?, ?, ?, (SELECT finished_at FROM done WHERE url_key = ?))""",
+                        (key, url, fingerprint, price, now, now, key),
+                    )
+                    changed, price_changed, last_scraped = False, True, None
+                else:
+                    old_fingerprint, old_price, last_scraped = row
+                    changed, price_changed = old_fingerprint != fingerprint, old_price != price
+                    self._conn.execute(
+                        "UPDATE listings SET fingerprint = ?, price = ?, last_seen = ? WHERE url_key = ?",
+                        (fingerprint, price, now, key),
+                    )
+
+                if price_changed and price is not None:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO price_history (url_key, seen_at, price) VALUES (?, ?, ?)",
+                        (key, int(now), price),
+                    )
+
+                status = self._status(key)
+                stale = stale_before is not None and (last_scraped is None or last_scraped < stale_before)
+                if status is None or (requeue_changed and status == 'done' and (changed or stale)):
+                    self._conn.execute(
+                        "INSERT OR IGNORE INTO frontier (url_key, url, added_at) VALUES (?, ?, ?)", (key, url, now)
+                    )
+                    queued += 1
+        return queued
+
+    def _status(self, key: str):
+        """Name of the table holding `key`, or None for an unknown URL. Caller holds the lock."""
+        for table in ('frontier', 'in_progress', 'done', 'failed'):
+            if self._conn.execute(f"SELECT 1 FROM {table} WHERE url_key = ?", (key,)).fetchone():
+                return table
+        return None
+
+    def price_history(self, url: str = None) -> pd.DataFrame:
+        """Price history of one listing, or of every listing if `url` is None."""
+        query = "SELECT l.url, p.seen_at, p.price FROM price_history p JOIN listings l USING (url_key)"
+        params = ()
+        if url is not None:
+            query += " WHERE p.url_key = ?"
+            params = (self.key_fn(url),)
+        with self._lock:
+            df = pd.read_sql_query(query + " ORDER BY l.url, p.seen_at", self._conn, params=params)
+        df['seen_at'] = pd.to_datetime(df['seen_at'], unit='s')
+        return df
+
+    # --- Queries ---
+
+    def has_pending(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM frontier LIMIT 1").fetchone() is not None
+
+    def counts(self) -> dict:
+        """Number of URLs in each table."""
+        with self._lock:
+            return {
+                table: self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ('frontier', 'in_progress', 'done', 'failed')
+            }
+
+    def iter_urls(self, chunk_size: int = 10_000):
+        """Yields lists of every URL the crawl has seen (one per key), `chunk_size` at a time."""
+        last_key = ''
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    """SELECT url_key, MIN(url) FROM (SELECT url_key, url FROM frontier UNION SELECT url_key, url FROM done
+                                                      UNION SELECT url_key, url FROM failed
+                                                      UNION SELECT url_key, url FROM in_progress)
+                       WHERE url_key > ? GROUP BY url_key ORDER BY url_key LIMIT ?""",
+                    (last_key, chunk_size),
+                ).fetchall()
+            if not rows:
+                return
+            last_key = rows[-1][0]
+            yield [url for _, url in rows]
+
+    def known_urls(self, key_prefix: str = '') -> int:
+        """Total number of distinct URLs the crawl has ever seen (only keys starting with `key_prefix`, if given)."""
+        with self._lock:
+            # A failure waiting for its retry can be on the frontier and in `failed` at once
+            return self._conn.execute(
+                """SELECT COUNT(*) FROM (SELECT url_key FROM frontier UNION SELECT url_key FROM in_progress
+                                         UNION SELECT url_key FROM done UNION SELECT url_key FROM failed)
+                   WHERE substr(url_key, 1, ?1) = ?2""",
+                (len(key_prefix), key_prefix),
+            ).fetchone()[0]
+
+    # --- Migration ---
+
+    def import_csvs(self, url_file=None, details_file=None):
+        """
+        One-off bootstrap from the CSVs written by older versions of the scraper.
+        Only runs on an empty store.
+        """
+        if self.known_urls() > 0:
+            return
+        if details_file and os.path.exists(details_file) and os.path.getsize(details_file) > 0:
+            details_df = pd.read_csv(details_file)
+            if 'url' in details_df.columns:
+                now = time.time()
+                rows = [(self.key_fn(url), url, now) for url in details_df['url'].dropna()]
+                with self._lock, self._conn:
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO done (url_key, url, record, finished_at) VALUES (?, ?, NULL, ?)", rows
+                    )
+                print(f"✓ Imported {len(rows)} scraped URLs from {details_file}")
+        if url_file and os.path.exists(url_file) and os.path.getsize(url_file) > 0:
+            urls_df = pd.read_csv(url_file)
+            if 'listing_url' in urls_df.columns:
+                added = self.add_urls(urls_df['listing_url'].dropna())
+                print(f"✓ Imported {added} pending URLs from {url_file}")
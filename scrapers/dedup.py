@@ -0,0 +1,181 @@
+"""
+Compact, memory-bounded index of the listing IDs a crawl has already seen.
+
+Site adapters turn every listing URL into a numeric ID (see sites.py), so
+aliases of the same listing (language prefixes, tracking query strings...)
+collapse to one entry. IDs live in a sorted int64 NumPy array, 8 bytes
+each, so millions of listings take tens of MB instead of the hundreds a
+Python set of URLs would. New IDs are buffered in a small set and merged in
+bulk.
+
+For multi-city, multi-year crawls the array can be saved as a .npy file and
+memory-mapped on the next run, so only the pages that lookups touch are
+read. An optional Bloom filter in front of it answers "never seen" without
+touching the array at all:
+
+    index = ListingIndex(path, bloom_capacity=10_000_000)
+    fresh = [url for url, new in zip(urls, index.add_many(ids)) if new]
+    index.save()
+"""
+import math
+import os
+import threading
+
+import numpy as np
+
+
+# --- BLOOM FILTER ---
+
+def _mix64(values: np.ndarray) -> np.ndarray:
+    """SplitMix64 finalizer: spreads int64 IDs over 64 bits (vectorized, wraps on overflow)."""
+    z = values.astype(np.uint64)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over int64 IDs. Sized for `capacity` items at a
+    false positive rate of `error_rate`; never gives false negatives.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = np.zeros((self.num_bits + 7) // 8, dtype=np.uint8)
+
+    def _positions(self, ids: np.ndarray) -> np.ndarray:
+        # Double hashing: position_i = h1 + i * h2
+        h1 = _mix64(ids)
+        h2 = _mix64(ids ^ np.int64(0x5DEECE66D)) | np.uint64(1)
+        steps = np.arange(self.num_hashes, dtype=np.uint64)
+        return (h1[:, None] + steps[None, :] * h2[:, None]) % np.uint64(self.num_bits)
+
+    def add(self, ids):
+        positions = self._positions(np.asarray(ids, dtype=np.int64)).ravel()
+        masks = np.left_shift(1, positions & np.uint64(7)).astype(np.uint8)
+        np.bitwise_or.at(self.bits, positions >> np.uint64(3), masks)
+
+    def might_contain(self, ids) -> np.ndarray:
+        """Boolean array: False means the ID was certainly never added."""
+        positions = self._positions(np.asarray(ids, dtype=np.int64))
+        hits = (self.bits[positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1
+        return hits.all(axis=1)
+
+
+# --- LISTING INDEX ---
+
+class ListingIndex:
+    """
+    Thread-safe set of int64 listing IDs.
+
+    - `path`: optional .npy file; loaded memory-mapped if it exists and
+      written by `save()`.
+    - `bloom_capacity`: size of the optional Bloom filter tier (None: off).
+    - `buffer_size`: new IDs kept in a Python set before being merged into
+      the sorted array.
+    """
+
+    def __init__(self, path=None, bloom_capacity: int = None, bloom_error_rate: float = 0.001,
+                 buffer_size: int = 50_000):
+        self.path = str(path) if path else None
+        self.buffer_size = buffer_size
+        self._lock = threading.Lock()
+        self._buffer = set()
+        if self.path and os.path.exists(self.path):
+            self._sorted = np.load(self.path, mmap_mode='r')
+        else:
+            self._sorted = np.empty(0, dtype=np.int64)
+        self.bloom = None
+        if bloom_capacity:
+            self.bloom = BloomFilter(bloom_capacity, bloom_error_rate)
+            for start in range(0, len(self._sorted), 1_000_000):
+                self.bloom.add(self._sorted[start:start + 1_000_000])
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sorted) + len(self._buffer)
+
+    def __contains__(self, listing_id) -> bool:
+        return bool(self.contains_many([listing_id])[0])
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the index (a memory-mapped array counts in full)."""
+        bloom = self.bloom.bits.nbytes if self.bloom is not None else 0
+        return self._sorted.nbytes + len(self._buffer) * 60 + bloom
+
+    # --- Lookups / updates ---
+
+    def contains_many(self, ids) -> np.ndarray:
+        """Boolean array: which of `ids` are already in the index."""
+        ids = np.asarray(ids, dtype=np.int64)
+        with self._lock:
+            return self._contains(ids)
+
+    def _contains(self, ids: np.ndarray) -> np.ndarray:
+        found = np.zeros(len(ids), dtype=bool)
+        candidates = np.ones(len(ids), dtype=bool) if self.bloom is None else self.bloom.might_contain(ids)
+        if candidates.any() and len(self._sorted):
+            probe = ids[candidates]
+            positions = np.searchsorted(self._sorted, probe).clip(max=len(self._sorted) - 1)
+            found[candidates] = self._sorted[positions] == probe
+        if self._buffer:
+            found |= np.fromiter((i in self._buffer for i in ids.tolist()), dtype=bool, count=len(ids))
+        return found
+
+    def add(self, listing_id) -> bool:
+        """Adds one ID. True if it was new."""
+        return bool(self.add_many([listing_id])[0])
+
+    def add_many(self, ids) -> np.ndarray:
+        """
+        Adds `ids` and returns a boolean array marking the ones that were new
+        (the first occurrence of an ID repeated in `ids` counts as new).
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        with self._lock:
+            new = ~self._contains(ids)
+            _, first = np.unique(ids, return_index=True)
+            repeated = np.ones(len(ids), dtype=bool)
+            repeated[first] = False
+            new &= ~repeated
+            fresh = ids[new]
+            if len(fresh):
+                self._buffer.update(fresh.tolist())
+                if self.bloom is not None:
+                    self.bloom.add(fresh)
+                if len(self._buffer) >= self.buffer_size:
+                    self._merge()
+        return new
+
+    def clear(self):
+        """Empties the index (the file at `path` is only rewritten by `save()`)."""
+        with self._lock:
+            self._buffer = set()
+            self._sorted = np.empty(0, dtype=np.int64)
+            if self.bloom is not None:
+                self.bloom.bits[:] = 0
+
+    def _merge(self):
+        """Folds the buffer into the sorted array. Caller holds the lock."""
+        if self._buffer:
+            # Buffered IDs are never in the array already: a sorted insert is enough
+            buffered = np.sort(np.fromiter(self._buffer, dtype=np.int64, count=len(self._buffer)))
+            self._sorted = np.insert(self._sorted, np.searchsorted(self._sorted, buffered), buffered)
+            self._buffer = set()
+
+    def save(self, path=None):
+        """Writes the index as a .npy file (atomically) and reopens it memory-mapped."""
+        path = str(path or self.path)
+        with self._lock:
+            self._merge()
+            # Copy out of the old memory map so the file can be replaced (Windows)
+            self._sorted = np.array(self._sorted, dtype=np.int64)
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            tmp_path = f"{path}.tmp.npy"
+            np.save(tmp_path, self._sorted)
+            os.replace(tmp_path, path)
+            self._sorted = np.load(path, mmap_mode='r')
+        return path
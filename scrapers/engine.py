@@ -0,0 +1,723 @@
+"""
+Shared scraping engine for every real estate site.
+
+The request scheduler, HTTP-first fetcher, crawl state, worker pool, raw
+HTML cache and Parquet output are site-agnostic; everything site-specific
+(parsers, selectors, URL shapes, output paths) comes from a site adapter
+(see sites.py). Several sites run concurrently through `run_sites`, each
+with its own crawl state and detail workers, all sharing one scheduler so
+that every domain keeps its own politeness budget.
+
+    python engine.py --cities barcelona milano paris
+"""
+import argparse
+import functools
+import os
+import platform
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+import undetected_chromedriver as uc
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium_stealth import stealth
+
+import config
+from crawl_state import CrawlState
+from dedup import ListingIndex
+from fetcher import PageFetcher, failure_reason, is_bot_wall, is_unavailable, make_session
+from browser import READY, TIMEOUT, DriverManager, wait_until_ready
+from html_cache import HtmlCache, reextract
+from instrumentation import WARNING, log, metrics
+from parquet_sink import ParquetSink
+from scheduler import RequestScheduler
+from search_planner import SearchShard
+from sites import adapter_for_city
+from worker_pool import ResultSink, run_worker_pool
+
+
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/109.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/109.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36'
+]
+
+_DRIVER_INIT_LOCK = threading.Lock()
+
+
+# --- HELPER FUNCTIONS ---
+
+def human_like_scroll(driver):
+    """Simulate human-like scrolling behavior (only if config.HUMAN_LIKE_SCROLL is on)."""
+    if not config.HUMAN_LIKE_SCROLL:
+        return
+    with metrics.stage('scroll'):
+        driver.execute_script("window.scrollTo(0, document.body.scrollHeight*0.1);")
+        time.sleep(random.uniform(0.6, 1.2))
+        total_height = driver.execute_script("return document.body.scrollHeight")
+        for i in range(1, int(random.uniform(3, 6))):
+            scroll_to = total_height * (i / 5) + random.randint(-150, 150)
+            driver.execute_script(f"window.scrollTo(0, {scroll_to});")
+            time.sleep(random.uniform(0.8, 1.8))
+
+
+@functools.lru_cache(maxsize=None)
+def get_chrome_path():
+    """
+    Automatically detect Chrome/Chromium installation path based on OS.
+    Runs once per process; later calls return the cached result.
+    """
+    system = platform.system()
+
+    if system == "Darwin":  # macOS
+        paths = [
+            "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome",
+            "/Applications/Chromium.app/Contents/MacOS/Chromium",
+            str(Path.home() / "Applications/Google Chrome.app/Contents/MacOS/Google Chrome"),
+            str(Path.home() / "Applications/Chromium.app/Contents/MacOS/Chromium"),
+        ]
+    elif system == "Linux":
+        paths = [
+            "/usr/bin/chromium",
+            "/usr/bin/chromium-browser",
+            "/usr/bin/google-chrome",
+            "/snap/bin/chromium",
+        ]
+    elif system == "Windows":
+        paths = [
+            "C:\\Program Files\\Google\\Chrome\\Application\\chrome.exe",
+            "C:\\Program Files (x86)\\Google\\Chrome\\Application\\chrome.exe",
+            str(Path.home() / "AppData/Local/Google/Chrome/Application/chrome.exe"),
+        ]
+    else:
+        paths = []
+
+    for path in paths:
+        if os.path.exists(path):
+            print(f"✓ Found browser at: {path}")
+            return path
+
+    return None
+
+# --- BROWSER SETUP ---
+
+def launch_driver(user_agent: str, chrome_path: str = None, resource_policy=None):
+    """
+    Starts a stealth undetected-chromedriver instance. With a
+    `resource_policy` (see browser.py), images, fonts, media and trackers
+    are not downloaded.
+    """
+    options = uc.ChromeOptions()
+    options.add_argument(f"user-agent={user_agent}")
+    options.add_argument('--disable-blink-features=AutomationControlled')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    if resource_policy is not None and resource_policy.chrome_prefs():
+        options.add_experimental_option("prefs", resource_policy.chrome_prefs())
+
+    if chrome_path:
+        options.binary_location = chrome_path
+    else:
+        print("! No Chrome/Chromium found. Trying default installation...")
+
+    # undetected-chromedriver patches its binary on start, so launches must not overlap
+    with _DRIVER_INIT_LOCK:
+        driver = uc.Chrome(options=options, use_subprocess=True)
+    stealth(driver, languages=["en-US", "en"], vendor="Google Inc.", platform="Win32")
+    if resource_policy is not None:
+        resource_policy.apply(driver)
+    return driver
+
+
+def prepare_search_page(driver, site):
+    """Browser fallback for search pages: cookie banner, then wait for the results to render."""
+    if not getattr(driver, 'cookies_accepted', False):
+        try:
+            WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.ID, site.cookie_button_id))).click()
+            log("✓ Accepted cookies.")
+        except TimeoutException:
+            log("! No cookie banner found or it timed out.")
+        driver.cookies_accepted = True
+
+    if wait_until_ready(driver, site.search_wait_selectors, page='search') != READY:
+        raise TimeoutError(f"Search results did not render within {config.READY_TIMEOUT_SECONDS}s")
+    human_like_scroll(driver)
+
+
+def prepare_detail_page(driver, site):
+    """
+    Browser fallback for detail pages: returns as soon as the price and
+    features are rendered or the listing turns out to be unavailable.
+    """
+    if wait_until_ready(driver, site.detail_wait_selectors, site.unavailable_markers) == TIMEOUT:
+        log(f"  ! Page not ready after {config.READY_TIMEOUT_SECONDS}s, parsing what rendered", WARNING)
+    human_like_scroll(driver)
+
+
+def open_driver_manager(site) -> DriverManager:
+    """
+    Driver manager for `site`: browsers are launched with a random user agent
+    and the site's resource policy, kept warm and recycled on health
+    thresholds (config.py 'Browser Lifecycle').
+    """
+    chrome_path = get_chrome_path()
+    resource_policy = site.resource_policy()
+    return DriverManager(lambda: launch_driver(random.choice(USER_AGENTS), chrome_path, resource_policy))
+
+
+# --- STORAGE ---
+
+def open_crawl_state(site) -> CrawlState:
+    """
+    Opens the crawl state of `site`, importing its legacy CSVs on first use
+    and putting back any URLs a crashed run left in progress.
+    """
+    os.makedirs(site.data_dir, exist_ok=True)
+    state = CrawlState(site.state_db, key_fn=site.url_key, key_scheme=f"{site.name}-listing-id")
+    state.import_csvs(url_file=site.url_file, details_file=site.details_file)
+    requeued = state.requeue_in_progress()
+    if requeued:
+        print(f"✓ [{site.label}] Re-queued {requeued} URLs left in progress by a previous run.")
+    return state
+
+
+def open_listing_index(site, state: CrawlState) -> ListingIndex:
+    """
+    Opens the seen-listings index of `site` (config.py 'Deduplication'). It
+    must hold the listing IDs of the crawl state: a new index, or a saved one
+    whose size does not match the state (state reset or deleted, crash before
+    the index was saved...), is rebuilt from the state.
+    """
+    path = site.listing_index_file if config.DEDUP_INDEX_ON_DISK else None
+    index = ListingIndex(path, bloom_capacity=config.DEDUP_BLOOM_CAPACITY,
+                         bloom_error_rate=config.DEDUP_BLOOM_ERROR_RATE)
+    if len(index) != state.known_urls(key_prefix=f"{site.name}:"):
+        if len(index):
+            print(f"! [{site.label}] Listing index out of date with the crawl state, rebuilding it")
+        index.clear()
+        for urls in state.iter_urls():
+            index.add_many([i for i in map(site.listing_id, urls) if i is not None])
+        if len(index):
+            print(f"✓ [{site.label}] Indexed {len(index)} known listing IDs")
+    return index
+
+
+def open_html_cache():
+    """Opens the raw HTML cache configured in config.py, or returns None if it is disabled."""
+    if not config.HTML_CACHE_ENABLED:
+        return None
+    return HtmlCache(config.HTML_CACHE_DIR, config.HTML_CACHE_MAX_BYTES, config.HTML_CACHE_MAX_AGE_DAYS)
+
+
+def rebuild_details_from_cache(site, output_file=None, processes: int = None):
+    """
+    Rebuilds the details table of `site` offline from the raw HTML cache, at
+    parser speed, e.g. after fixing a selector or adding a field.
+    """
+    output_file = output_file or site.details_file
+    cache = HtmlCache(config.HTML_CACHE_DIR)
+    records = reextract(cache, site.detail_parser, url_filter=site.is_detail_url, processes=processes)
+    cache.close()
+    if not records:
+        print(f"! The HTML cache has no {site.name} detail pages.")
+        return
+
+    tmp_file = f"{output_file}.tmp"
+    pd.DataFrame(records).to_csv(tmp_file, index=False)
+    os.replace(tmp_file, output_file)
+    print(f"✓ Rebuilt {len(records)} records into {output_file}")
+
+
+# --- SEARCH CRAWL ---
+
+def iter_search_pages(site, start_url: str, max_pages: int = 10, scheduler: RequestScheduler = None,
+                      http_first: bool = config.HTTP_FIRST, shard: SearchShard = None, session=None,
+                      drivers: DriverManager = None, cache: HtmlCache = None):
+    """
+    Walks the search result pages of `site` and yields the listing cards of
+    each page (dicts with 'url', 'price' and 'details') as soon as it is
+    parsed, so callers can persist and consume them while the crawl is still
+    running. With a `shard`, page URLs are computed directly from it instead
+    of following the 'Next' link from `start_url`.
+    Every page load goes through `scheduler` (built from config.py if omitted).
+    Pages are fetched over plain HTTP first (through `session` if given); the
+    browser is only launched if a page needs it, from `drivers` if given.
+    Pages are stored in `cache` if given, else in a cache opened for this walk.
+    """
+    start_url = shard.page_url(1) if shard is not None else start_url
+    log(f"Starting URL scrape for: {start_url}")
+    scheduler = scheduler or RequestScheduler.from_config()
+    user_agent = random.choice(USER_AGENTS)
+    if http_first and session is None:
+        session = make_session(user_agent)
+    owned_cache = cache is None
+    if owned_cache:
+        cache = open_html_cache()
+
+    fetcher = PageFetcher(
+        scheduler,
+        session=session if http_first else None,
+        driver_factory=lambda: launch_driver(user_agent, get_chrome_path(), site.resource_policy()),
+        after_load=lambda driver: prepare_search_page(driver, site),
+        cache=cache,
+        drivers=drivers,
+    )
+
+    try:
+        current_url = start_url
+
+        for page_num in range(1, max_pages + 1):
+            if shard is not None:
+                current_url = shard.page_url(page_num)
+            log(f"\n{'='*60}\n[{site.label}] Scraping search results page {page_num} of {shard or start_url}...\n{'='*60}")
+
+            result = None
+            try:
+                result = fetcher.fetch(current_url, site.search_ready_selectors)
+                with metrics.stage('extraction', site=site.name, page='search'):
+                    cards_on_page, next_url = site.parse_search_cards(result.html, current_url)
+                metrics.count('search_pages', site=site.name, via=result.via)
+                log(f"✓ Found {len(cards_on_page)} listings on this page (via {result.via}).")
+
+            except Exception as e:
+                log(f"✗ Error on page {page_num}: {e}", WARNING)
+                metrics.count('search_pages_failed', site=site.name, reason=type(e).__name__)
+                if result is not None:
+                    # Failed fetches are already recorded by the scheduler; a page that does not parse is not
+                    scheduler.report_failure(current_url)
+                if fetcher.driver is not None:
+                    os.makedirs(config.ERROR_DIR, exist_ok=True)
+                    fetcher.driver.save_screenshot(config.ERROR_DIR / f'error_{site.name}_page_{page_num}.png')
+                break
+
+            yield cards_on_page
+
+            if next_url is None or not cards_on_page:
+                log("✓ No 'Next' button found. Reached the last page.")
+                break
+            current_url = next_url
+
+    finally:
+        if fetcher.driver is not None:
+            fetcher.close()
+            log("\n✓ Browser for URL scraping closed.")
+        if owned_cache and cache is not None:
+            cache.close()
+
+
+def scrape_search_urls(site, start_url: str, max_pages: int = 10, scheduler: RequestScheduler = None,
+                       http_first: bool = config.HTTP_FIRST) -> list:
+    """
+    Scrapes listing URLs from one search URL of `site` and returns them as a
+    list. See `iter_search_pages` for the streaming version.
+    """
+    listing_urls = {}
+    for cards_on_page in iter_search_pages(site, start_url, max_pages, scheduler, http_first):
+        for card in cards_on_page:
+            listing_urls.setdefault(site.url_key(card['url']), card['url'])
+
+    unique_urls = list(listing_urls.values())
+    print(f"\n{'='*60}\n✓ URL scraping function complete!\n✓ Collected {len(unique_urls)} unique URLs in memory.\n{'='*60}")
+    return unique_urls
+
+
+def crawl_search_shards(site, shards: list, max_pages: int, scheduler: RequestScheduler, state: CrawlState,
+                        incremental: bool = False, search_workers: int = config.SEARCH_WORKERS,
+                        cache: HtmlCache = None):
+    """
+    Crawls search shards concurrently and persists the cards of every page
+    to the crawl state as soon as it is parsed. Listings seen in several
+    shards or in earlier runs are skipped by listing ID through the
+    seen-listings index before they reach the state. New listings are always
+    queued; in incremental mode, every card is checked against the state and
+    listings whose card changed or whose last scrape is older than the TTL
+    are queued too. Every shard stores its pages in `cache` (opened here if
+    omitted), so the cache size limit holds across shards.
+    """
+    ttl_seconds = config.RECRAWL_TTL_DAYS * 86400 if incremental else None
+    session = make_session(random.choice(USER_AGENTS)) if config.HTTP_FIRST else None
+    drivers = open_driver_manager(site)
+    index = open_listing_index(site, state)
+    owned_cache = cache is None
+    if owned_cache:
+        cache = open_html_cache()
+
+    def crawl_shard(shard):
+        queued = 0
+        for cards_on_page in iter_search_pages(site, None, max_pages, scheduler, shard=shard, session=session,
+                                               drivers=drivers, cache=cache):
+            ids = [site.listing_id(card['url']) for card in cards_on_page]
+            # Check and insert in one locked step, so two shards never both take an ID as new
+            fresh = iter(index.add_many([i for i in ids if i is not None]))
+            new = [i is None or bool(next(fresh)) for i in ids]
+            if not incremental:
+                metrics.count('listings_deduplicated', new.count(False), site=site.name)
+                cards_on_page = [card for card, is_new in zip(cards_on_page, new) if is_new]
+            queued += state.observe_cards(cards_on_page, ttl_seconds=ttl_seconds, requeue_changed=incremental)
+        metrics.count('listings_queued', queued, site=site.name)
+        log(f"✓ {shard.label}: queued {queued} URLs for detail scraping.")
+        return queued
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, search_workers), thread_name_prefix=f"search-{site.name}") as pool:
+            total = sum(pool.map(crawl_shard, shards))
+    finally:
+        drivers.close()
+        if index.path:
+            index.save()
+        if owned_cache and cache is not None:
+            cache.close()
+    print(f"\n✓ [{site.label}] Search crawl complete: {len(shards)} shards, {total} URLs queued.")
+    return total
+
+
+# --- DETAIL SCRAPING ---
+
+def _record_failure(site, sink, url, reason, error=None):
+    """Puts a failed listing on the retry queue and says whether it will be retried."""
+    attempts = sink.add_failure(url, reason=reason, error=error)
+    metrics.count('listings_failed', site=site.name, reason=reason)
+    if attempts >= config.RETRY_MAX_ATTEMPTS:
+        log(f"  ✗ Giving up on {url} after {attempts} attempts ({reason})", WARNING)
+    else:
+        log(f"  → Queued for retry ({reason}, attempt {attempts}/{config.RETRY_MAX_ATTEMPTS})")
+
+
+def _detail_worker(worker_id, site, state, sink, scheduler, session, cache, drivers,
+                   batch_size_min, batch_size_max, producer_done=None, retries_only=False):
+    """
+    One worker: claims batches from the crawl state until the frontier is
+    empty and, when a search crawl is feeding it, `producer_done` is set.
+    Failures whose backoff elapses in the meantime are picked up too; with
+    `retries_only`, nothing but the retry queue is claimed.
+    Pages are fetched over HTTP when possible; pages that need a browser get
+    one from `drivers`, which keeps it across batches until it is worn out.
+    """
+    worker_label = f"{site.label} #{worker_id}"
+    batch_num = 0
+
+    while True:
+        batch_num += 1
+        current_batch_size = random.randint(batch_size_min, batch_size_max)
+        batch_urls = state.claim(worker_id, current_batch_size, retries_only=retries_only)
+        if not batch_urls:
+            if producer_done is None or producer_done.is_set():
+                if state.requeue_due_failures():
+                    batch_num -= 1
+                    continue
+                break
+            # The search crawl is still producing URLs: wait for the next page
+            batch_num -= 1
+            producer_done.wait(config.FRONTIER_POLL_SECONDS)
+            continue
+
+        log(f"\n{'='*60}\n[Worker {worker_label}] Processing Batch {batch_num} ({len(batch_urls)} URLs)\n{'='*60}")
+
+        fetcher = PageFetcher(
+            scheduler,
+            session=session,
+            after_load=lambda driver: prepare_detail_page(driver, site),
+            cache=cache,
+            drivers=drivers,
+        )
+
+        try:
+            for idx, url in enumerate(batch_urls, 1):
+                log(f"\n[Worker {worker_label}] [{idx}/{len(batch_urls)}] Scraping: {url}")
+                result = None
+                try:
+                    # Frontier URLs saved by older runs may lack the language path
+                    result = fetcher.fetch(site.canonical_url(url), site.detail_ready_selectors,
+                                           site.unavailable_markers)
+                    with metrics.stage('extraction', site=site.name, page='detail'):
+                        scraped_data = site.parse_detail(result.html)
+                    scraped_data['url'] = url
+
+                    if scraped_data['price']:
+                        sink.add_record(url, scraped_data)
+                        log(f"  ✓ Successfully extracted listing data (via {result.via})")
+                        metrics.count('listings_saved', site=site.name, via=result.via)
+                    elif is_unavailable(result, site.unavailable_markers):
+                        # The listing is gone: save its empty row so it is never retried
+                        sink.add_record(url, scraped_data)
+                        log("  ⚠ Listing appears to be unavailable or deleted", WARNING)
+                        metrics.count('listings_failed', site=site.name, reason='unavailable')
+                        sink.add_failure(url, retry=False)
+                    else:
+                        # Captcha or a half-loaded page: worth another try later
+                        reason = 'captcha' if is_bot_wall(result.html) else 'no_price'
+                        log(f"  ⚠ No price found ({reason})", WARNING)
+                        _record_failure(site, sink, url, reason)
+
+                except Exception as e:
+                    log(f"  ✗ UNEXPECTED ERROR scraping listing {url}: {e}", WARNING)
+                    if result is not None:
+                        scheduler.report_failure(url)
+                    if fetcher.driver is not None:
+                        os.makedirs(config.ERROR_DIR, exist_ok=True)
+                        fetcher.driver.save_screenshot(
+                            config.ERROR_DIR / f'error_{site.name}_listing_w{worker_id}_{batch_num}_{idx}.png'
+                        )
+                    _record_failure(site, sink, url, failure_reason(e), error=str(e))
+                    continue
+        finally:
+            fetcher.close()
+            sink.flush()
+
+
+def scrape_details(site, listing_urls: list, batch_size_min: int, batch_size_max: int,
+                   workers: int = None, scheduler: RequestScheduler = None,
+                   http_first: bool = config.HTTP_FIRST, state: CrawlState = None,
+                   producer_done: threading.Event = None, retries_only: bool = False,
+                   cache: HtmlCache = None):
+    """
+    Scrapes the detail pages of `site` in batches.
+
+    `listing_urls` are added to the crawl state frontier (already scraped
+    ones are ignored), failures whose retry backoff has elapsed are put back
+    on it, then `workers` independent workers drain the frontier (only the
+    retry queue with `retries_only`).
+    All of them go through the same per-domain `scheduler` (built from
+    config.py if omitted) and share one pooled HTTP session when `http_first`
+    is on. If a search crawl is still adding URLs to the state, pass its
+    `producer_done` event: workers then keep waiting for new URLs until it is set.
+    Pages go to `cache` (opened here if omitted).
+    """
+    if workers is None:
+        workers = config.SITE_DETAIL_WORKERS.get(site.name, config.DETAIL_WORKERS)
+    scheduler = scheduler or RequestScheduler.from_config()
+    state = state or open_crawl_state(site)
+
+    added = state.add_urls(site.canonical_url(url) for url in listing_urls or [])
+    retries = state.requeue_due_failures()
+    counts = state.counts()
+    print(f"✓ [{site.label}] {counts['done']} URLs already scraped. They will be skipped.")
+    if retries_only:
+        pending = retries
+        print(f"[{site.label}] Failed listings due for a retry: {retries}")
+    else:
+        pending = counts['frontier']
+        print(f"[{site.label}] Total new listings to scrape: {pending} ({added} just added, {retries} retries)")
+
+    # Check for Chrome
+    chrome_path = get_chrome_path()
+    if not chrome_path and not http_first:
+        print("ERROR: Could not find Chrome or Chromium browser!")
+        return
+
+    if producer_done is None:
+        workers = max(1, min(workers, pending))
+    print(f"[{site.label}] Running {workers} worker(s) at {scheduler.requests_per_minute} requests/min per domain")
+
+    parquet = ParquetSink(config.PARQUET_DIR, site.city) if config.PARQUET_OUTPUT_ENABLED else None
+    sink = ResultSink(site.details_file, state, site.fieldnames(), parquet=parquet)
+    session = make_session(random.choice(USER_AGENTS)) if http_first else None
+    drivers = open_driver_manager(site)
+    owned_cache = cache is None
+    if owned_cache:
+        cache = open_html_cache()
+    try:
+        run_worker_pool(_detail_worker, workers, site, state, sink, scheduler, session, cache, drivers,
+                        batch_size_min, batch_size_max, producer_done, retries_only)
+    finally:
+        drivers.close()
+        if owned_cache and cache is not None:
+            cache.close()
+
+    # Summary
+    print(f"\n{'='*60}\n✓ [{site.label}] All scraping complete.\n{'='*60}")
+    if sink.failed_urls:
+        print(f"⚠ {len(sink.failed_urls)} URLs failed or were unavailable")
+        print("Unavailable listings are saved in the CSV with null values; other failures wait in the retry queue")
+    print_retry_queue(site, state)
+
+
+def print_retry_queue(site, state: CrawlState):
+    """One-line summary of the retry queue of `site`."""
+    queue = state.retry_summary()
+    if not (queue['due'] or queue['waiting'] or queue['exhausted']):
+        return
+    reasons = ", ".join(f"{reason}: {n}" for reason, n in queue['by_reason'].items())
+    next_due = f", next in {queue['next_due_in'] // 60} min" if queue['next_due_in'] is not None else ""
+    print(f"[{site.label}] Retry queue: {queue['due']} due, {queue['waiting']} waiting{next_due}, "
+          f"{queue['exhausted']} given up ({reasons})")
+
+
+# --- PIPELINE ---
+
+def _search_producer(site, shards, max_pages, scheduler, state, producer_done, incremental, cache):
+    """Runs the search crawl, then tells the detail workers no more URLs are coming."""
+    try:
+        crawl_search_shards(site, shards, max_pages, scheduler, state, incremental, cache=cache)
+    finally:
+        producer_done.set()
+
+
+def run_pipeline(site, shards: list, max_pages: int, batch_size_min: int, batch_size_max: int,
+                 workers: int = None, state: CrawlState = None,
+                 scheduler: RequestScheduler = None, incremental: bool = False, cache: HtmlCache = None):
+    """
+    Streams the search crawl into the detail scrapers: a producer thread walks
+    the search shards and queues their URLs page by page, while the detail
+    workers consume them as they arrive. Both stages share one scheduler
+    and one HTML cache.
+    With `incremental`, only new, changed or stale listings are re-scraped.
+    """
+    scheduler = scheduler or RequestScheduler.from_config()
+    state = state or open_crawl_state(site)
+    producer_done = threading.Event()
+    owned_cache = cache is None
+    if owned_cache:
+        cache = open_html_cache()
+
+    producer = threading.Thread(
+        target=_search_producer, args=(site, shards, max_pages, scheduler, state, producer_done, incremental, cache),
+        name=f"search-producer-{site.name}", daemon=True,
+    )
+    producer.start()
+    try:
+        scrape_details(site, [], batch_size_min, batch_size_max, workers=workers, scheduler=scheduler,
+                       state=state, producer_done=producer_done, cache=cache)
+        producer.join()
+    finally:
+        if owned_cache and cache is not None:
+            cache.close()
+
+
+def retry_failed(site, scheduler: RequestScheduler = None):
+    """
+    Drains only the retry queue of `site`: failed listings whose backoff has
+    elapsed are scraped again, without touching the search pages or the
+    rest of the frontier.
+    """
+    state = open_crawl_state(site)
+    cache = open_html_cache()
+    try:
+        print(f"\n--- [{site.label}] Retrying failed listings ---")
+        print_retry_queue(site, state)
+        scrape_details(site, [], batch_size_min=5, batch_size_max=9, scheduler=scheduler, state=state,
+                       retries_only=True, cache=cache)
+    finally:
+        if cache is not None:
+            cache.close()
+        state.close()
+
+
+def run_site(site, scheduler: RequestScheduler, seed: str = None, incremental: bool = False,
+             min_listings: int = 200):
+    """
+    Full crawl of one site and city: search + details if fewer than
+    `min_listings` URLs are known (or in incremental mode), otherwise just
+    the pending details. One HTML cache serves the whole run, so its size
+    limit holds across the search shards and the detail workers.
+    """
+    state = open_crawl_state(site)
+    cache = open_html_cache()
+
+    # Check if we already have enough URLs
+    known_urls = state.known_urls()
+    run_url_scraper = known_urls < min_listings or incremental
+    if incremental:
+        print(f"[{site.label}] Incremental refresh of {known_urls} known URLs (TTL {config.RECRAWL_TTL_DAYS} days).")
+    elif run_url_scraper:
+        print(f"! [{site.label}] Only {known_urls}/{min_listings} URLs known. Will scrape for more.")
+    else:
+        print(f"✓ [{site.label}] Found {known_urls} URLs, which meets the minimum of {min_listings}.")
+
+    try:
+        # Run URL scraper if needed, streaming its URLs into the detail scrapers
+        if run_url_scraper:
+            print(f"\n--- [{site.label}] Starting URL + Detail Scraping ---")
+            shards = [SearchShard.from_url(seed)] if seed else site.plan()
+            run_pipeline(site, shards, max_pages=config.SEARCH_MAX_PAGES, batch_size_min=5, batch_size_max=9,
+                         state=state, scheduler=scheduler, incremental=incremental, cache=cache)
+        elif state.has_pending() or state.retry_summary()['due']:
+            print(f"\n--- [{site.label}] Starting Detail Scraping ---")
+            scrape_details(site, [], batch_size_min=5, batch_size_max=9, scheduler=scheduler, state=state,
+                           cache=cache)
+        else:
+            print(f"! [{site.label}] No pending URLs in the crawl state to scrape for details.")
+    finally:
+        if cache is not None:
+            cache.close()
+        state.close()
+
+
+def run_sites(sites: list, seed: str = None, incremental: bool = False, retry_only: bool = False):
+    """
+    Crawls several sites at the same time, one thread per site. They share
+    one scheduler, whose per-domain buckets give each site its own budget
+    (config.DOMAIN_RATE_LIMITS), so a slow or throttled site never holds the
+    others back. With `retry_only`, each site only drains its retry queue.
+    """
+    scheduler = RequestScheduler.from_config()
+
+    def run(site):
+        try:
+            if retry_only:
+                retry_failed(site, scheduler)
+            else:
+                run_site(site, scheduler, seed=seed, incremental=incremental)
+        except Exception as e:
+            print(f"✗ [{site.label}] An unexpected error occurred: {e}")
+            import traceback
+            traceback.print_exc()
+
+    if len(sites) == 1:
+        run(sites[0])
+        return
+
+    threads = [threading.Thread(target=run, args=(site,), name=f"site-{site.label}") for site in sites]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+# --- MAIN ORCHESTRATION BLOCK ---
+
+def main(default_cities=(config.CITY,), description="Real estate scraper"):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--cities', nargs='+', default=list(default_cities), choices=sorted(config.SEARCH_CITIES),
+                        help="Cities to crawl at the same time; each uses the site set in config.SEARCH_CITIES")
+    parser.add_argument('--reextract', action='store_true',
+                        help="Rebuild the details CSV from the raw HTML cache instead of crawling")
+    parser.add_argument('--processes', type=int, default=None,
+                        help="Parser processes used by --reextract (default: one per CPU)")
+    parser.add_argument('--seed', default=None,
+                        help="Crawl a single search URL instead of planning the whole city (one city only)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Re-crawl the search pages and re-scrape only new, changed or stale listings")
+    parser.add_argument('--retry-failed', action='store_true',
+                        help="Only retry failed listings whose backoff has elapsed (see config.py 'Retry Queue')")
+    parser.add_argument('--verbosity', type=int, choices=[0, 1, 2], default=config.LOG_VERBOSITY,
+                        help="0: warnings only, 1: progress, 2: per-field parser details")
+    parser.add_argument('--metrics-format', choices=['json', 'prometheus'], default=config.METRICS_FORMAT,
+                        help="Format of the end-of-run metrics summary")
+    args = parser.parse_args()
+    config.LOG_VERBOSITY = args.verbosity
+
+    if args.seed and len(args.cities) > 1:
+        parser.error("--seed can only be used with a single city")
+    sites = [adapter_for_city(city) for city in args.cities]
+
+    if args.reextract:
+        for site in sites:
+            rebuild_details_from_cache(site, processes=args.processes)
+        return
+
+    try:
+        run_sites(sites, seed=args.seed, incremental=args.incremental, retry_only=args.retry_failed)
+    finally:
+        metrics.write_summary(fmt=args.metrics_format)
+        metrics.close()
+
+
+if __name__ == "__main__":
+    main(default_cities=sorted(config.SEARCH_CITIES), description="Multi-site real estate scraper")
@@ -0,0 +1,198 @@
+"""
+HTTP-first page fetching with a browser fallback.
+
+Most pages are plain server-rendered HTML, so they are fetched through a pooled
+`requests.Session` (keep-alive, gzip, connection reuse). The Selenium path is
+only used when the HTTP response is not usable: an error status, a bot wall,
+or a JavaScript shell that lacks the selectors the parser needs.
+"""
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import config
+from browser import record_page_weight
+from instrumentation import WARNING, log, metrics
+from parsers import has_selectors
+
+
+class FetchResult:
+    """The HTML of one page and how it was obtained ('http' or 'browser')."""
+
+    def __init__(self, url, html, via, status=None, elapsed=0.0):
+        self.url = url
+        self.html = html
+        self.via = via
+        self.status = status
+        self.elapsed = elapsed
+
+
+def make_session(user_agent: str, pool_size: int = config.HTTP_POOL_SIZE) -> requests.Session:
+    """Builds a keep-alive session whose connection pool is shared by all workers."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({
+        "User-Agent": user_agent,
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        "Accept-Language": "en-US,en;q=0.9,es;q=0.8",
+        "Accept-Encoding": "gzip, deflate",
+    })
+    return session
+
+
+class PageFetcher:
+    """
+    Fetches pages for one worker, trying HTTP first and the browser second.
+
+    - `scheduler`: the shared RequestScheduler; both paths go through it.
+    - `session`: a shared pooled session (see `make_session`), or None to
+      disable the HTTP path.
+    - `driver_factory`: callable returning a ready WebDriver. The browser is
+      only launched the first time a page needs it.
+    - `drivers`: optional DriverManager (see browser.py) used instead of
+      `driver_factory`; the driver is then returned to it on `close()` and
+      recycled on its health thresholds.
+    - `after_load`: optional callable(driver) run after each browser
+      navigation (cookie banner, scrolling...).
+    - `cache`: optional HtmlCache; every usable page body is stored in it.
+    """
+
+    def __init__(self, scheduler, session=None, driver_factory=None, after_load=None,
+                 timeout: float = config.HTTP_TIMEOUT, cache=None, drivers=None):
+        self.scheduler = scheduler
+        self.session = session
+        self.driver_factory = driver_factory
+        self.drivers = drivers
+        self.after_load = after_load
+        self.timeout = timeout
+        self.cache = cache
+        self.driver = None
+        self.http_hits = 0
+        self.browser_hits = 0
+
+    def fetch(self, url: str, required_selectors=(), unavailable_markers=()) -> FetchResult:
+        """
+        Returns the page HTML, falling back to the browser if HTTP is unusable.
+        An HTTP page showing one of `unavailable_markers` is returned as is,
+        so removed listings never start a browser.
+        """
+        result = None
+        if self.session is not None:
+            result = self._fetch_http(url)
+            if result is not None and is_usable(result, required_selectors, unavailable_markers):
+                self.http_hits += 1
+            else:
+                log("  → HTTP response not usable, falling back to the browser")
+                result = None
+
+        if result is None:
+            if self.driver_factory is None and self.drivers is None:
+                raise RuntimeError(f"No usable HTTP response for {url} and no browser configured")
+            result = self._fetch_browser(url)
+
+        if self.cache is not None:
+            with metrics.stage('write', kind='html_cache'):
+                self.cache.store(url, result.html)
+        return result
+
+    def _fetch_http(self, url: str):
+        self.scheduler.acquire(url)
+        start = time.monotonic()
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+        except requests.RequestException as e:
+            log(f"  ! HTTP fetch failed: {e}", WARNING)
+            elapsed = time.monotonic() - start
+            metrics.observe('navigation', elapsed, via='http', ok=False)
+            self.scheduler.record(url, elapsed, ok=False)
+            return None
+        elapsed = time.monotonic() - start
+        metrics.observe('navigation', elapsed, via='http', ok=response.status_code < 400)
+        metrics.count('page_bytes', len(response.content), via='http')
+        # 403/429 are bot walls or rate limiting: slow the domain down
+        self.scheduler.record(url, elapsed, ok=response.status_code < 400)
+        return FetchResult(url, response.text, "http", response.status_code, elapsed)
+
+    def _fetch_browser(self, url: str) -> FetchResult:
+        if self.driver is None:
+            if self.drivers is not None:
+                self.driver = self.drivers.checkout()
+            else:
+                with metrics.stage('driver_startup'):
+                    self.driver = self.driver_factory()
+        start = time.monotonic()
+        navigated = False
+        try:
+            # The scheduler records the navigation's outcome itself
+            with self.scheduler.request(url), metrics.stage('navigation', via='browser'):
+                self.driver.get(url)
+            navigated = True
+            record_page_weight(self.driver)
+            if self.after_load is not None:
+                self.after_load(self.driver)
+            html = self.driver.page_source
+        except Exception:
+            if navigated:
+                self.scheduler.report_failure(url)
+            self._page_served(ok=False)
+            raise
+        self.browser_hits += 1
+        self._page_served(ok=True)
+        return FetchResult(url, html, "browser", None, time.monotonic() - start)
+
+    def _page_served(self, ok: bool):
+        """Lets the driver manager retire the browser once it crosses a health threshold (the driver becomes None)."""
+        if self.drivers is not None:
+            self.driver = self.drivers.after_page(self.driver, ok=ok)
+
+    def close(self):
+        """Quits the browser if one was launched, or hands it back to the driver manager."""
+        if self.driver is not None:
+            if self.drivers is not None:
+                self.drivers.release(self.driver)
+            else:
+                self.driver.quit()
+            self.driver = None
+
+
+def is_bot_wall(html: str) -> bool:
+    """True if `html` is a captcha / bot challenge page instead of the real one."""
+    lowered = (html or "").lower()
+    return any(marker in lowered for marker in config.BOT_WALL_MARKERS)
+
+
+def is_unavailable(result: FetchResult, unavailable_markers=()) -> bool:
+    """True if the page says the listing is gone (or the server answered 404 / 410)."""
+    lowered = (result.html or "").lower()
+    return result.status in (404, 410) or any(marker in lowered for marker in unavailable_markers)
+
+
+def failure_reason(error: Exception) -> str:
+    """Short retry-queue reason for an exception raised while fetching or parsing a page."""
+    name = type(error).__name__.lower()
+    if isinstance(error, TimeoutError) or 'timeout' in name:
+        return 'timeout'
+    if isinstance(error, requests.RequestException):
+        return 'network'
+    if 'webdriver' in name or 'session' in name:
+        return 'browser'
+    return 'error'
+
+
+def is_usable(result: FetchResult, required_selectors=(), unavailable_markers=()) -> bool:
+    """
+    True if an HTTP response can be parsed without a browser: the real page,
+    or a page saying the listing is no longer available.
+    """
+    html = result.html or ""
+    lowered = html.lower()
+    if is_bot_wall(html):
+        return False
+    if result.status in (200, 404, 410) and any(marker in lowered for marker in unavailable_markers):
+        return True
+    if result.status is not None and result.status != 200:
+        return False
+    return has_selectors(html, required_selectors)
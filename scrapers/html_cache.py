@@ -0,0 +1,180 @@
+"""
+Compressed raw HTML cache.
+
+Every fetched page body is stored on disk, keyed by URL hash + fetch timestamp,
+so that new fields or fixed selectors can be backfilled by re-running the
+parsers over the cache instead of re-scraping every listing through the browser.
+
+Pages are compressed with zstd when the optional `zstandard` package is
+installed, and with gzip otherwise. The cache is bounded by size (least
+recently used pages are evicted first) and optionally by age.
+"""
+import gzip
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    path        TEXT PRIMARY KEY,
+    url_hash    TEXT NOT NULL,
+    url         TEXT NOT NULL,
+    fetched_at  REAL NOT NULL,
+    size        INTEGER NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_pages_url ON pages(url_hash, fetched_at);
+CREATE INDEX IF NOT EXISTS idx_pages_access ON pages(last_access);
+"""
+
+
+def url_hash(url: str) -> str:
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+
+def _compress(html: str):
+    data = html.encode('utf-8')
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).compress(data), '.html.zst'
+    return gzip.compress(data, compresslevel=6), '.html.gz'
+
+
+def read_page(path) -> str:
+    """Reads and decompresses one cached page."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if str(path).endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError(f"{path} is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data).decode('utf-8')
+    return gzip.decompress(data).decode('utf-8')
+
+
+class HtmlCache:
+    """
+    Size-bounded, thread-safe cache of raw page bodies.
+
+    - `max_bytes`: compressed size limit; least recently used pages go first.
+    - `max_age_days`: optional age limit applied on every eviction pass.
+    """
+
+    def __init__(self, cache_dir, max_bytes: int = None, max_age_days: float = None):
+        self.cache_dir = str(cache_dir)
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.cache_dir, 'index.sqlite'), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        self.total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        if self.max_age_days:
+            self.evict()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def store(self, url: str, html: str, fetched_at: float = None) -> str:
+        """Compresses and stores a page body. Returns the file path."""
+        fetched_at = fetched_at or time.time()
+        key = url_hash(url)
+        data, extension = _compress(html)
+        directory = os.path.join(self.cache_dir, key[:2])
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{key}-{int(fetched_at * 1000)}{extension}")
+        with open(path, 'wb') as f:
+            f.write(data)
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (path, url_hash, url, fetched_at, size, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (path, key, url, fetched_at, len(data), fetched_at),
+            )
+            self.total_bytes += len(data)
+        if self.max_bytes and self.total_bytes > self.max_bytes:
+            self.evict()
+        return path
+
+    def latest(self, url: str):
+        """Returns the most recent cached body of `url`, or None."""
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT path FROM pages WHERE url_hash = ? ORDER BY fetched_at DESC LIMIT 1", (url_hash(url),)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE pages SET last_access = ? WHERE path = ?", (time.time(), row[0]))
+        return read_page(row[0])
+
+    def latest_entries(self):
+        """Yields (url, fetched_at, path) for the most recent capture of every URL."""
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT url, MAX(fetched_at), path FROM pages GROUP BY url_hash ORDER BY url"""
+            ).fetchall()
+        yield from rows
+
+    def evict(self):
+        """Drops pages past the age limit, then least recently used ones until under `max_bytes`."""
+        with self._lock, self._conn:
+            victims = []
+            if self.max_age_days:
+                cutoff = time.time() - self.max_age_days * 86400
+                victims += self._conn.execute("SELECT path, size FROM pages WHERE fetched_at < ?", (cutoff,)).fetchall()
+            excess = self.total_bytes - sum(size for _, size in victims) - (self.max_bytes or self.total_bytes)
+            if excess > 0:
+                expired = {path for path, _ in victims}
+                for path, size in self._conn.execute("SELECT path, size FROM pages ORDER BY last_access"):
+                    if excess <= 0:
+                        break
+                    if path not in expired:
+                        victims.append((path, size))
+                        excess -= size
+
+            for path, size in victims:
+                self._conn.execute("DELETE FROM pages WHERE path = ?", (path,))
+                self.total_bytes -= size
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        return len(victims)
+
+
+# --- OFFLINE RE-EXTRACTION ---
+
+def _parse_cached(job):
+    parse_fn, url, fetched_at, path = job
+    record = parse_fn(read_page(path))
+    record['url'] = url
+    record['fetched_at'] = fetched_at
+    return record
+
+
+def reextract(cache: HtmlCache, parse_fn, url_filter=None, processes: int = None, chunksize: int = 32) -> list:
+    """
+    Rebuilds detail records offline by running `parse_fn(html)` over the latest
+    capture of every cached URL accepted by `url_filter(url)`, spread over
+    `processes` worker processes. `parse_fn` must be a module-level function
+    so it can be sent to the workers.
+    """
+    jobs = [
+        (parse_fn, url, fetched_at, path) for url, fetched_at, path in cache.latest_entries()
+        if url_filter is None or url_filter(url)
+    ]
+    print(f"Re-extracting {len(jobs)} cached pages...")
+    if processes == 1:
+        return [_parse_cached(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return list(pool.map(_parse_cached, jobs, chunksize=chunksize))
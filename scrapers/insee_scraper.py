@@ -3,12 +3,271 @@ INSEE Data Scraper
 
 This module provides functionality to scrape demographic and socioeconomic data
 from the French National Institute of Statistics and Economic Studies (INSEE).
+
+It is a manifest-driven bulk downloader for the INSEE and data.paris.fr files
+used by the Paris notebooks. Each manifest entry (see insee_manifest.json)
+gives a dataset URL, where it goes under data/raw/paris and, optionally, its
+expected SHA-256 and whether it is a zip archive to extract:
+
+    {"name": "population_2022", "url": "https://.../base-ic-evol-struct-pop-2022_csv.zip",
+     "target": "POPULATION/base-ic-evol-struct-pop-2022_csv", "extract": true, "sha256": null}
+
+- Files are fetched in parallel by a bounded thread pool sharing one pooled
+  HTTP session, and streamed to disk in chunks.
+- An interrupted download is resumed from its `.part` file with an HTTP
+  Range request (`If-Range` makes the server send the whole file again if it
+  changed in the meantime).
+- A file is skipped without any request when its checksum matches the
+  manifest, or with a conditional request (ETag / Last-Modified, kept in
+  `.downloads.json`) when the server says it is unchanged.
+- Archives are extracted member by member straight to disk, never held in memory.
+
+    python insee_scraper.py
+    python insee_scraper.py --only population_2022 --workers 2
 """
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import config
+from fetcher import make_session
+from instrumentation import metrics
+
+
+# --- MANIFEST ---
+
+class ManifestEntry:
+    """One dataset to download: `target` is a file, or a directory when `extract` is on."""
+
+    def __init__(self, name: str, url: str, target: str, sha256: str = None, extract: bool = False):
+        self.name = name
+        self.url = url
+        self.target = target
+        self.sha256 = sha256.lower() if sha256 else None
+        self.extract = extract
+
+    @classmethod
+    def from_dict(cls, entry: dict):
+        return cls(entry['name'], entry['url'], entry['target'], entry.get('sha256'), entry.get('extract', False))
+
+    def archive_name(self) -> str:
+        """File name of the downloaded archive, kept under `_archives/` when `extract` is on."""
+        return self.url.rstrip('/').rsplit('/', 1)[-1].split('?', 1)[0] or f"{self.name}.zip"
+
+    def __repr__(self):
+        return f"ManifestEntry({self.name!r})"
+
+
+def load_manifest(path=config.DOWNLOAD_MANIFEST) -> list:
+    with open(path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    entries = []
+    for entry in manifest['datasets']:
+        if not entry.get('url'):
+            print(f"! {entry['name']}: no URL in the manifest yet, skipped (see {entry.get('source', 'the manifest')})")
+            continue
+        entries.append(ManifestEntry.from_dict(entry))
+    return entries
+
+
+def sha256_of(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(config.DOWNLOAD_CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DownloadState:
+    """ETag / Last-Modified / checksum of every downloaded URL, kept as JSON next to the data."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._entries = {}
+        if self.path.exists():
+            with open(self.path, encoding='utf-8') as f:
+                self._entries = json.load(f)
+
+    def get(self, url: str) -> dict:
+        with self._lock:
+            return dict(self._entries.get(url, {}))
+
+    def update(self, url: str, **fields):
+        with self._lock:
+            self._entries.setdefault(url, {}).update(fields)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+
+# --- DOWNLOADS ---
+
+def _fetch(session, url: str, dest: Path, known: dict, state: DownloadState, timeout: float) -> str:
+    """
+    Downloads `url` to `dest` through `dest.part`, resuming it if present.
+    Returns 'unchanged' (304), 'resumed' or 'downloaded'.
+    """
+    part = dest.with_name(dest.name + '.part')
+    headers = {'Accept-Encoding': 'identity'}
+    if dest.exists() and known:
+        if known.get('etag'):
+            headers['If-None-Match'] = known['etag']
+        if known.get('last_modified'):
+            headers['If-Modified-Since'] = known['last_modified']
+    offset = part.stat().st_size if part.exists() else 0
+    if offset:
+        headers['Range'] = f"bytes={offset}-"
+        if known.get('part_etag'):
+            headers['If-Range'] = known['part_etag']
+
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        if response.status_code == 304:
+            return 'unchanged'
+        if response.status_code == 416:
+            # The part file already holds the whole body
+            os.replace(part, dest)
+            return 'resumed'
+        response.raise_for_status()
+        resumed = response.status_code == 206
+        if not resumed:
+            # Remember which version the part file holds, for `If-Range` on resume
+            known['part_etag'] = response.headers.get('ETag')
+            state.update(url, part_etag=known['part_etag'])
+        received = 0
+        try:
+            with open(part, 'ab' if resumed else 'wb') as f:
+                for chunk in response.iter_content(config.DOWNLOAD_CHUNK_BYTES):
+                    f.write(chunk)
+                    received += len(chunk)
+        finally:
+            # One event per file, including the part of an interrupted download
+            metrics.count('download_bytes', received)
+        etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+    os.replace(part, dest)
+    known.update(etag=etag, last_modified=last_modified)
+    return 'resumed' if resumed else 'downloaded'
+
+
+def extract_archive(archive: Path, target_dir: Path) -> int:
+    """Extracts every member of a zip archive to `target_dir`, streaming each one to disk."""
+    target_dir.mkdir(parents=True, exist_ok=True)
+    root = target_dir.resolve()
+    count = 0
+    with zipfile.ZipFile(archive) as zf:
+        for member in zf.infolist():
+            path = (target_dir / member.filename).resolve()
+            if root not in path.parents and path != root:
+                raise ValueError(f"Unsafe path in {archive.name}: {member.filename}")
+            if member.is_dir():
+                path.mkdir(parents=True, exist_ok=True)
+                continue
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with zf.open(member) as src, open(path, 'wb') as dst:
+                shutil.copyfileobj(src, dst, config.DOWNLOAD_CHUNK_BYTES)
+            count += 1
+    return count
+
+
+def download_entry(entry: ManifestEntry, session, root: Path, state: DownloadState, force: bool = False,
+                   timeout: float = config.DOWNLOAD_TIMEOUT) -> str:
+    """
+    Brings one manifest entry up to date under `root`. Returns what happened:
+    'skipped' (checksum matches), 'unchanged' (server says 304), 'downloaded'
+    or 'resumed'.
+    """
+    target = root / entry.target
+    dest = root / '_archives' / entry.archive_name() if entry.extract else target
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    known = {} if force else state.get(entry.url)
+    outputs_present = target.exists()
+
+    if not force and outputs_present and dest.exists() and entry.sha256 and known.get('sha256') == entry.sha256:
+        return 'skipped'
+    if not force and outputs_present and dest.exists() and entry.sha256 and sha256_of(dest) == entry.sha256:
+        state.update(entry.url, sha256=entry.sha256)
+        return 'skipped'
+
+    part = dest.with_name(dest.name + '.part')
+    for attempt in (1, 2):
+        with metrics.stage('download', dataset=entry.name):
+            status = _fetch(session, entry.url, dest, known, state, timeout)
+        if status == 'unchanged' and outputs_present:
+            return status
+        digest = sha256_of(dest)
+        if entry.sha256 is None or digest == entry.sha256:
+            break
+        # A resumed file that does not match is restarted from scratch once
+        print(f"  ! Checksum mismatch for {entry.name} (attempt {attempt})")
+        dest.unlink(missing_ok=True)
+        part.unlink(missing_ok=True)
+        known = {}
+    else:
+        raise ValueError(f"Checksum mismatch for {entry.name}: expected {entry.sha256}, got {digest}")
+
+    if entry.extract:
+        with metrics.stage('extract', dataset=entry.name):
+            members = extract_archive(dest, target)
+        print(f"  → Extracted {members} files to {target}")
+    state.update(entry.url, etag=known.get('etag'), last_modified=known.get('last_modified'), sha256=digest,
+                 part_etag=None, size=dest.stat().st_size, fetched_at=round(time.time()))
+    return status
+
+
+def download_all(entries: list, root=config.PARIS_DATA_DIR, workers: int = config.DOWNLOAD_WORKERS,
+                 force: bool = False, session=None) -> dict:
+    """
+    Downloads every manifest entry with `workers` threads sharing one pooled
+    session. Returns {name: status}; failed entries get 'failed: <error>'.
+    """
+    root = Path(root)
+    state = DownloadState(root / '.downloads.json')
+    session = session or make_session("DALAS-gentrification-analysis/1.0 (open data downloader)", pool_size=workers)
+    results = {}
+
+    def run(entry):
+        return download_entry(entry, session, root, state, force=force)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="download") as pool:
+        futures = {pool.submit(run, entry): entry for entry in entries}
+        for future in as_completed(futures):
+            entry = futures[future]
+            try:
+                results[entry.name] = future.result()
+                print(f"✓ {entry.name}: {results[entry.name]}")
+            except Exception as e:
+                results[entry.name] = f"failed: {e}"
+                print(f"✗ {entry.name}: {e}")
+    return results
 
 
 def main():
     """Main function to run the INSEE scraper."""
-    pass
+    parser = argparse.ArgumentParser(description="Bulk download of the INSEE / data.paris.fr datasets")
+    parser.add_argument('--manifest', default=str(config.DOWNLOAD_MANIFEST))
+    parser.add_argument('--root', default=str(config.PARIS_DATA_DIR), help="Directory the targets are relative to")
+    parser.add_argument('--workers', type=int, default=config.DOWNLOAD_WORKERS)
+    parser.add_argument('--only', nargs='+', default=None, help="Names of the manifest entries to download")
+    parser.add_argument('--force', action='store_true', help="Download everything again")
+    args = parser.parse_args()
+
+    entries = load_manifest(args.manifest)
+    if args.only:
+        entries = [entry for entry in entries if entry.name in args.only]
+    results = download_all(entries, args.root, args.workers, force=args.force)
+    failed = [name for name, status in results.items() if status.startswith('failed')]
+    print(f"\n✓ {len(results) - len(failed)}/{len(results)} datasets up to date in {args.root}")
+    if failed:
+        print(f"⚠ Failed: {', '.join(failed)}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,216 @@
+"""
+Run-loop instrumentation: per-stage timings, counters and log verbosity.
+
+Every stage of the scrapers is timed through the process-wide `metrics`:
+
+    with metrics.stage('navigation', via='http'):
+        response = session.get(url)
+    metrics.count('listings_saved', site='idealista')
+
+Stages: driver_startup, navigation, ready_wait, scroll, sleep (rate_limit),
+extraction and write (csv / parquet / html_cache). Page
+loads also count the bytes they transferred (`page_bytes`) and recycled
+browsers count why (`driver_recycled`). Each
+observation is appended as one JSON line to an events file when
+config.METRICS_EVENTS_ENABLED is on, and `write_summary()` writes the
+aggregates (time per stage, listings/hour, failure rate by reason, share of
+wall time spent sleeping) as JSON or as a Prometheus text file.
+
+`log()` / `debug()` replace bare prints where output volume matters:
+config.LOG_VERBOSITY 0 keeps warnings only, 1 adds progress, 2 adds the
+per-field parser details.
+"""
+import datetime
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import config
+
+
+# --- LOGGING ---
+
+WARNING, INFO, DEBUG = 0, 1, 2
+
+
+def log(message: str, level: int = INFO):
+    """Prints `message` if config.LOG_VERBOSITY allows `level`."""
+    if level <= config.LOG_VERBOSITY:
+        print(message)
+
+
+def debug(message: str):
+    log(message, DEBUG)
+
+
+# --- METRICS ---
+
+def _key(name: str, labels: dict) -> tuple:
+    return (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+
+
+class Metrics:
+    """
+    Thread-safe stage timer and counter store. The events file is opened
+    lazily under config.METRICS_DIR, so importing this module has no effect
+    on disk.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events = None
+        self.reset()
+
+    def reset(self):
+        """Starts a new measurement window (a new run)."""
+        with self._lock:
+            self.started = time.time()
+            self._stage_seconds = defaultdict(float)
+            self._stage_calls = defaultdict(int)
+            self._counters = defaultdict(int)
+
+    # --- Recording ---
+
+    @contextmanager
+    def stage(self, name: str, **labels):
+        """Times the wrapped block as one observation of stage `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def observe(self, name: str, seconds: float, **labels):
+        """Records `seconds` spent in stage `name`."""
+        key = _key(name, labels)
+        with self._lock:
+            self._stage_seconds[key] += seconds
+            self._stage_calls[key] += 1
+        self._emit({'type': 'stage', 'stage': name, 'seconds': round(seconds, 6), **labels})
+
+    def count(self, name: str, value: int = 1, **labels):
+        """Adds `value` to counter `name`."""
+        with self._lock:
+            self._counters[_key(name, labels)] += value
+        self._emit({'type': 'counter', 'name': name, 'value': value, **labels})
+
+    def _emit(self, event: dict):
+        if not config.METRICS_EVENTS_ENABLED:
+            return
+        event = {'ts': round(time.time(), 3), **event}
+        line = json.dumps(event, default=str)
+        with self._lock:
+            if self._events is None:
+                os.makedirs(config.METRICS_DIR, exist_ok=True)
+                stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+                path = os.path.join(config.METRICS_DIR, f"events-{stamp}-{os.getpid()}.jsonl")
+                self._events = open(path, 'a', encoding='utf-8', buffering=1)
+            self._events.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            if self._events is not None:
+                self._events.close()
+                self._events = None
+
+    # --- Aggregates ---
+
+    def summary(self) -> dict:
+        """Aggregated stage times and counters of the current window."""
+        with self._lock:
+            wall = time.time() - self.started
+            stages = [
+                {'stage': name, **dict(labels), 'seconds': round(seconds, 3), 'calls': self._stage_calls[(name, labels)]}
+                for (name, labels), seconds in sorted(self._stage_seconds.items())
+            ]
+            counters = [
+                {'name': name, **dict(labels), 'value': value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+
+        def total(name, **match):
+            return sum(c['value'] for c in counters
+                       if c['name'] == name and all(c.get(k) == v for k, v in match.items()))
+
+        saved = total('listings_saved')
+        failed_by_reason = defaultdict(int)
+        for c in counters:
+            if c['name'] == 'listings_failed':
+                failed_by_reason[c.get('reason', 'unknown')] += c['value']
+        attempts = saved + sum(failed_by_reason.values())
+        sleep_seconds = sum(s['seconds'] for s in stages if s['stage'] == 'sleep')
+        page_weight = {}
+        for via in ('http', 'browser'):
+            loads = sum(s['calls'] for s in stages if s['stage'] == 'navigation' and s.get('via') == via)
+            if loads:
+                page_weight[via] = round(total('page_bytes', via=via) / loads / 1024, 1)
+
+        return {
+            'started': datetime.datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+            'wall_seconds': round(wall, 3),
+            'listings_saved': saved,
+            'listings_per_hour': round(saved / wall * 3600, 1) if wall > 0 else None,
+            'failure_rate_by_reason': {
+                reason: round(n / attempts, 4) for reason, n in sorted(failed_by_reason.items())
+            } if attempts else {},
+            # Sleeps run in parallel across workers, so this can exceed 1
+            'sleep_share': round(sleep_seconds / wall, 4) if wall > 0 else None,
+            # Mean KB transferred per page load (browser: page + every sub-resource)
+            'page_kb_by_via': page_weight,
+            'stages': stages,
+            'counters': counters,
+        }
+
+    def prometheus_text(self) -> str:
+        """The summary in the Prometheus text exposition format."""
+        summary = self.summary()
+
+        def labels_of(entry, skip):
+            pairs = [f'{k}="{v}"' for k, v in entry.items() if k not in skip]
+            return "{" + ",".join(pairs) + "}" if pairs else ""
+
+        lines = [
+            "# TYPE scraper_stage_seconds_total counter",
+            *(f"scraper_stage_seconds_total{labels_of(s, ('seconds', 'calls'))} {s['seconds']}"
+              for s in summary['stages']),
+            "# TYPE scraper_stage_calls_total counter",
+            *(f"scraper_stage_calls_total{labels_of(s, ('seconds', 'calls'))} {s['calls']}"
+              for s in summary['stages']),
+        ]
+        for counter in summary['counters']:
+            lines.append(f"scraper_{counter['name']}_total{labels_of(counter, ('name', 'value'))} {counter['value']}")
+        lines += [
+            "# TYPE scraper_wall_seconds gauge",
+            f"scraper_wall_seconds {summary['wall_seconds']}",
+            "# TYPE scraper_listings_per_hour gauge",
+            f"scraper_listings_per_hour {summary['listings_per_hour'] or 0}",
+            "# TYPE scraper_sleep_share gauge",
+            f"scraper_sleep_share {summary['sleep_share'] or 0}",
+            "# TYPE scraper_page_kb gauge",
+            *(f'scraper_page_kb{{via="{via}"}} {kb}' for via, kb in summary['page_kb_by_via'].items()),
+            "# TYPE scraper_failure_rate gauge",
+            *(f'scraper_failure_rate{{reason="{reason}"}} {rate}'
+              for reason, rate in summary['failure_rate_by_reason'].items()),
+        ]
+        return "\n".join(lines) + "\n"
+
+    def write_summary(self, path=None, fmt: str = None):
+        """Writes the summary as JSON or Prometheus text (config.METRICS_FORMAT)."""
+        fmt = fmt or config.METRICS_FORMAT
+        if path is None:
+            os.makedirs(config.METRICS_DIR, exist_ok=True)
+            path = os.path.join(config.METRICS_DIR, 'metrics.prom' if fmt == 'prometheus' else 'metrics.json')
+
+        text = self.prometheus_text() if fmt == 'prometheus' else json.dumps(self.summary(), indent=2)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text if text.endswith("\n") else text + "\n")
+        os.replace(tmp_path, path)
+        log(f"✓ Metrics written to {path}")
+        return path
+
+
+metrics = Metrics()
@@ -0,0 +1,240 @@
+"""
+Batch normalization of scraped listing fields.
+
+The parsers keep what the page shows ("350.000 €", "Planta 3ª exterior",
+"Segunda mano/buen estado", "Profesional"...). This stage turns a whole
+details table into typed columns at once, with compiled regexes and pandas
+`.str` operations instead of per-row Python:
+
+    price, surface_m2, rooms, bedrooms, bathrooms, year_built -> Int64
+    has_elevator                                              -> boolean
+    energy_cert_consumption                                   -> 'A'..'G'
+    floor_level      -> floor_number (Int64) + is_exterior (boolean)
+    property_status  -> status ('new', 'renovated', 'good', 'to_renovate', 'second_hand')
+    advertiser_type  -> advertiser_category ('private', 'agency', 'developer')
+
+Vocabularies cover Spanish, English, Italian and French pages; matching is
+case- and accent-insensitive. The raw text columns are kept next to the
+derived ones. It works on any details CSV, including historical ones:
+
+    python normalize.py                       # every *_details.csv under data/raw
+    python normalize.py path/to/details.csv --format csv
+"""
+import argparse
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import config
+
+
+# --- VOCABULARIES ---
+# Keys are lowercase and accent-free (see `fold`)
+
+FLOOR_WORDS = {
+    # Basement
+    'sotano': -1, 'semisotano': -1, 'semi-sotano': -1, 'basement': -1, 'semi-basement': -1,
+    'seminterrato': -1, 'interrato': -1, 'sous-sol': -1,
+    # Ground floor and mezzanines
+    'bajo': 0, 'planta baja': 0, 'entreplanta': 0, 'entresuelo': 0, 'ground floor': 0, 'mezzanine': 0,
+    'piano terra': 0, 'pianterreno': 0, 'piano rialzato': 0, 'rez-de-chaussee': 0, 'rdc': 0, 'entresol': 0,
+    # Spanish "principal" is the floor above the mezzanine
+    'principal': 1,
+}
+
+STATUS_KEYWORDS = [
+    # Checked in order: the first category with a match wins
+    ('new', ['obra nueva', 'new development', 'new build', 'nuova costruzione', 'nuovo',
+             'neuf', 'programme neuf']),
+    ('to_renovate', ['reformar', 'to reform', 'to renovate', 'needs renovating', 'ristrutturare',
+                     'da ristrutturare', 'travaux', 'a renover', 'a rafraichir']),
+    ('renovated', ['reformado', 'renovated', 'ristrutturato', 'renove', 'refait a neuf']),
+    ('good', ['buen estado', 'good condition', 'buono stato', 'ottimo stato', 'bon etat', 'tres bon etat']),
+    ('second_hand', ['segunda mano', 'second hand', 'usato', 'ancien']),
+]
+
+ADVERTISER_KEYWORDS = [
+    ('developer', ['promotora', 'promotor', 'developer', 'costruttore', 'impresa edile', 'promoteur']),
+    ('agency', ['profesional', 'professional', 'agencia', 'inmobiliaria', 'agency', 'agenzia', 'immobiliare',
+                'agence', 'professionnel']),
+    ('private', ['particular', 'private', 'privato', 'particulier']),
+]
+
+EXTERIOR_WORDS = ['exterior', 'esterno', 'exterieur', 'outside', 'street view']
+INTERIOR_WORDS = ['interior', 'interno', 'interieur']
+
+TRUE_WORDS = ['true', '1', 'yes', 'si', 'oui', 'con ascensor', 'with lift', 'with elevator', 'con ascensore',
+              'avec ascenseur']
+FALSE_WORDS = ['false', '0', 'no', 'non', 'sin ascensor', 'without lift', 'without elevator',
+               'senza ascensore', 'sans ascenseur']
+
+
+def _alternation(words, capture: bool = False) -> re.Pattern:
+    """One compiled pattern matching any of `words` (longest first, on word boundaries)."""
+    escaped = sorted((re.escape(w) for w in words), key=len, reverse=True)
+    group = '(' if capture else '(?:'
+    return re.compile(r'(?<![\w-])' + group + '|'.join(escaped) + r')(?![\w-])')
+
+
+COMBINING_MARKS = re.compile(r'[\u0300-\u036f]')
+NON_DIGITS = re.compile(r'[^0-9]')
+# "350,000 €", "1.200.000 €", "1 200 000 €": digit groups with thousands separators
+AMOUNT = re.compile(r'(\d{1,3}(?:[.,\s\u00a0\u202f]\d{3})+|\d+)')
+FIRST_INT = re.compile(r'(-?\d+)')
+YEAR = re.compile(r'\b(1[6-9]\d{2}|20\d{2})\b')
+ENERGY_LETTER = re.compile(r'\b([a-g])\b')
+FLOOR_WORD = _alternation(FLOOR_WORDS, capture=True)
+EXTERIOR = _alternation(EXTERIOR_WORDS)
+INTERIOR = _alternation(INTERIOR_WORDS)
+TRUE_VALUE = _alternation(TRUE_WORDS)
+FALSE_VALUE = _alternation(FALSE_WORDS)
+STATUS_PATTERNS = [(label, _alternation(words)) for label, words in STATUS_KEYWORDS]
+ADVERTISER_PATTERNS = [(label, _alternation(words)) for label, words in ADVERTISER_KEYWORDS]
+
+
+# --- COLUMN PARSERS ---
+
+def fold(values: pd.Series) -> pd.Series:
+    """Lowercase, accent-free, whitespace-trimmed string version of `values`."""
+    text = values.astype('string').str.lower().str.normalize('NFKD')
+    return text.str.replace(COMBINING_MARKS, '', regex=True).str.strip()
+
+
+def _to_int(digits: pd.Series) -> pd.Series:
+    return pd.to_numeric(digits.replace('', pd.NA), errors='coerce').astype('Int64')
+
+
+def parse_amount(values: pd.Series) -> pd.Series:
+    """First amount in the text, thousands separators dropped: "350.000 €" -> 350000."""
+    amount = values.astype('string').str.extract(AMOUNT, expand=False)
+    return _to_int(amount.str.replace(NON_DIGITS, '', regex=True))
+
+
+def parse_int(values: pd.Series) -> pd.Series:
+    """First integer in the text: "3 habitaciones" -> 3."""
+    return _to_int(values.astype('string').str.extract(FIRST_INT, expand=False))
+
+
+def parse_year(values: pd.Series) -> pd.Series:
+    """A plausible construction year: "Construido en 1965" -> 1965."""
+    return _to_int(values.astype('string').str.extract(YEAR, expand=False))
+
+
+def parse_floor(values: pd.Series) -> pd.Series:
+    """Floor number: named floors from FLOOR_WORDS ("Bajo" -> 0), else the first integer ("3rd floor" -> 3)."""
+    text = fold(values)
+    named = text.str.extract(FLOOR_WORD, expand=False).map(FLOOR_WORDS)
+    number = text.str.extract(FIRST_INT, expand=False)
+    return _to_int(number).where(named.isna(), named.astype('Int64'))
+
+
+def parse_exterior(values: pd.Series) -> pd.Series:
+    """True for exterior-facing flats, False for interior ones, NA if the text says neither."""
+    text = fold(values)
+    result = pd.Series(pd.NA, index=values.index, dtype='boolean')
+    result[text.str.contains(INTERIOR, na=False)] = False
+    result[text.str.contains(EXTERIOR, na=False)] = True
+    return result
+
+
+def parse_bool(values: pd.Series) -> pd.Series:
+    """"True" / "con ascensor" / "oui" -> True, their negations -> False."""
+    text = fold(values)
+    result = pd.Series(pd.NA, index=values.index, dtype='boolean')
+    result[text.str.contains(TRUE_VALUE, na=False)] = True
+    # Negations win: "sin ascensor" also contains "ascensor"
+    result[text.str.contains(FALSE_VALUE, na=False)] = False
+    return result
+
+
+def classify(values: pd.Series, patterns) -> pd.Series:
+    """First label in `patterns` ([(label, compiled regex)...]) whose words appear in the text."""
+    text = fold(values)
+    conditions = [text.str.contains(pattern, na=False).to_numpy(dtype=bool) for _, pattern in patterns]
+    labels = np.select(conditions, [label for label, _ in patterns], default='')
+    return pd.Series(labels, index=values.index, dtype='string').replace('', pd.NA).astype('category')
+
+
+def parse_energy_cert(values: pd.Series) -> pd.Series:
+    """Energy certificate letter "A".."G" (case-insensitive)."""
+    letter = fold(values).str.extract(ENERGY_LETTER, expand=False).str.upper()
+    return letter.astype('category')
+
+
+# --- TABLE ---
+
+# Parser of every numeric / boolean field, also used by the Parquet sink
+VALUE_PARSERS = {
+    'price': parse_amount,
+    'surface_m2': parse_amount,
+    'rooms': parse_int,
+    'bedrooms': parse_int,
+    'bathrooms': parse_int,
+    'year_built': parse_year,
+    'has_elevator': parse_bool,
+}
+
+
+def by_unique(parse, values: pd.Series) -> pd.Series:
+    """
+    Runs `parse` once per distinct value and broadcasts the result back.
+    Scraped text columns repeat a handful of phrasings, so this is much
+    faster than parsing every row.
+    """
+    codes, uniques = pd.factorize(values)
+    parsed = parse(pd.Series(uniques, dtype='string'))
+    return pd.Series(parsed.array.take(codes, allow_fill=True), index=values.index, name=values.name)
+
+
+def normalize_details(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns a copy of a details table (Idealista or SeLoger) with typed
+    columns. Columns a site does not have are skipped.
+    """
+    df = df.copy()
+    for column, parse in VALUE_PARSERS.items():
+        if column in df:
+            df[column] = by_unique(parse, df[column])
+    if 'energy_cert_consumption' in df:
+        df['energy_cert_consumption'] = by_unique(parse_energy_cert, df['energy_cert_consumption'])
+    if 'floor_level' in df:
+        df['floor_number'] = by_unique(parse_floor, df['floor_level'])
+        df['is_exterior'] = by_unique(parse_exterior, df['floor_level'])
+    if 'property_status' in df:
+        df['status'] = by_unique(lambda v: classify(v, STATUS_PATTERNS), df['property_status'])
+    if 'advertiser_type' in df:
+        df['advertiser_category'] = by_unique(lambda v: classify(v, ADVERTISER_PATTERNS), df['advertiser_type'])
+    return df
+
+
+def normalize_file(path, output=None, fmt: str = 'parquet') -> Path:
+    """Normalizes a details CSV and writes it as `<name>_normalized.<fmt>` (or `output`)."""
+    path = Path(path)
+    output = Path(output) if output else path.with_name(f"{path.stem}_normalized.{fmt}")
+    df = normalize_details(pd.read_csv(path, dtype='string', keep_default_na=False, na_values=['']))
+    if fmt == 'csv':
+        df.to_csv(output, index=False)
+    else:
+        df.to_parquet(output, index=False)
+    print(f"✓ Normalized {len(df)} rows from {path.name} -> {output}")
+    return output
+
+
+def details_files(root=config.RAW_DATA_DIR) -> list:
+    """Every scraped details CSV under `root`."""
+    return sorted(Path(root).rglob('*_details.csv'))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Type and normalize scraped listing details")
+    parser.add_argument('paths', nargs='*', help="Details CSVs (default: every *_details.csv under data/raw)")
+    parser.add_argument('--format', choices=['parquet', 'csv'], default='parquet')
+    args = parser.parse_args()
+
+    paths = args.paths or details_files()
+    if not paths:
+        print(f"! No details CSV found under {config.RAW_DATA_DIR}")
+    for details_path in paths:
+        normalize_file(details_path, fmt=args.format)
@@ -0,0 +1,151 @@
+"""
+Columnar Parquet output for scraped listings.
+
+Each batch of records is written as its own small Parquet file with typed
+columns, inside a hive-style partition:
+
+    <root>/city=barcelona/scrape_date=2026-10-18/part-<timestamp>-<id>.parquet
+
+so downstream readers can load only the columns and partitions they need:
+
+    load_listings(config.PARQUET_DIR, columns=['price', 'surface_m2'],
+                  filters=[('city', '=', 'barcelona')])
+
+Run `python parquet_sink.py compact` to merge the small per-batch files of
+each partition into one.
+"""
+import argparse
+import datetime
+import os
+import threading
+import time
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import config
+from normalize import VALUE_PARSERS, by_unique
+
+
+# Storage type of every known field; anything else is kept as a string.
+# 'int' and 'bool' values are parsed with normalize.VALUE_PARSERS
+COLUMN_TYPES = {
+    'price': 'int',
+    'surface_m2': 'int',
+    'rooms': 'int',
+    'bedrooms': 'int',
+    'bathrooms': 'int',
+    'year_built': 'int',
+    'has_elevator': 'bool',
+    'location_neighborhood': 'category',
+    'location_district': 'category',
+    'location_city': 'category',
+    'location_postal_code': 'category',
+    'property_type': 'category',
+    'energy_cert_consumption': 'category',
+    'advertiser_type': 'category',
+}
+
+ARROW_TYPES = {
+    'int': pa.int64(),
+    'bool': pa.bool_(),
+    'category': pa.dictionary(pa.int32(), pa.string()),
+    'str': pa.string(),
+}
+
+
+def typed_frame(records: list) -> pd.DataFrame:
+    """Turns raw string records into a DataFrame with typed columns."""
+    df = pd.DataFrame(records)
+    for column in df.columns:
+        kind = COLUMN_TYPES.get(column, 'str')
+        values = df[column]
+        if column in VALUE_PARSERS:
+            # "1.200.000 €" -> 1200000, "3 habitaciones" -> 3, same as normalize.py
+            df[column] = by_unique(VALUE_PARSERS[column], values)
+        elif kind == 'category':
+            df[column] = values.astype('string').astype('category')
+        else:
+            df[column] = values.astype('string')
+    return df
+
+
+def arrow_schema(columns) -> pa.Schema:
+    """Arrow schema for the given column names, following COLUMN_TYPES."""
+    return pa.schema([(column, ARROW_TYPES[COLUMN_TYPES.get(column, 'str')]) for column in columns])
+
+
+class ParquetSink:
+    """
+    Thread-safe buffer of records for one city. Every `flush()` writes the
+    buffered records as one Parquet file in today's partition.
+    """
+
+    def __init__(self, root_dir, city: str):
+        self.root_dir = str(root_dir)
+        self.city = city
+        self.files_written = 0
+        self._buffer = []
+        self._lock = threading.Lock()
+
+    def add(self, record: dict):
+        with self._lock:
+            self._buffer.append(dict(record))
+
+    def flush(self):
+        """Writes the buffered records as one file. Returns its path, or None if empty."""
+        with self._lock:
+            records, self._buffer = self._buffer, []
+        if not records:
+            return None
+
+        df = typed_frame(records)
+        table = pa.Table.from_pandas(df, schema=arrow_schema(df.columns), preserve_index=False)
+
+        partition = os.path.join(
+            self.root_dir, f"city={self.city}", f"scrape_date={datetime.date.today().isoformat()}"
+        )
+        os.makedirs(partition, exist_ok=True)
+        path = os.path.join(partition, f"part-{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}.parquet")
+        pq.write_table(table, path, row_group_size=len(df))
+        with self._lock:
+            self.files_written += 1
+        print(f"✓ Wrote {len(df)} records to {path}")
+        return path
+
+
+def load_listings(root_dir=config.PARQUET_DIR, columns=None, filters=None) -> pd.DataFrame:
+    """
+    Column-projected, predicate-pushed read of the listings dataset, e.g.
+    load_listings(columns=['price'], filters=[('city', '=', 'barcelona')]).
+    """
+    return pd.read_parquet(root_dir, columns=columns, filters=filters)
+
+
+def compact(root_dir=config.PARQUET_DIR, min_files: int = 2):
+    """Merges the per-batch files of every partition into a single file."""
+    for partition, _, files in os.walk(root_dir):
+        parts = sorted(f for f in files if f.endswith('.parquet'))
+        if len(parts) < min_files:
+            continue
+
+        paths = [os.path.join(partition, f) for f in parts]
+        table = pa.concat_tables([pq.read_table(p) for p in paths], promote_options='default')
+        tmp_path = os.path.join(partition, f".compacted-{uuid.uuid4().hex[:8]}.tmp")
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, os.path.join(partition, f"compacted-{int(time.time() * 1000)}.parquet"))
+        for p in paths:
+            os.remove(p)
+        print(f"✓ Compacted {len(paths)} files ({table.num_rows} rows) in {partition}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintenance for the Parquet listings dataset")
+    parser.add_argument('command', choices=['compact'])
+    parser.add_argument('--root', default=str(config.PARQUET_DIR))
+    args = parser.parse_args()
+
+    if args.command == 'compact':
+        compact(args.root)
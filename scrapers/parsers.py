@@ -0,0 +1,357 @@
+"""
+HTML parsers for search results and listing detail pages.
+
+The browser only navigates and hands over `driver.page_source` once; everything
+else happens here on the raw HTML, so extraction is CPU-bound and can be run
+against saved pages without a WebDriver.
+"""
+import re
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+from instrumentation import debug
+
+
+# BeautifulSoup tree builder; "lxml" is the fastest, "html.parser" needs no C extension
+PARSER_BACKEND = "lxml"
+
+
+# --- HELPER FUNCTIONS ---
+
+def _make_soup(html: str):
+    """Builds a BeautifulSoup tree using PARSER_BACKEND (lxml by default)."""
+    return BeautifulSoup(html or "", PARSER_BACKEND)
+
+
+def _text(element):
+    """Mimics Selenium's `.text`: visible text with whitespace collapsed."""
+    if element is None:
+        return ""
+    return " ".join(element.get_text(" ").split())
+
+
+def _select_text(soup, selector):
+    """Returns the text of the first element matching `selector`, or None."""
+    element = soup.select_one(selector)
+    return _text(element) if element is not None else None
+
+
+def has_selectors(html: str, selectors) -> bool:
+    """True if every CSS selector in `selectors` matches something in `html`."""
+    soup = _make_soup(html)
+    return all(soup.select_one(selector) is not None for selector in selectors)
+
+
+# --- IDEALISTA ---
+
+IDEALISTA_BASE_URL = "https://www.idealista.com"
+
+
+def parse_idealista_search_cards(html: str, page_url: str = IDEALISTA_BASE_URL):
+    """
+    Parses an Idealista search results page into listing cards.
+    Returns (cards, next_page_url); each card is a dict with the listing 'url'
+    and the 'price' and 'details' (rooms, size...) snippet shown on the card.
+    next_page_url is None on the last page.
+    """
+    soup = _make_soup(html)
+    cards = []
+    for article in soup.select('article.item'):
+        link = article.select_one('a.item-link')
+        if link is None or not link.get('href'):
+            continue
+        cards.append({
+            'url': urljoin(page_url, link['href']),
+            'price': _select_text(article, '.item-price'),
+            'details': ' | '.join(_text(span) for span in article.select('.item-detail')),
+        })
+
+    next_link = soup.select_one('li.next a')
+    next_url = urljoin(page_url, next_link['href']) if next_link is not None and next_link.get('href') else None
+    return cards, next_url
+
+
+IDEALISTA_STATUS_KEYWORDS = [
+    'segunda mano', 'second hand', 'buen estado', 'good condition',
+    'reformar', 'to reform', 'new development', 'obra nueva'
+]
+
+
+def empty_idealista_record():
+    """Returns the field dict produced for every Idealista listing."""
+    return {
+        'price': None,
+        'location_street': None,
+        'location_neighborhood': None,
+        'location_district': None,
+        'surface_m2': None,
+        'rooms': None,
+        'bathrooms': None,
+        'property_status': None,
+        'year_built': None,
+        'floor_level': None,
+        'has_elevator': None,
+        'energy_cert_consumption': None,
+        'advertiser_type': None,
+        'advertiser_name': None
+    }
+
+
+def is_idealista_unavailable(html: str, title: str = None) -> bool:
+    """Detects the "listing no longer available" / error page variants."""
+    page_source = (html or "").lower()
+    if title is None:
+        match = re.search(r'<title[^>]*>(.*?)</title>', page_source, re.S)
+        title = match.group(1) if match else ""
+    return 'no disponible' in page_source or 'not available' in page_source or 'error' in title.lower()
+
+
+def _classify_idealista_feature(data, text, raw_text):
+    """Assigns a single feature line to the matching field of `data`."""
+    # Extract number from text
+    match = re.search(r'(\d+)', text)
+    num = match.group(1) if match else None
+
+    # Surface area
+    if ('m²' in text or 'm2' in text or 'built' in text) and data['surface_m2'] is None and num:
+        data['surface_m2'] = int(num)
+        debug(f"    ✓ Found surface: {num} m²")
+
+    # Rooms/Bedrooms
+    elif ('habitación' in text or 'bedroom' in text or 'room' in text) and data['rooms'] is None and num:
+        data['rooms'] = int(num)
+        debug(f"    ✓ Found rooms: {num}")
+
+    # Bathrooms
+    elif ('baño' in text or 'bathroom' in text) and data['bathrooms'] is None and num:
+        data['bathrooms'] = int(num)
+        debug(f"    ✓ Found bathrooms: {num}")
+
+    # Property status
+    elif any(s in text for s in IDEALISTA_STATUS_KEYWORDS) and data['property_status'] is None:
+        data['property_status'] = raw_text
+        debug(f"    ✓ Found status: {raw_text}")
+
+    # Year built
+    elif ('construido' in text or 'built in' in text) and data['year_built'] is None and num:
+        data['year_built'] = int(num)
+        debug(f"    ✓ Found year: {num}")
+
+    # Floor level
+    elif ('planta' in text or 'floor' in text) and data['floor_level'] is None and 'exterior' not in text:
+        data['floor_level'] = raw_text
+        debug(f"    ✓ Found floor: {raw_text}")
+
+    # Elevator
+    elif 'ascensor' in text or 'elevator' in text or 'lift' in text:
+        data['has_elevator'] = 'con' in text or 'with' in text or text.startswith('elevator')
+        debug(f"    ✓ Found elevator: {data['has_elevator']}")
+
+
+def parse_idealista_detail(html: str, title: str = None) -> dict:
+    """
+    Parses an Idealista detail page from its HTML using multiple selector
+    strategies for robustness. Returns the same field dict as the old
+    WebDriver-based `extract_listing_details`.
+    """
+    data = empty_idealista_record()
+
+    # Check if listing still exists
+    if is_idealista_unavailable(html, title):
+        debug("  ! Listing no longer available or page error")
+        return data
+
+    soup = _make_soup(html)
+
+    # Extract price
+    data['price'] = _select_text(soup, "span.info-data-price span.txt-bold")
+    if data['price'] is None:
+        # Alternative price selector
+        data['price'] = _select_text(soup, ".info-data-price")
+        if data['price'] is None:
+            debug("  ! Price not found.")
+
+    # Extract location details
+    loc_texts = [_text(li) for li in soup.select("#headerMap ul li")]
+    if len(loc_texts) >= 3:
+        data.update({
+            'location_street': loc_texts[0],
+            'location_neighborhood': loc_texts[1].replace('Barrio ', '').replace('Subdistrict ', ''),
+            'location_district': loc_texts[2].replace('Distrito ', '').replace('District ', '')
+        })
+    elif len(loc_texts) == 2:
+        data['location_neighborhood'] = loc_texts[0].replace('Barrio ', '').replace('Subdistrict ', '')
+        data['location_district'] = loc_texts[1].replace('Distrito ', '').replace('District ', '')
+
+    # Extract property features - Try multiple selectors
+    features_elements = soup.select("div.details-property_features ul li")
+    if not features_elements:
+        features_elements = soup.select(".details-property-feature-one")
+    if not features_elements:
+        features_elements = soup.select(".details-property_features span")
+
+    debug(f"  → Found {len(features_elements)} feature elements")
+
+    for element in features_elements:
+        raw_text = _text(element)
+        text = raw_text.lower().strip()
+        if not text:
+            continue
+        debug(f"  → Processing feature: {text}")
+        _classify_idealista_feature(data, text, raw_text)
+
+    # Extract energy certificate
+    cert_element = soup.select_one("div.details-property_features span[class*='icon-energy-c-']")
+    if cert_element is not None:
+        cert_class = " ".join(cert_element.get('class', []))
+        match = re.search(r'icon-energy-c-([a-g])', cert_class)
+        if match:
+            data['energy_cert_consumption'] = match.group(1).upper()
+            debug(f"  ✓ Found energy cert: {data['energy_cert_consumption']}")
+    else:
+        # Try alternative selector
+        cert_text = _select_text(soup, ".energy-certificate")
+        if cert_text:
+            match = re.search(r'\b([A-G])\b', cert_text)
+            if match:
+                data['energy_cert_consumption'] = match.group(1)
+
+    # Extract advertiser info
+    advertiser_type = _select_text(soup, "div.professional-name .name")
+    advertiser_name = _select_text(soup, "div.professional-name span")
+    if advertiser_type is not None and advertiser_name is not None:
+        data['advertiser_type'] = advertiser_type
+        data['advertiser_name'] = advertiser_name
+        debug(f"  ✓ Found advertiser: {data['advertiser_type']} - {data['advertiser_name']}")
+    else:
+        # Alternative selector for advertiser
+        advertiser_text = _select_text(soup, ".advertiser-data")
+        if advertiser_text is not None:
+            data['advertiser_type'] = advertiser_text
+        else:
+            data['advertiser_type'] = 'Particular'
+            debug("  ✓ Defaulting to Particular")
+
+    return data
+
+
+# --- SELOGER ---
+# Note: Selectors are illustrative and must be verified against the live website.
+
+def empty_seloger_record():
+    """Returns the field dict produced for every SeLoger listing."""
+    return {
+        'price': None,
+        'location_city': None,
+        'location_postal_code': None,
+        'surface_m2': None,
+        'rooms': None,
+        'bedrooms': None, # SeLoger often distinguishes rooms and bedrooms
+        'property_type': None,
+        'energy_cert_consumption': None,
+        'advertiser_type': None,
+        'advertiser_name': None
+    }
+
+
+def parse_seloger_detail(html: str) -> dict:
+    """
+    Parses the detail page of a SeLoger listing from its HTML.
+    Returns the same field dict as the old WebDriver-based
+    `extract_seLoger_listing_details`.
+    """
+    data = empty_seloger_record()
+    soup = _make_soup(html)
+
+    # Extract price (e.g., "1 200 000 €")
+    price_text = _select_text(soup, "[data-test='price-price']")
+    if price_text is not None:
+        data['price'] = re.sub(r'[^0-9]', '', price_text)
+    else:
+        debug("  ! Price not found.")
+
+    # Extract location details (e.g., "Paris (75001)")
+    location_element = soup.select_one("[data-test='property-address-container'] span")
+    if location_element is not None:
+        match = re.search(r'(.+?)\s*\((\d{5})\)', _text(location_element))
+        if match:
+            data['location_city'] = match.group(1).strip()
+            data['location_postal_code'] = match.group(2)
+
+    # Extract property features from the criteria list
+    for element in soup.select("[data-test='property-criteria-item']"):
+        text = _text(element).lower().strip()
+        if not text:
+            continue
+
+        debug(f"  → Processing feature: {text}")
+
+        # Surface area
+        if 'surface' in text or 'm²' in text:
+            match = re.search(r'(\d+)\s*m²', text)
+            if match:
+                data['surface_m2'] = int(match.group(1))
+                debug(f"    ✓ Found surface: {data['surface_m2']} m²")
+
+        # Rooms
+        elif 'pièce' in text:
+            match = re.search(r'(\d+)', text)
+            if match:
+                data['rooms'] = int(match.group(1))
+                debug(f"    ✓ Found rooms: {data['rooms']}")
+
+        # Bedrooms
+        elif 'chambre' in text:
+            match = re.search(r'(\d+)', text)
+            if match:
+                data['bedrooms'] = int(match.group(1))
+                debug(f"    ✓ Found bedrooms: {data['bedrooms']}")
+
+        # Property Type
+        elif 'type' in text:
+            type_element = element.select_one('p:last-child')
+            if type_element is not None:
+                data['property_type'] = _text(type_element)
+                debug(f"    ✓ Found property type: {data['property_type']}")
+
+    # Extract energy certificate
+    # The first label is usually consumption (DPE), the second is emissions (GES)
+    dpe_text = _select_text(soup, "[data-test='dpe-letter']")
+    if dpe_text is not None:
+        data['energy_cert_consumption'] = dpe_text.strip().upper()
+        debug(f"  ✓ Found energy cert: {data['energy_cert_consumption']}")
+
+    # Extract advertiser info
+    agency_name = _select_text(soup, "[data-test='agency-name']")
+    if agency_name is not None:
+        data['advertiser_name'] = agency_name
+        data['advertiser_type'] = 'Agency' # SeLoger is primarily agencies
+        debug(f"  ✓ Found advertiser: {data['advertiser_name']}")
+    else:
+        data['advertiser_type'] = 'Unknown'
+        debug("  ! Advertiser info not found.")
+
+    return data
+
+
+def parse_seloger_search_cards(html: str, page_url: str = "https://www.seloger.com"):
+    """
+    Parses a SeLoger search results page into listing cards, in the same
+    shape as `parse_idealista_search_cards`: (cards, next_page_url).
+    """
+    soup = _make_soup(html)
+    cards = []
+    for container in soup.select("[data-testid='sl.explore.card-container']"):
+        link = container.select_one("a[data-testid='sl.explore.coveringLink']")
+        if link is None or not link.get('href'):
+            continue
+        cards.append({
+            'url': urljoin(page_url, link['href']),
+            'price': _select_text(container, "[data-test='sl.price-label']"),
+            'details': ' | '.join(_text(li) for li in container.select("ul[data-test='sl.tags'] li")),
+        })
+
+    next_link = soup.select_one("a[data-testid='gsl.uilib.Paging.nextButton']")
+    next_url = urljoin(page_url, next_link['href']) if next_link is not None and next_link.get('href') else None
+    return cards, next_url
@@ -0,0 +1,151 @@
+"""
+Request pacing shared by every browser worker.
+
+All navigations go through a single `RequestScheduler`, which keeps one token
+bucket per domain. Time spent loading a page refills the bucket, so the
+scraper only sleeps for whatever is left of the politeness interval, and the
+rate drops automatically when the site starts erroring or slowing down.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import config
+from instrumentation import WARNING, debug, log, metrics
+
+
+def domain_of(url: str) -> str:
+    """Returns the host part of `url`, used as the rate-limiting key."""
+    return urlparse(url).netloc.lower()
+
+
+class TokenBucket:
+    """
+    Token bucket for a single domain. `rate_per_minute` tokens are added per
+    minute up to `burst`; each request takes one. Reservations may drive the
+    balance negative, which queues concurrent callers one interval apart.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int = 1):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.backoff = 1.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if self.rate > 0:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate / self.backoff)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Takes one token and returns how long the caller must wait for it."""
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        if self.tokens >= 0 or self.rate <= 0:
+            return 0.0
+        return -self.tokens * self.backoff / self.rate
+
+    @property
+    def interval(self) -> float:
+        """Current seconds between requests, including any backoff."""
+        return self.backoff / self.rate if self.rate > 0 else 0.0
+
+
+class RequestScheduler:
+    """
+    Thread-safe per-domain token-bucket scheduler.
+
+    - `requests_per_minute`: default rate for every domain.
+    - `domain_rates`: optional {domain: requests_per_minute} overrides.
+    - `burst`: requests allowed back to back after an idle period.
+    - `jitter`: random extra wait, as a fraction of the interval.
+    - `slow_seconds`: fetches slower than this count as a warning sign.
+    - `backoff_factor` / `max_backoff`: how fast the rate is divided down on
+      errors or slow responses, and the limit of that slowdown. Each healthy
+      response halves the distance back to the configured rate.
+    """
+
+    def __init__(self, requests_per_minute: float, domain_rates: dict = None, burst: int = 1,
+                 jitter: float = 0.0, slow_seconds: float = None,
+                 backoff_factor: float = 2.0, max_backoff: float = 8.0):
+        self.requests_per_minute = requests_per_minute
+        self.domain_rates = dict(domain_rates or {})
+        self.burst = burst
+        self.jitter = jitter
+        self.slow_seconds = slow_seconds
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, **overrides):
+        """Builds a scheduler from the pacing settings in config.py."""
+        settings = {
+            'requests_per_minute': config.REQUESTS_PER_MINUTE_PER_DOMAIN,
+            'domain_rates': config.DOMAIN_RATE_LIMITS,
+            'burst': config.REQUEST_BURST,
+            'jitter': config.REQUEST_JITTER,
+            'slow_seconds': config.SLOW_RESPONSE_SECONDS,
+            'backoff_factor': config.BACKOFF_FACTOR,
+            'max_backoff': config.MAX_BACKOFF,
+        }
+        settings.update(overrides)
+        return cls(**settings)
+
+    def _bucket(self, domain: str) -> TokenBucket:
+        bucket = self._buckets.get(domain)
+        if bucket is None:
+            rate = self.domain_rates.get(domain, self.requests_per_minute)
+            bucket = TokenBucket(rate, self.burst)
+            self._buckets[domain] = bucket
+        return bucket
+
+    def acquire(self, url: str) -> float:
+        """Blocks until a request to the domain of `url` is allowed. Returns the wait."""
+        with self._lock:
+            bucket = self._bucket(domain_of(url))
+            delay = bucket.reserve()
+            if delay > 0 and self.jitter:
+                delay += random.uniform(0, self.jitter * bucket.interval)
+        if delay > 0:
+            debug(f"Waiting {delay:.1f} seconds...")
+            with metrics.stage('sleep', kind='rate_limit'):
+                time.sleep(delay)
+        return delay
+
+    def record(self, url: str, elapsed: float = 0.0, ok: bool = True):
+        """Feeds the outcome of a request back into the domain's backoff."""
+        with self._lock:
+            bucket = self._bucket(domain_of(url))
+            slow = self.slow_seconds is not None and elapsed > self.slow_seconds
+            if not ok or slow:
+                bucket.backoff = min(self.max_backoff, bucket.backoff * self.backoff_factor)
+                log(f"  ! Backing off {domain_of(url)}: interval now {bucket.interval:.1f}s", WARNING)
+            elif bucket.backoff > 1.0:
+                bucket.backoff = max(1.0, 1.0 + (bucket.backoff - 1.0) / 2)
+
+    def report_failure(self, url: str):
+        """Shortcut for a page that loaded but failed afterwards (not ready, does not parse...)."""
+        self.record(url, ok=False)
+
+    @contextmanager
+    def request(self, url: str):
+        """
+        Context manager wrapping a single navigation:
+
+            with scheduler.request(url):
+                driver.get(url)
+        """
+        self.acquire(url)
+        start = time.monotonic()
+        try:
+            yield
+        except Exception:
+            self.record(url, time.monotonic() - start, ok=False)
+            raise
+        self.record(url, time.monotonic() - start, ok=True)
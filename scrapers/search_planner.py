@@ -0,0 +1,116 @@
+"""
+Search planner: splits a city into independent search shards.
+
+Instead of one seed URL walked by clicking "Next", each city is enumerated
+into (district x price band) shards whose paginated URLs are computed
+directly, e.g.
+
+    .../venta-viviendas/barcelona/eixample/con-precio-desde_150000,precio-hasta_250000/pagina-3.htm
+
+Shards can then be crawled concurrently within the politeness budget; the
+crawl state deduplicates listings that show up in more than one shard.
+City roots, district slugs, filter and pagination templates live in
+config.SEARCH_CITIES. Sites that filter and paginate through the query
+string (SeLoger) use `"style": "query"`.
+"""
+import re
+from urllib.parse import urlsplit, urlunsplit
+
+import config
+
+
+class SearchShard:
+    """
+    One search results listing (a district + price band, or any search URL)
+    whose pages can be addressed directly.
+    """
+
+    def __init__(self, base_url: str, query: str = "", page_template: str = "pagina-{page}.htm", label: str = None,
+                 page_param: str = None):
+        self.page_param = page_param
+        if page_param is None and not base_url.endswith('/'):
+            base_url += '/'
+        self.base_url = base_url
+        self.query = query
+        self.page_template = page_template
+        self.label = label or self.base_url
+
+    @classmethod
+    def from_url(cls, url: str, page_template: str = "pagina-{page}.htm"):
+        """Builds a shard from any search URL, e.g. the old single seed."""
+        parts = urlsplit(url)
+        page_pattern = re.escape(page_template).replace(r'\{page\}', r'\d+') + '$'
+        path = re.sub(page_pattern, '', parts.path)
+        base_url = urlunsplit((parts.scheme, parts.netloc, path, '', ''))
+        return cls(base_url, parts.query, page_template)
+
+    def page_url(self, page: int) -> str:
+        """URL of results page `page` (1-based) of this shard."""
+        if self.page_param is not None:
+            query = self.query if page <= 1 else "&".join(filter(None, [self.query, f"{self.page_param}={page}"]))
+            return f"{self.base_url}?{query}" if query else self.base_url
+        url = self.base_url if page <= 1 else self.base_url + self.page_template.format(page=page)
+        return f"{url}?{self.query}" if self.query else url
+
+    def __repr__(self):
+        return f"SearchShard({self.label!r})"
+
+
+def price_filter_segment(low, high, city_config: dict) -> str:
+    """Path segment restricting a search to [low, high]; empty if unbounded."""
+    filters = []
+    if low is not None:
+        filters.append(city_config['price_min'].format(low))
+    if high is not None:
+        filters.append(city_config['price_max'].format(high))
+    return f"con-{','.join(filters)}/" if filters else ""
+
+
+def plan_city(city: str, districts=None, price_bands=None) -> list:
+    """
+    Enumerates the search shards covering `city`: every district in
+    config.SEARCH_CITIES (or the whole city if none are listed) crossed with
+    every price band in config.PRICE_BANDS.
+    """
+    city_config = config.SEARCH_CITIES[city]
+    districts = city_config['districts'] if districts is None else districts
+    price_bands = config.PRICE_BANDS if price_bands is None else price_bands
+
+    if city_config.get('style') == 'query':
+        shards = _plan_query_shards(city, city_config, districts, price_bands)
+        print(f"✓ Planned {len(shards)} search shards for {city}")
+        return shards
+
+    shards = []
+    for district in districts or [None]:
+        district_url = city_config['root'] + (f"{district}/" if district else "")
+        for low, high in price_bands or [(None, None)]:
+            shards.append(SearchShard(
+                district_url + price_filter_segment(low, high, city_config),
+                query=city_config.get('query', ''),
+                page_template=city_config['page_template'],
+                label=f"{city}/{district or 'all'}/{low or 0}-{high or 'max'}",
+            ))
+    print(f"✓ Planned {len(shards)} search shards for {city}")
+    return shards
+
+
+def _plan_query_shards(city: str, city_config: dict, districts, price_bands) -> list:
+    """Shards for sites whose district, price and page filters are query parameters."""
+    shards = []
+    for district in districts or [None]:
+        for low, high in price_bands or [(None, None)]:
+            params = [city_config.get('query', '')]
+            if district:
+                params.append(city_config['district_query'].format(district))
+            if low is not None or high is not None:
+                params.append(city_config['price_query'].format(
+                    "NaN" if low is None else low, "NaN" if high is None else high
+                ))
+            shards.append(SearchShard(
+                city_config['root'],
+                query="&".join(filter(None, params)),
+                page_param=city_config['page_param'],
+                label=f"{city}/{district or 'all'}/{low or 0}-{high or 'max'}",
+            ))
+    return shards
@@ -0,0 +1,248 @@
+"""
+Site adapters for the shared scraping engine (see engine.py).
+
+An adapter holds everything that differs between real estate sites: its
+parsers, the selectors that prove a page is usable, the URL shapes, the
+cookie banner and where its outputs live. The engine itself (scheduling,
+fetching, crawl state, workers, caching) is the same for every site.
+
+Every adapter also canonicalizes listing URLs: it pulls out the numeric
+listing ID, which keys the crawl state and the seen-listings index
+(dedup.py), so "/en/inmueble/123/?xtmc=..." and "/inmueble/123/" are one
+listing. The URL that is fetched drops the query string and tracking
+fragments but keeps the language path of the city's search root ("/en/"):
+the detail parsers read that language, and Idealista serves Spanish or
+Italian pages without it.
+
+Adapters are picked per city from config.SEARCH_CITIES ("site" key):
+
+    Idealista -> barcelona, milano
+    SeLoger   -> paris
+"""
+import re
+from urllib.parse import urlsplit, urlunsplit
+
+import config
+from crawl_state import canonical_url
+from parsers import (
+    empty_idealista_record, empty_seloger_record,
+    parse_idealista_detail, parse_idealista_search_cards,
+    parse_seloger_detail, parse_seloger_search_cards,
+)
+from browser import ResourcePolicy
+from search_planner import plan_city
+
+
+# "/en/...", "/ca/...": language versions of the same page
+LANGUAGE_PREFIX = re.compile(r'^/[a-z]{2}(?=/)')
+
+
+class SiteAdapter:
+    """
+    Base adapter. Subclasses set the class attributes and parser functions;
+    parsers must be module-level functions so offline re-extraction can send
+    them to worker processes.
+    """
+    name = None
+    # Selectors that prove an HTTP response is the real page and not a JS shell
+    search_ready_selectors = []
+    detail_ready_selectors = []
+    # Browser fallback: selectors that prove a rendered page is ready to parse,
+    # lowercase texts that mean the listing is gone, and the cookie button
+    search_wait_selectors = []
+    detail_wait_selectors = []
+    unavailable_markers = []
+    cookie_button_id = "didomi-notice-agree-button"
+    # Regex over a detail URL's path (language prefix removed): group 'path'
+    # is the canonical path (plus `canonical_suffix`, after the language
+    # prefix) and group 'id' the numeric listing ID
+    listing_path_pattern = None
+    canonical_suffix = ""
+    # Browser resource policy (see browser.py): site-specific blocks, and the
+    # resource types / URL patterns the site needs and must never be blocked
+    blocked_url_patterns = []
+    allowed_resource_types = []
+    allowed_url_patterns = []
+
+    search_parser = None
+    detail_parser = None
+    empty_record_fn = None
+
+    def __init__(self, city: str):
+        if city not in config.SEARCH_CITIES:
+            raise ValueError(f"Unknown city '{city}'. Known cities: {sorted(config.SEARCH_CITIES)}")
+        self.city = city
+        self.data_dir = config.RAW_DATA_DIR / city
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.city!r})"
+
+    @property
+    def label(self) -> str:
+        return f"{self.name}:{self.city}"
+
+    @property
+    def language_prefix(self) -> tuple:
+        """(host, "/en") of the city's search root; the prefix is "" if the root has no language path."""
+        root = urlsplit(config.SEARCH_CITIES[self.city]['root'])
+        match = LANGUAGE_PREFIX.match(root.path)
+        return root.netloc.lower(), match.group(0) if match else ""
+
+    # --- Output locations ---
+
+    @property
+    def url_file(self):
+        return self.data_dir / f"{self.name}_listings.csv"
+
+    @property
+    def details_file(self):
+        return self.data_dir / f"{self.name}_details.csv"
+
+    @property
+    def state_db(self):
+        return self.data_dir / "crawl_state.sqlite"
+
+    @property
+    def listing_index_file(self):
+        return self.data_dir / f"{self.name}_listing_ids.npy"
+
+    # --- Parsing ---
+
+    def parse_search_cards(self, html: str, page_url: str):
+        cards, next_url = self.search_parser(html, page_url)
+        return self.canonical_cards(cards), next_url
+
+    def parse_detail(self, html: str) -> dict:
+        return self.detail_parser(html)
+
+    def empty_record(self) -> dict:
+        return self.empty_record_fn()
+
+    def fieldnames(self) -> list:
+        return list(self.empty_record()) + ['url']
+
+    def is_detail_url(self, url: str) -> bool:
+        return self.listing_id(url) is not None
+
+    # --- Canonical URLs ---
+
+    def _match_listing(self, url: str):
+        parts = urlsplit(url.strip())
+        match = self.listing_path_pattern.match(LANGUAGE_PREFIX.sub('', parts.path, count=1))
+        return parts, match
+
+    def _language(self, parts) -> str:
+        """Language prefix to fetch a listing with: the search root's on its host, else the URL's own."""
+        host, prefix = self.language_prefix
+        if parts.netloc.lower() == host:
+            return prefix
+        match = LANGUAGE_PREFIX.match(parts.path)
+        return match.group(0) if match else ""
+
+    def listing_id(self, url: str):
+        """Numeric listing ID of a detail URL, or None if `url` is not one."""
+        _, match = self._match_listing(url)
+        return int(match.group('id')) if match else None
+
+    def canonical_url(self, url: str) -> str:
+        """The URL fetched for a listing: its language path, no query string or fragment."""
+        parts, match = self._match_listing(url)
+        if match is None:
+            return url
+        path = self._language(parts) + match.group('path') + self.canonical_suffix
+        return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, '', ''))
+
+    def url_key(self, url: str) -> str:
+        """Crawl state key: '<site>:<listing id>', or the normalized URL if it has no ID."""
+        listing_id = self.listing_id(url)
+        return f"{self.name}:{listing_id}" if listing_id is not None else canonical_url(url)
+
+    def canonical_cards(self, cards: list) -> list:
+        """Canonicalizes the URLs of search cards and drops aliases of a listing already in `cards`."""
+        unique = {}
+        for card in cards:
+            card['url'] = self.canonical_url(card['url'])
+            unique.setdefault(self.url_key(card['url']), card)
+        return list(unique.values())
+
+    # --- Browser ---
+
+    def resource_policy(self):
+        """The config.py resource policy with this site's allowlist, or None if blocking is off."""
+        return ResourcePolicy.from_config(self.allowed_resource_types, self.allowed_url_patterns,
+                                          self.blocked_url_patterns)
+
+    # --- Search ---
+
+    def plan(self, districts=None, price_bands=None) -> list:
+        return plan_city(self.city, districts, price_bands)
+
+
+class IdealistaAdapter(SiteAdapter):
+    """Idealista (Barcelona, Milan)."""
+    name = "idealista"
+    search_ready_selectors = ['article.item a.item-link']
+    detail_ready_selectors = ['.info-data-price']
+    search_wait_selectors = ['article.item']
+    detail_wait_selectors = ['.info-data-price', '.details-property_features']
+    unavailable_markers = ['no disponible', 'not available', 'ya no está publicado', 'no longer published']
+    # /inmueble/<id>/ (Spain), /immobile/<id>/ (Italy)
+    listing_path_pattern = re.compile(r'^(?P<path>.*?/(?:inmueble|immobile)/(?P<id>\d+))')
+    canonical_suffix = "/"
+    # Listing photos are served from img*.idealista.com; the DataDome challenge must load
+    blocked_url_patterns = ['*://img*.idealista.com/*', '*://st*.idealista.com/*.woff*']
+    allowed_url_patterns = ['*captcha-delivery.com*', '*datadome*']
+
+    search_parser = staticmethod(parse_idealista_search_cards)
+    detail_parser = staticmethod(parse_idealista_detail)
+    empty_record_fn = staticmethod(empty_idealista_record)
+
+    def __init__(self, city: str = config.CITY):
+        super().__init__(city)
+        if city == config.CITY:
+            # Keep the historical Barcelona paths from config.py
+            self.data_dir = config.BARCELONA_DATA_DIR
+
+    @property
+    def url_file(self):
+        return config.URL_FILE if self.city == config.CITY else super().url_file
+
+    @property
+    def details_file(self):
+        return config.DETAILS_FILE if self.city == config.CITY else super().details_file
+
+    @property
+    def state_db(self):
+        return config.CRAWL_STATE_DB if self.city == config.CITY else super().state_db
+
+
+class SeLogerAdapter(SiteAdapter):
+    """SeLoger (Paris). Selectors are illustrative and must be verified against the live website."""
+    name = "seloger"
+    search_ready_selectors = ["[data-testid='sl.explore.card-container'] a[data-testid='sl.explore.coveringLink']"]
+    detail_ready_selectors = ["[data-test='price-price']"]
+    search_wait_selectors = ["[data-testid='sl.explore.card-container']"]
+    detail_wait_selectors = ["[data-test='price-price']", "[data-test='property-criteria-item']"]
+    unavailable_markers = ["n'est plus disponible", "annonce expirée", "cette annonce a été supprimée"]
+    # /annonces/achat/appartement/paris-11eme-75/<slug>/<id>.htm
+    listing_path_pattern = re.compile(r'^(?P<path>.*?/annonces/(?:.*/)?(?P<id>\d+)\.htm)')
+    allowed_url_patterns = ['*captcha-delivery.com*', '*datadome*']
+
+    search_parser = staticmethod(parse_seloger_search_cards)
+    detail_parser = staticmethod(parse_seloger_detail)
+    empty_record_fn = staticmethod(empty_seloger_record)
+
+    def __init__(self, city: str = "paris"):
+        super().__init__(city)
+
+
+SITE_ADAPTERS = {
+    IdealistaAdapter.name: IdealistaAdapter,
+    SeLogerAdapter.name: SeLogerAdapter,
+}
+
+
+def adapter_for_city(city: str) -> SiteAdapter:
+    """Builds the adapter of the site configured for `city` in config.SEARCH_CITIES."""
+    site = config.SEARCH_CITIES[city].get('site', IdealistaAdapter.name)
+    return SITE_ADAPTERS[site](city)
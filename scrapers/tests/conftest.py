@@ -0,0 +1,26 @@
+"""
+Shared fixtures. The scrapers are run from their own directory and import
+each other as top-level modules, so that directory goes on sys.path here.
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import config  # noqa: E402
+from benchmark import MockSite  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def no_metrics_events(monkeypatch):
+    """Keeps test runs from writing metrics events files."""
+    monkeypatch.setattr(config, 'METRICS_EVENTS_ENABLED', False)
+
+
+@pytest.fixture(scope="module")
+def mock_site():
+    """The benchmark's local stand-in site: 2 result pages of 5 listings, per site."""
+    with MockSite(pages=2, per_page=5) as site:
+        yield site
@@ -0,0 +1,141 @@
+"""CrawlState: frontier claims, the retry queue, incremental re-crawls and migrations, on a temp SQLite file."""
+import pandas as pd
+import pytest
+
+import config
+from crawl_state import CrawlState, canonical_url
+from sites import IdealistaAdapter
+
+SITE = IdealistaAdapter("barcelona")
+URL = "https://www.idealista.com/en/inmueble/{}/"
+
+
+@pytest.fixture
+def state(tmp_path):
+    state = CrawlState(tmp_path / "state.sqlite", key_fn=SITE.url_key, key_scheme="idealista-listing-id")
+    yield state
+    state.close()
+
+
+def failed_row(state, url):
+    return state._conn.execute("SELECT attempts, next_attempt_at FROM failed WHERE url_key = ?",
+                               (SITE.url_key(url),)).fetchone()
+
+
+def test_aliases_share_one_frontier_entry(state):
+    added = state.add_urls([URL.format(1), "https://www.idealista.com/inmueble/1/?xtmc=2", URL.format(2)])
+    assert added == 2
+    assert state.add_urls([URL.format(1)]) == 0
+    assert state.known_urls() == 2 and state.known_urls(key_prefix="idealista:") == 2
+
+
+def test_claim_and_requeue_after_a_crash(state):
+    state.add_urls([URL.format(i) for i in range(5)])
+    claimed = state.claim("w1", 3)
+    assert len(claimed) == 3
+    assert state.counts() == {'frontier': 2, 'in_progress': 3, 'done': 0, 'failed': 0}
+    assert state.claim("w2", 10) == [URL.format(3), URL.format(4)]
+    assert state.requeue_in_progress() == 5
+    assert state.counts()['frontier'] == 5
+
+
+def test_failures_back_off_and_give_up(state, monkeypatch):
+    monkeypatch.setattr(config, 'RETRY_MAX_ATTEMPTS', 3)
+    url = URL.format(7)
+    state.add_urls([url])
+    state.claim("w1", 1)
+
+    assert state.mark_failed(url, reason='timeout') == 1
+    attempts, next_attempt_at = failed_row(state, url)
+    assert next_attempt_at is not None
+    assert state.requeue_due_failures(now=next_attempt_at - 1) == 0
+    assert state.requeue_due_failures(now=next_attempt_at) == 1
+    assert state.claim("w1", 10, retries_only=True) == [url]
+
+    assert state.mark_failed(url, reason='timeout') == 2
+    assert failed_row(state, url)[1] is not None
+    assert state.mark_failed(url, reason='captcha') == 3
+    assert failed_row(state, url)[1] is None
+    assert state.requeue_due_failures(now=float('inf')) == 0
+    summary = state.retry_summary()
+    assert summary['exhausted'] == 1 and summary['by_reason'] == {'captcha': 1}
+
+
+def test_failure_without_retry_and_later_success(state):
+    url = URL.format(8)
+    state.add_urls([url])
+    state.mark_failed(url, reason='unavailable', retry=False)
+    assert failed_row(state, url)[1] is None
+    state.mark_done(url, {'price': "1 €"})
+    assert state.counts() == {'frontier': 0, 'in_progress': 0, 'done': 1, 'failed': 0}
+    assert state.add_urls([url]) == 0
+
+
+def test_observe_cards_queues_new_listings_and_records_prices(state, monkeypatch):
+    clock = iter(range(1_000_000, 2_000_000, 100))
+    monkeypatch.setattr('crawl_state.time.time', lambda: next(clock))
+    card = {'url': URL.format(9), 'price': "350.000 €", 'details': "3 hab. 80 m²"}
+
+    assert state.observe_cards([card]) == 1
+    assert state.observe_cards([card]) == 0
+    state.claim("w1", 1)
+    state.mark_done(card['url'])
+
+    # Unchanged card: not queued again; a price drop is queued and recorded
+    assert state.observe_cards([card]) == 0
+    assert state.observe_cards([dict(card, price="320.000 €")]) == 1
+    assert state.observe_cards([dict(card, price="300.000 €")], requeue_changed=False) == 0
+    history = state.price_history(card['url'])
+    assert history['price'].tolist() == [350000, 320000, 300000]
+
+
+def test_observe_cards_requeues_listings_past_the_ttl(state, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr('crawl_state.time.time', lambda: now[0])
+    card = {'url': URL.format(10), 'price': "1.000 €", 'details': ""}
+    state.observe_cards([card])
+    state.claim("w1", 1)
+    state.mark_done(card['url'])
+
+    now[0] += 3600
+    assert state.observe_cards([card], ttl_seconds=86400) == 0
+    now[0] += 2 * 86400
+    assert state.observe_cards([card], ttl_seconds=86400) == 1
+
+
+def test_reopening_with_a_new_key_scheme_merges_aliases(tmp_path):
+    path = tmp_path / "state.sqlite"
+    old = CrawlState(path)
+    old.add_urls(["https://www.idealista.com/inmueble/5/", "https://www.idealista.com/en/inmueble/6/"])
+    old.mark_done("https://www.idealista.com/en/inmueble/5/")
+    old.add_urls(["https://www.idealista.com/ca/inmueble/6/"])
+    assert old.known_urls() == 4
+    old.close()
+
+    state = CrawlState(path, key_fn=SITE.url_key, key_scheme="idealista-listing-id")
+    assert state.known_urls() == 2
+    # The alias of a scraped listing is no longer queued
+    assert state.counts() == {'frontier': 1, 'in_progress': 0, 'done': 1, 'failed': 0}
+    state.close()
+
+    # Opening again with the same scheme leaves the keys alone
+    state = CrawlState(path, key_fn=SITE.url_key, key_scheme="idealista-listing-id")
+    assert state.known_urls() == 2
+    state.close()
+
+
+def test_import_csvs_bootstraps_an_empty_store(state, tmp_path):
+    details, listings = tmp_path / "details.csv", tmp_path / "listings.csv"
+    pd.DataFrame({'url': [URL.format(1), URL.format(2)], 'price': ["1 €", "2 €"]}).to_csv(details, index=False)
+    pd.DataFrame({'listing_url': [URL.format(2), URL.format(3)]}).to_csv(listings, index=False)
+
+    state.import_csvs(url_file=listings, details_file=details)
+    assert state.counts() == {'frontier': 1, 'in_progress': 0, 'done': 2, 'failed': 0}
+
+    pd.DataFrame({'listing_url': [URL.format(4)]}).to_csv(listings, index=False)
+    state.import_csvs(url_file=listings, details_file=details)
+    assert state.known_urls() == 3
+
+
+def test_canonical_url_of_urls_without_listing_id():
+    assert canonical_url("HTTPS://WWW.Example.com/a/b?x=1#y") == "https://www.example.com/a/b/"
@@ -0,0 +1,87 @@
+"""Seen-listings index (dedup.py) and how the engine keeps it in step with the crawl state."""
+import threading
+
+import numpy as np
+import pytest
+
+from crawl_state import CrawlState
+from dedup import BloomFilter, ListingIndex
+from sites import IdealistaAdapter
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=10_000, error_rate=0.01)
+    added = np.arange(0, 20_000, 2, dtype=np.int64)
+    bloom.add(added)
+    assert bloom.might_contain(added).all()
+    false_positives = bloom.might_contain(added + 1).mean()
+    assert false_positives < 0.03
+
+
+def test_add_many_marks_new_ids_and_repeats(tmp_path):
+    index = ListingIndex(buffer_size=3)
+    assert index.add_many([5, 1, 5, 9]).tolist() == [True, True, False, True]
+    assert index.add_many([1, 2, 3, 4]).tolist() == [False, True, True, True]
+    assert index.contains_many([1, 2, 6, 9]).tolist() == [True, True, False, True]
+    assert len(index) == 6 and 4 in index and 7 not in index
+
+
+@pytest.mark.parametrize('bloom_capacity', [None, 1000])
+def test_saved_index_reloads_memory_mapped(tmp_path, bloom_capacity):
+    path = tmp_path / "ids.npy"
+    index = ListingIndex(path, bloom_capacity=bloom_capacity)
+    index.add_many([30, 10, 20])
+    index.save()
+
+    reopened = ListingIndex(path, bloom_capacity=bloom_capacity)
+    assert isinstance(reopened._sorted, np.memmap)
+    assert reopened._sorted.tolist() == [10, 20, 30]
+    assert reopened.add_many([20, 40]).tolist() == [False, True]
+    reopened.save()
+    assert np.load(path).tolist() == [10, 20, 30, 40]
+
+
+def test_clear_forgets_every_id():
+    index = ListingIndex(bloom_capacity=100, buffer_size=2)
+    index.add_many([1, 2, 3])
+    index.clear()
+    assert len(index) == 0 and 1 not in index
+    assert index.add_many([1]).tolist() == [True]
+
+
+def test_concurrent_add_many_takes_each_id_once():
+    index = ListingIndex(buffer_size=100)
+    ids = list(range(1000))
+    results = []
+
+    def shard():
+        results.append(index.add_many(ids))
+
+    threads = [threading.Thread(target=shard) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert np.sum(results, axis=0).tolist() == [1] * len(ids)
+    assert len(index) == len(ids)
+
+
+def test_stale_saved_index_is_rebuilt_from_the_state(tmp_path, monkeypatch):
+    engine = pytest.importorskip("engine")
+    site = IdealistaAdapter("milano")
+    site.data_dir = tmp_path
+    saved = ListingIndex(site.listing_index_file)
+    saved.add_many([1, 2, 3])
+    saved.save()
+    del saved
+
+    # The crawl state was reset: only one listing is known now
+    state = CrawlState(tmp_path / "state.sqlite", key_fn=site.url_key, key_scheme="idealista-listing-id")
+    state.add_urls(["https://www.idealista.it/en/immobile/2/"])
+    index = engine.open_listing_index(site, state)
+    assert len(index) == 1 and 2 in index and 1 not in index
+
+    # A matching index is kept as saved
+    index.save()
+    assert len(engine.open_listing_index(site, state)) == 1
+    state.close()
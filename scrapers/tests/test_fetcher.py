@@ -0,0 +1,141 @@
+"""PageFetcher against the local mock site: HTTP first, browser only when the page is not usable."""
+import pytest
+
+import config
+from browser import DriverManager
+from fetcher import PageFetcher, make_session
+from html_cache import HtmlCache
+from parsers import parse_idealista_detail, parse_idealista_search_cards, parse_seloger_search_cards
+from scheduler import RequestScheduler, domain_of
+from sites import IdealistaAdapter, SeLogerAdapter
+
+
+class FakeDriver:
+    """Stands in for a WebDriver: serves fixed HTML and records navigations."""
+
+    def __init__(self, html):
+        self.page_source = html
+        self.visited = []
+        self.quit_called = False
+
+    def get(self, url):
+        self.visited.append(url)
+
+    def execute_script(self, *args):
+        return [0, 0]
+
+    def quit(self):
+        self.quit_called = True
+
+
+def no_browser():
+    raise AssertionError("the browser should not be launched")
+
+
+def make_fetcher(**kwargs):
+    kwargs.setdefault('driver_factory', no_browser)
+    return PageFetcher(RequestScheduler(requests_per_minute=0), session=make_session("pytest"), **kwargs)
+
+
+def test_search_page_over_http(mock_site):
+    fetcher = make_fetcher()
+    url = f"{mock_site.base_url}/idealista/barcelona/"
+    result = fetcher.fetch(url, IdealistaAdapter.search_ready_selectors)
+
+    assert result.via == 'http' and result.status == 200
+    assert fetcher.http_hits == 1 and fetcher.driver is None
+    cards, next_url = parse_idealista_search_cards(result.html, url)
+    assert len(cards) == 5
+    assert cards[0]['url'].startswith(f"{mock_site.base_url}/idealista/inmueble/")
+    assert next_url == f"{mock_site.base_url}/idealista/barcelona/pagina-2.htm"
+
+
+def test_last_search_page_has_no_next(mock_site):
+    url = f"{mock_site.base_url}/seloger/list.htm?LISTING-LISTpg=2"
+    result = make_fetcher().fetch(url, SeLogerAdapter.search_ready_selectors)
+    cards, next_url = parse_seloger_search_cards(result.html, url)
+    assert len(cards) == 5 and next_url is None
+
+
+def test_detail_page_over_http(mock_site):
+    result = make_fetcher().fetch(f"{mock_site.base_url}/idealista/inmueble/1001/",
+                                  IdealistaAdapter.detail_ready_selectors)
+    record = parse_idealista_detail(result.html)
+    assert result.via == 'http'
+    assert record['price'] is not None
+    assert record['rooms'] == 1 + 1001 % 4
+
+
+def test_missing_selectors_fall_back_to_browser(mock_site):
+    driver = FakeDriver("<html><body><div class='rendered'>ok</div></body></html>")
+    fetcher = make_fetcher(driver_factory=lambda: driver)
+    url = f"{mock_site.base_url}/idealista/barcelona/"
+    result = fetcher.fetch(url, ['div.rendered'])
+
+    assert result.via == 'browser'
+    assert driver.visited == [url]
+    assert fetcher.browser_hits == 1 and fetcher.http_hits == 0
+    fetcher.close()
+    assert driver.quit_called
+
+
+def test_error_status_falls_back_to_browser(mock_site):
+    driver = FakeDriver("<html></html>")
+    result = make_fetcher(driver_factory=lambda: driver).fetch(f"{mock_site.base_url}/missing")
+    assert result.via == 'browser'
+
+
+def test_unusable_page_without_browser_raises(mock_site):
+    fetcher = PageFetcher(RequestScheduler(requests_per_minute=0), session=make_session("pytest"))
+    with pytest.raises(RuntimeError):
+        fetcher.fetch(f"{mock_site.base_url}/missing")
+
+
+def test_fetched_pages_go_to_the_cache(mock_site, tmp_path):
+    cache = HtmlCache(tmp_path)
+    url = f"{mock_site.base_url}/idealista/inmueble/1002/"
+    result = make_fetcher(cache=cache).fetch(url, IdealistaAdapter.detail_ready_selectors)
+    assert cache.latest(url) == result.html
+    cache.close()
+
+
+def test_failure_after_navigation_backs_off_once(mock_site):
+    def broken_page(driver):
+        raise TimeoutError("not ready")
+
+    scheduler = RequestScheduler(requests_per_minute=0)
+    fetcher = PageFetcher(scheduler, driver_factory=lambda: FakeDriver("<html></html>"), after_load=broken_page)
+    url = f"{mock_site.base_url}/idealista/barcelona/"
+    with pytest.raises(TimeoutError):
+        fetcher.fetch(url)
+    assert scheduler._bucket(domain_of(url)).backoff == scheduler.backoff_factor
+
+
+def test_worn_out_browser_is_not_replaced_until_needed(mock_site):
+    launched = []
+
+    def launch():
+        launched.append(FakeDriver("<html><body><div class='rendered'>ok</div></body></html>"))
+        return launched[-1]
+
+    drivers = DriverManager(launch, standby=0, max_pages=1, max_errors=0, max_age_seconds=0, max_rss_mb=0)
+    fetcher = make_fetcher(driver_factory=None, drivers=drivers)
+    url = f"{mock_site.base_url}/idealista/barcelona/"
+    fetcher.fetch(url, ['div.rendered'])
+    assert fetcher.driver is None and len(launched) == 1
+
+    fetcher.fetch(url, ['div.rendered'])
+    assert len(launched) == 2
+    fetcher.close()
+    drivers.close()
+
+
+def test_quiet_verbosity_keeps_only_warnings(mock_site, monkeypatch, capsys):
+    monkeypatch.setattr(config, 'LOG_VERBOSITY', 0)
+    driver = FakeDriver("<html><body><div class='rendered'>ok</div></body></html>")
+    make_fetcher(driver_factory=lambda: driver).fetch(f"{mock_site.base_url}/idealista/barcelona/", ['div.rendered'])
+    assert "falling back to the browser" not in capsys.readouterr().out
+
+    monkeypatch.setattr(config, 'LOG_VERBOSITY', 1)
+    make_fetcher(driver_factory=lambda: driver).fetch(f"{mock_site.base_url}/idealista/barcelona/", ['div.rendered'])
+    assert "falling back to the browser" in capsys.readouterr().out
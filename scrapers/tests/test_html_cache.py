@@ -0,0 +1,64 @@
+"""HtmlCache: storage, LRU and age eviction, offline re-extraction, in a temp cache directory."""
+import os
+import time
+
+from html_cache import HtmlCache, reextract
+from parsers import parse_idealista_detail
+from sites import IdealistaAdapter
+
+
+def page(n: int) -> str:
+    # Incompressible enough that every page has a distinct, measurable size
+    return f"<html><body>{os.urandom(2000).hex()}-{n}</body></html>"
+
+
+def test_latest_capture_is_returned(tmp_path):
+    cache = HtmlCache(tmp_path)
+    cache.store("https://a/1", "<p>old</p>", fetched_at=1000.0)
+    cache.store("https://a/1", "<p>new</p>", fetched_at=2000.0)
+    assert cache.latest("https://a/1") == "<p>new</p>"
+    assert cache.latest("https://a/2") is None
+    assert [(url, fetched_at) for url, fetched_at, _ in cache.latest_entries()] == [("https://a/1", 2000.0)]
+    cache.close()
+
+
+def test_size_limit_evicts_least_recently_used(tmp_path):
+    cache = HtmlCache(tmp_path)
+    paths = [cache.store(f"https://a/{n}", page(n), fetched_at=1000.0 + n) for n in range(3)]
+    cache.latest("https://a/0")  # touched: now the most recently used
+    cache.max_bytes = cache.total_bytes - 1
+
+    cache.store("https://a/3", page(3))
+    assert not os.path.exists(paths[1])
+    assert cache.latest("https://a/1") is None
+    assert cache.latest("https://a/0") is not None
+    assert cache.total_bytes <= cache.max_bytes
+    cache.close()
+
+
+def test_age_limit_applies_on_open(tmp_path):
+    cache = HtmlCache(tmp_path)
+    old = cache.store("https://a/old", page(1), fetched_at=time.time() - 10 * 86400)
+    cache.store("https://a/new", page(2))
+    size = cache.total_bytes
+    cache.close()
+
+    cache = HtmlCache(tmp_path, max_age_days=7)
+    assert not os.path.exists(old)
+    assert cache.latest("https://a/old") is None and cache.latest("https://a/new") is not None
+    assert 0 < cache.total_bytes < size
+    cache.close()
+
+
+def test_reextract_parses_the_latest_detail_pages(tmp_path):
+    cache = HtmlCache(tmp_path)
+    html = "<html><span class='info-data-price'><span class='txt-bold'>350.000</span> €</span></html>"
+    cache.store("https://www.idealista.com/en/inmueble/1/", "<html>old</html>", fetched_at=1000.0)
+    cache.store("https://www.idealista.com/en/inmueble/1/", html, fetched_at=2000.0)
+    cache.store("https://www.idealista.com/en/venta-viviendas/barcelona/", "<html></html>", fetched_at=2000.0)
+
+    records = reextract(cache, parse_idealista_detail, url_filter=IdealistaAdapter("barcelona").is_detail_url, processes=1)
+    assert len(records) == 1
+    assert records[0]['url'] == "https://www.idealista.com/en/inmueble/1/" and records[0]['fetched_at'] == 2000.0
+    assert records[0]['price']
+    cache.close()
@@ -0,0 +1,93 @@
+"""insee_scraper.download_entry against the benchmark's local file server."""
+import hashlib
+import io
+import zipfile
+
+import pytest
+
+from benchmark import MockFileServer
+from fetcher import make_session
+from insee_scraper import DownloadState, ManifestEntry, download_entry, sha256_of
+
+CSV = b"IRIS;P21_POP\n" + b"".join(b"7510%05d;%d\n" % (i, 1000 + i) for i in range(5000))
+
+
+def zipped(members: dict) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def server():
+    files = {
+        'pop.csv': CSV,
+        'pop_csv.zip': zipped({'base-ic-pop.CSV': CSV, 'meta_base-ic-pop.CSV': b"COD_VAR;LIB_VAR\n"}),
+    }
+    with MockFileServer(files) as server:
+        yield server
+
+
+def download(entry, root):
+    return download_entry(entry, make_session("pytest"), root, DownloadState(root / '.downloads.json'))
+
+
+def test_cold_download(server, tmp_path):
+    entry = ManifestEntry('pop', server.url('pop.csv'), 'POPULATION/pop.csv')
+    assert download(entry, tmp_path) == 'downloaded'
+    assert (tmp_path / 'POPULATION/pop.csv').read_bytes() == CSV
+    assert not (tmp_path / 'POPULATION/pop.csv.part').exists()
+    assert DownloadState(tmp_path / '.downloads.json').get(entry.url)['sha256'] == hashlib.sha256(CSV).hexdigest()
+
+
+def test_unchanged_etag_sends_no_body(server, tmp_path):
+    entry = ManifestEntry('pop', server.url('pop.csv'), 'pop.csv')
+    download(entry, tmp_path)
+    server.reset_counters()
+    assert download(entry, tmp_path) == 'unchanged'
+    assert server.requests == 1 and server.bytes_sent == 0
+
+
+def test_interrupted_download_resumes_with_range(server, tmp_path):
+    entry = ManifestEntry('pop', server.url('pop.csv'), 'pop.csv')
+    (tmp_path / 'pop.csv.part').write_bytes(CSV[:1000])
+    etag = f'"{hashlib.md5(CSV).hexdigest()}"'
+    DownloadState(tmp_path / '.downloads.json').update(entry.url, part_etag=etag)
+
+    assert download(entry, tmp_path) == 'resumed'
+    assert server.bytes_sent == len(CSV) - 1000
+    assert (tmp_path / 'pop.csv').read_bytes() == CSV
+
+
+def test_part_of_a_changed_file_is_downloaded_again(server, tmp_path):
+    entry = ManifestEntry('pop', server.url('pop.csv'), 'pop.csv')
+    (tmp_path / 'pop.csv.part').write_bytes(b"old version")
+    DownloadState(tmp_path / '.downloads.json').update(entry.url, part_etag='"stale"')
+
+    assert download(entry, tmp_path) == 'downloaded'
+    assert (tmp_path / 'pop.csv').read_bytes() == CSV
+
+
+def test_matching_checksum_skips_without_request(server, tmp_path):
+    entry = ManifestEntry('pop', server.url('pop.csv'), 'pop.csv', sha256=hashlib.sha256(CSV).hexdigest())
+    download(entry, tmp_path)
+    server.reset_counters()
+    assert download(entry, tmp_path) == 'skipped'
+    assert server.requests == 0
+
+
+def test_checksum_mismatch_raises(server, tmp_path):
+    entry = ManifestEntry('pop', server.url('pop.csv'), 'pop.csv', sha256="0" * 64)
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        download(entry, tmp_path)
+
+
+def test_archive_is_extracted_to_target(server, tmp_path):
+    entry = ManifestEntry('pop', server.url('pop_csv.zip'), 'POPULATION/pop_csv', extract=True)
+    assert download(entry, tmp_path) == 'downloaded'
+    target = tmp_path / 'POPULATION/pop_csv'
+    assert sorted(p.name for p in target.iterdir()) == ['base-ic-pop.CSV', 'meta_base-ic-pop.CSV']
+    assert (target / 'base-ic-pop.CSV').read_bytes() == CSV
+    assert sha256_of(tmp_path / '_archives/pop_csv.zip') == hashlib.sha256(server.files['pop_csv.zip']).hexdigest()
@@ -0,0 +1,35 @@
+"""Typed Parquet output: values are parsed exactly as normalize.py parses them."""
+import pandas as pd
+
+from normalize import normalize_details
+from parquet_sink import ParquetSink, load_listings, typed_frame
+
+RECORDS = [
+    {'price': "1.200.000 € -5%", 'rooms': "3 habitaciones, 2 baños", 'surface_m2': "1.250 m² construidos",
+     'has_elevator': "Con ascensor", 'year_built': "Construido en 1965", 'location_district': "Eixample",
+     'url': "https://www.idealista.com/en/inmueble/1/"},
+    {'price': "350,000 €", 'rooms': None, 'surface_m2': "80 m²", 'has_elevator': False, 'year_built': "",
+     'location_district': "Gràcia", 'url': "https://www.idealista.com/en/inmueble/2/"},
+]
+
+
+def test_values_are_parsed_like_normalize():
+    df = typed_frame(RECORDS)
+    assert df['price'].tolist() == [1200000, 350000]
+    assert df['rooms'].tolist()[0] == 3 and pd.isna(df['rooms'][1])
+    assert df['surface_m2'].tolist() == [1250, 80]
+    assert df['has_elevator'].tolist() == [True, False]
+    assert df['location_district'].dtype == 'category'
+
+    normalized = normalize_details(pd.DataFrame(RECORDS))
+    for column in ['price', 'rooms', 'surface_m2', 'year_built', 'has_elevator']:
+        assert df[column].equals(normalized[column]), column
+
+
+def test_flush_writes_a_typed_partition(tmp_path):
+    sink = ParquetSink(tmp_path, "barcelona")
+    for record in RECORDS:
+        sink.add(record)
+    assert sink.flush() is not None and sink.flush() is None
+    df = load_listings(tmp_path, columns=['price', 'city'], filters=[('city', '=', 'barcelona')])
+    assert sorted(df['price']) == [350000, 1200000]
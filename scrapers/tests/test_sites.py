@@ -0,0 +1,48 @@
+"""Listing URL canonicalization of the site adapters."""
+from sites import IdealistaAdapter, SeLogerAdapter
+
+
+def test_idealista_aliases_share_one_key_and_fetch_in_english():
+    site = IdealistaAdapter("barcelona")
+    aliases = [
+        "https://www.idealista.com/en/inmueble/123/?xtmc=1#photos",
+        "https://www.idealista.com/inmueble/123/",
+        "https://www.idealista.com/ca/inmueble/123",
+    ]
+    assert {site.url_key(url) for url in aliases} == {"idealista:123"}
+    assert {site.canonical_url(url) for url in aliases} == {"https://www.idealista.com/en/inmueble/123/"}
+
+
+def test_idealista_italy_keeps_its_language_path():
+    site = IdealistaAdapter("milano")
+    assert site.canonical_url("https://www.idealista.it/immobile/77/?ref=x") == "https://www.idealista.it/en/immobile/77/"
+    assert site.listing_id("https://www.idealista.it/en/immobile/77/") == 77
+
+
+def test_other_hosts_keep_their_own_path():
+    site = IdealistaAdapter("barcelona")
+    assert site.canonical_url("http://127.0.0.1:8000/idealista/inmueble/5/?a=1") == \
+        "http://127.0.0.1:8000/idealista/inmueble/5/"
+
+
+def test_seloger_drops_query_string():
+    site = SeLogerAdapter("paris")
+    url = "https://www.seloger.com/annonces/achat/appartement/paris-11eme-75/bastille/123.htm?projects=2"
+    assert site.canonical_url(url) == url.split("?")[0]
+    assert site.url_key(url) == "seloger:123"
+
+
+def test_search_cards_are_deduplicated_by_listing_id():
+    site = IdealistaAdapter("barcelona")
+    cards = site.canonical_cards([
+        {'url': "https://www.idealista.com/en/inmueble/9/?xtmc=a", 'price': "1 €", 'details': ""},
+        {'url': "https://www.idealista.com/inmueble/9/", 'price': "1 €", 'details': ""},
+    ])
+    assert [card['url'] for card in cards] == ["https://www.idealista.com/en/inmueble/9/"]
+
+
+def test_detail_urls_of_every_idealista_country():
+    site = IdealistaAdapter("milano")
+    assert site.is_detail_url("https://www.idealista.it/en/immobile/77/")
+    assert site.is_detail_url("https://www.idealista.com/inmueble/123/")
+    assert not site.is_detail_url("https://www.idealista.it/en/vendita-case/milano-milano/")
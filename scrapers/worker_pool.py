@@ -0,0 +1,80 @@
+"""
+Worker pool for the detail scraping stage.
+
+N independent workers pull URLs from the shared crawl state and push their
+records into a shared, thread-safe sink.
+"""
+import csv
+import os
+import threading
+
+from instrumentation import metrics
+
+
+class ResultSink:
+    """
+    Thread-safe sink shared by all workers. Every record is committed to the
+    crawl state and appended to the output CSV as soon as it is extracted.
+    With a `parquet` sink, records are also buffered and written as one typed
+    Parquet file per batch by `flush()`.
+    """
+
+    def __init__(self, output_file, state, fieldnames: list, parquet=None):
+        self.output_file = output_file
+        self.state = state
+        self.parquet = parquet
+        self.fieldnames = list(fieldnames)
+        self.saved = 0
+        self.failed_urls = []
+        self._lock = threading.Lock()
+
+    def add_record(self, url: str, record: dict):
+        """Stores one extracted record."""
+        with self._lock, metrics.stage('write', kind='csv'):
+            self.state.mark_done(url, record)
+            header_exists = os.path.exists(self.output_file) and os.path.getsize(self.output_file) > 0
+            with open(self.output_file, 'a', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=self.fieldnames, extrasaction='ignore')
+                if not header_exists:
+                    writer.writeheader()
+                writer.writerow(record)
+            self.saved += 1
+        if self.parquet is not None:
+            self.parquet.add(record)
+
+    def flush(self):
+        """Ends a batch: writes the buffered records to Parquet."""
+        if self.parquet is not None:
+            with metrics.stage('write', kind='parquet'):
+                self.parquet.flush()
+
+    def add_failure(self, url: str, reason: str = None, error: str = None, retry: bool = True):
+        """
+        Remembers a URL that failed or was unavailable and, with `retry`,
+        puts it on the crawl state retry queue. Returns its attempt count
+        (None without `retry`: the URL was already stored with `add_record`).
+        """
+        with self._lock:
+            self.failed_urls.append(url)
+        if retry:
+            return self.state.mark_failed(url, reason, error)
+        return None
+
+
+def run_worker_pool(worker_fn, num_workers: int, *args):
+    """
+    Runs `worker_fn(worker_id, *args)` in `num_workers` threads and waits for
+    all of them. A single worker runs inline, with no extra thread.
+    """
+    if num_workers <= 1:
+        worker_fn(1, *args)
+        return
+
+    threads = [
+        threading.Thread(target=worker_fn, args=(worker_id, *args), name=f"detail-worker-{worker_id}", daemon=True)
+        for worker_id in range(1, num_workers + 1)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()